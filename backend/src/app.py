@@ -1,18 +1,29 @@
 import json
 import os
+import math
+import time
 import boto3
 import logging
 import uuid
 import base64
 import jwt
+import response_encoding
+import rate_limiter
+import latency_metrics
+import profiling
+import warmup
+import retrieval
+import bedrock_deadline
+import shadow_traffic
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize Bedrock client
-bedrock = boto3.client('bedrock-runtime')
+bedrock = boto3.client('bedrock-runtime', config=bedrock_deadline.CLIENT_CONFIG)
 
+@latency_metrics.span('auth')
 def extract_user_from_token(event):
     """Extract user information from JWT token"""
     try:
@@ -42,17 +53,51 @@ def extract_user_from_token(event):
         logger.error(f"Error extracting user from token: {str(e)}", exc_info=True)
         return None
 
+def get_model_id():
+    """Get the Bedrock model that answers conversations"""
+    return os.environ.get('MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
+
+@latency_metrics.span('bedrock')
+def converse_within(message, model_id, deadline, passages=None, client=None):
+    """Stream an answer from Bedrock within the request deadline, returning a converse-shaped response"""
+    return bedrock_deadline.converse(
+        client or bedrock,
+        deadline,
+        modelId=model_id,
+        **retrieval.build_request(message, passages)
+    )
+
+def get_response_text(response):
+    """Extract the answer text from a converse response"""
+    return response['output']['message']['content'][0]['text']
+
+def warm_up():
+    """Open the Bedrock and rate limit connections and load the retrieval index ahead of the first conversation"""
+    # Bedrock rejects an unknown model id without running a model, after the TLS handshake
+    warmup.open_connections(lambda: bedrock.converse(
+        modelId='warmup',
+        messages=[{'role': 'user', 'content': [{'text': 'warmup'}]}]
+    ))
+    rate_limiter.warm_up()
+    retrieval.warm_up()
+
+@warmup.warmable(warm_up)
+@latency_metrics.instrument('conversation')
+@profiling.profiled('conversation')
 def lambda_handler(event, context):
     # Log the incoming event
     logger.info(f"Received event: {json.dumps(event)}")
     
+    # Everything below has to finish before API Gateway or Lambda times the request out
+    deadline = bedrock_deadline.Deadline(context)
+    
     try:
         # Extract user information from JWT token
         user_info = extract_user_from_token(event)
         user_id = user_info.get('user_id', 'anonymous') if user_info else 'anonymous'
         
         # Get request body from API Gateway event
-        body = json.loads(event.get('body', '{}'))
+        body = response_encoding.get_json_body(event)
         message = body.get('message', '')
         
         if not message:
@@ -68,35 +113,72 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'No message provided'})
             }
         
+        # Per-user admission control, so one user can't take all of the Bedrock throughput
+        limited = rate_limiter.check_request(user_id)
+        if limited:
+            retry_after = max(1, math.ceil(limited['retry_after']))
+            logger.warning(f"{limited['error']} for user {user_id}, retry after {retry_after}s")
+            return {
+                'statusCode': 429,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Retry-After': str(retry_after),
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST',
+                    'Access-Control-Expose-Headers': 'Retry-After'
+                },
+                'body': json.dumps({'error': limited['error'], 'retry_after': retry_after})
+            }
+        
         # Get model ID from environment variable
-        model_id = os.environ.get('MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
+        model_id = get_model_id()
         logger.info(f"Using model: {model_id}")
         
         # Create a conversation ID
         conversation_id = str(uuid.uuid4())
         logger.info(f"Generated conversation ID: {conversation_id}")
         
-        # Call Bedrock to converse with Claude
-        response = bedrock.converse(
-            modelId=model_id,
-            messages=[
-                {
-                    'role': 'user',
-                    'content': [
-                        {
-                            'text': message
-                        }
-                    ]
-                }
-            ]
-        )
+        # Look up passages from the knowledge base to ground the answer
+        with latency_metrics.span('retrieval'):
+            passages = retrieval.retrieve(message)
+        
+        # Mirror a sample of requests to the candidate model, which is handed the primary's answer
+        shadow = shadow_traffic.start(conversation_id, message, passages, model_id)
+        
+        # Call Bedrock to converse with Claude, streaming so a slow answer can be cut off at the deadline
+        response = None
+        call_started = time.time()
+        try:
+            response = converse_within(message, model_id, deadline, passages=passages)
+        except bedrock_deadline.DeadlineExceeded as e:
+            logger.warning(f"Skipping Bedrock call: {str(e)}")
+        finally:
+            if shadow:
+                shadow.record_primary(response, (time.time() - call_started) * 1000)
         
         # Extract response from Claude
-        claude_response = response['output']['message']['content'][0]['text']
+        claude_response = get_response_text(response) if response else ''
         logger.info(f"Generated response of length: {len(claude_response)}")
         
-        # Return successful response
-        return {
+        # Count the tokens against the user's daily quota, including those of a cut off answer
+        if response:
+            rate_limiter.record_usage(user_id, response.get('usage', {}).get('totalTokens', 0))
+        
+        if not claude_response:
+            return {
+                'statusCode': 504,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST'
+                },
+                'body': json.dumps({'error': 'The model did not answer in time'})
+            }
+        
+        # Return successful response, compressed for clients that accept it
+        return response_encoding.compress_response(event, {
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
@@ -107,9 +189,13 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'conversation_id': conversation_id,
                 'response': claude_response,
-                'user_id': user_id
+                'model_id': model_id,
+                'user_id': user_id,
+                'sources': list(dict.fromkeys(passage['source'] for passage in passages or [])),
+                'truncated': response['truncated'],
+                'truncation_reason': response['truncationReason']
             })
-        }
+        })
         
     except Exception as e:
         logger.error(f"Error processing conversation: {str(e)}", exc_info=True)
@@ -122,4 +208,7 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Methods': 'OPTIONS,POST'
             },
             'body': json.dumps({'error': f"Error processing conversation: {str(e)}"})
-        }
\ No newline at end of file
+        }
+
+# Provisioned concurrency runs the warm-up during init
+warmup.warm_on_provisioned_init(warm_up)
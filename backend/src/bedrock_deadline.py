@@ -0,0 +1,199 @@
+import os
+import time
+import queue
+import random
+import logging
+import threading
+from botocore.config import Config
+from botocore.exceptions import ClientError, ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError
+import warmup
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# API Gateway gives up on the integration after 29 seconds, whatever the Lambda timeout
+GATEWAY_TIMEOUT_MS = 29000
+
+# Time kept back from the deadline to record usage and encode the response
+RESPONSE_RESERVE_MS = int(os.environ.get('RESPONSE_RESERVE_MS', '1000'))
+
+# An attempt (first call or retry) is only started with at least this much time left
+MIN_ATTEMPT_SECONDS = float(os.environ.get('BEDROCK_MIN_ATTEMPT_SECONDS', '3'))
+RETRY_BASE_SECONDS = 0.2
+
+# Output token cap, lowered when the remaining time can't fit it. Generation speed and time to
+# first token start from these estimates and follow what each container observes
+MAX_OUTPUT_TOKENS = int(os.environ.get('MAX_OUTPUT_TOKENS', '4096'))
+MIN_OUTPUT_TOKENS = 64
+INITIAL_TOKENS_PER_SECOND = float(os.environ.get('BEDROCK_TOKENS_PER_SECOND', '40'))
+INITIAL_FIRST_TOKEN_SECONDS = 1.5
+ESTIMATE_WEIGHT = 0.2
+# Share of the estimated capacity asked for, so a slower than usual generation still finishes
+TOKEN_BUDGET_SAFETY = 0.8
+
+# Retries are made here within the deadline, not by botocore. The read timeout only ends a stalled
+# stream the handler has already given up on
+CLIENT_CONFIG = warmup.CLIENT_CONFIG.merge(Config(
+    read_timeout=GATEWAY_TIMEOUT_MS / 1000,
+    retries={'total_max_attempts': 1}
+))
+
+RETRYABLE_ERRORS = frozenset([
+    'ThrottlingException', 'ServiceUnavailableException', 'InternalServerException', 'ModelNotReadyException'
+])
+
+class Deadline:
+    """Time left to answer a request, from the earlier of the Lambda and API Gateway timeouts"""
+
+    def __init__(self, context=None, reserve_ms=RESPONSE_RESERVE_MS):
+        remaining_ms = GATEWAY_TIMEOUT_MS
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            remaining_ms = min(remaining_ms, context.get_remaining_time_in_millis())
+        self.expires = time.monotonic() + (remaining_ms - reserve_ms) / 1000
+
+    def remaining(self):
+        """Seconds left, never negative"""
+        return max(0.0, self.expires - time.monotonic())
+
+class GenerationEstimate:
+    """Moving averages of time to first token and output tokens per second in this container"""
+
+    def __init__(self):
+        self.first_token_seconds = INITIAL_FIRST_TOKEN_SECONDS
+        self.tokens_per_second = INITIAL_TOKENS_PER_SECOND
+        self.lock = threading.Lock()
+
+    def observe(self, first_token_seconds, output_tokens, generation_seconds):
+        with self.lock:
+            self.first_token_seconds += ESTIMATE_WEIGHT * (first_token_seconds - self.first_token_seconds)
+            if output_tokens >= MIN_OUTPUT_TOKENS and generation_seconds > 0:
+                rate = output_tokens / generation_seconds
+                self.tokens_per_second += ESTIMATE_WEIGHT * (rate - self.tokens_per_second)
+
+    def max_tokens(self, seconds):
+        """Output tokens that can be generated in the given time"""
+        budget = (seconds - self.first_token_seconds) * self.tokens_per_second * TOKEN_BUDGET_SAFETY
+        return int(max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, budget)))
+
+estimate = GenerationEstimate()
+
+class DeadlineExceeded(Exception):
+    """Not enough time is left to call Bedrock"""
+
+def is_retryable(error):
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in RETRYABLE_ERRORS
+    return isinstance(error, (ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError))
+
+def _read_stream(client, request, events, state):
+    """Run a ConverseStream call, passing its events to the handler thread through a queue"""
+    try:
+        response = client.converse_stream(**request)
+        state['stream'] = response['stream']
+        for event in response['stream']:
+            events.put(event)
+        events.put(None)
+    except Exception as e:
+        events.put(e)
+
+def _attempt(client, request, deadline):
+    """
+    Make one streamed call, returning the text so far, the stop reason, usage and whether it finished.
+    Stops waiting at the deadline, so a slow generation returns what it has produced instead of timing out
+    """
+    events = queue.Queue()
+    state = {}
+    started = time.monotonic()
+    # The reader thread blocks on the network, the handler thread only waits as long as the deadline allows
+    threading.Thread(target=_read_stream, args=(client, request, events, state), daemon=True).start()
+
+    text = []
+    stop_reason = None
+    usage = None
+    first_token_at = None
+    while True:
+        try:
+            event = events.get(timeout=deadline.remaining())
+        except queue.Empty:
+            # The abandoned stream is closed so its connection isn't left generating tokens
+            stream = state.get('stream')
+            if stream is not None:
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+            return ''.join(text), 'deadline', usage, False
+        if event is None:
+            break
+        if isinstance(event, Exception):
+            if not text:
+                raise event
+            # Tokens already streamed are worth returning, a retry would start over
+            logger.warning(f"Bedrock stream failed after {len(text)} chunks: {str(event)}")
+            return ''.join(text), 'error', usage, False
+        if 'contentBlockDelta' in event:
+            chunk = event['contentBlockDelta'].get('delta', {}).get('text')
+            if chunk:
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                text.append(chunk)
+        elif 'messageStop' in event:
+            stop_reason = event['messageStop'].get('stopReason')
+        elif 'metadata' in event:
+            usage = event['metadata'].get('usage')
+
+    finished = time.monotonic()
+    if first_token_at is not None and usage:
+        estimate.observe(first_token_at - started, usage.get('outputTokens', 0), finished - first_token_at)
+    return ''.join(text), stop_reason, usage, True
+
+def converse(client, deadline, **request):
+    """
+    Call Bedrock ConverseStream within the deadline, retrying throttling and transient errors while time
+    allows. Returns a converse-shaped response with 'truncated' and 'truncationReason' (deadline,
+    max_tokens or error) added, raising DeadlineExceeded if no attempt could be made
+    """
+    retries = 0
+    while True:
+        remaining = deadline.remaining()
+        if remaining < MIN_ATTEMPT_SECONDS:
+            raise DeadlineExceeded(f"{remaining:.1f}s left, too little for a Bedrock call")
+
+        inference_config = dict(request.get('inferenceConfig') or {})
+        inference_config['maxTokens'] = min(inference_config.get('maxTokens', MAX_OUTPUT_TOKENS), estimate.max_tokens(remaining))
+        try:
+            text, stop_reason, usage, complete = _attempt(client, dict(request, inferenceConfig=inference_config), deadline)
+            break
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            # Full jitter backoff, never eating into the time the next attempt needs
+            delay = min(random.uniform(0, RETRY_BASE_SECONDS * 2 ** retries), deadline.remaining() - MIN_ATTEMPT_SECONDS)
+            if delay < 0:
+                raise
+            retries += 1
+            logger.warning(f"Retrying Bedrock call in {delay:.2f}s ({retries} retries): {str(e)}")
+            time.sleep(delay)
+
+    truncation_reason = None
+    if not complete:
+        truncation_reason = stop_reason
+    elif stop_reason == 'max_tokens':
+        truncation_reason = 'max_tokens'
+    if truncation_reason:
+        logger.warning(f"Answer truncated ({truncation_reason}) after {len(text)} characters, maxTokens {inference_config['maxTokens']}")
+
+    if usage is None:
+        # The tokens were generated and billed even though the stream ended early, estimated at 4 characters each
+        output_tokens = len(text) // 4
+        usage = {'inputTokens': 0, 'outputTokens': output_tokens, 'totalTokens': output_tokens}
+
+    return {
+        'output': {'message': {'role': 'assistant', 'content': [{'text': text}]}},
+        'stopReason': stop_reason,
+        'usage': usage,
+        'truncated': truncation_reason is not None,
+        'truncationReason': truncation_reason,
+        'retries': retries
+    }
@@ -0,0 +1,431 @@
+import io
+import json
+import os
+import time
+import logging
+import argparse
+import jwt
+import boto3
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import feedback_cache
+import response_encoding
+from feedback_search import S3Store, LocalStore
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Snapshot settings. The snapshot is built by the scheduled snapshot job, the API only reads it and
+# rechecks the store for a newer one at most every SNAPSHOT_RELOAD_SECONDS while the table changes
+SNAPSHOT_KEY = 'analytics/snapshot.npz'
+SNAPSHOT_RELOAD_SECONDS = int(os.environ.get('ANALYTICS_SNAPSHOT_RELOAD_SECONDS', '60'))
+SCAN_SEGMENTS = int(os.environ.get('ANALYTICS_SCAN_SEGMENTS', '8'))
+
+# Attributes read from the feedback table when building a snapshot. The writer stores response_length,
+# so the scan doesn't read whole responses; items written before it are counted with an unknown length
+SNAPSHOT_ATTRIBUTES = [
+    'timestamp', 'feedback_type', 'user_id', 'model_id', 'reviewed', 'reviewer_id', 'reviewed_at', 'response_length'
+]
+
+METRICS = ['ratios', 'turnaround', 'throughput', 'length']
+
+RATINGS = {'positive': 1, 'negative': -1}
+
+def extract_user_from_token(event):
+    """Extract user information from JWT token"""
+    try:
+        # Get the Authorization header
+        auth_header = event.get('headers', {}).get('Authorization')
+        if not auth_header:
+            logger.warning("No Authorization header found")
+            return None
+
+        # Extract the token (remove 'Bearer ' prefix)
+        token = auth_header.replace('Bearer ', '')
+
+        # Decode the token (without verification for now - AWS API Gateway already verified it)
+        # In production, you should verify the token signature
+        decoded = jwt.decode(token, options={"verify_signature": False})
+
+        # Extract user information
+        user_id = decoded.get('email') or decoded.get('cognito:username')
+        is_reviewer = decoded.get('custom:is_reviewer', 'false').lower() == 'true'
+
+        logger.info(f"Extracted user_id: {user_id}, is_reviewer: {is_reviewer}")
+        return {
+            'user_id': user_id,
+            'is_reviewer': is_reviewer
+        }
+    except Exception as e:
+        logger.error(f"Error extracting user from token: {str(e)}", exc_info=True)
+        return None
+
+def get_snapshot_store():
+    """Get the store that holds the columnar snapshot, or None to keep it in memory only"""
+    bucket = os.environ.get('ANALYTICS_SNAPSHOT_BUCKET')
+    if bucket:
+        return S3Store(bucket)
+    directory = os.environ.get('ANALYTICS_SNAPSHOT_DIR')
+    if directory:
+        return LocalStore(directory)
+    return None
+
+def _scan_segment(table_name, segment, total_segments):
+    """Read one segment of a parallel scan, returning the raw snapshot rows"""
+    # boto3 resources are not thread safe, so each segment gets its own session
+    table = boto3.session.Session().resource('dynamodb').Table(table_name)
+    names = {f"#a{i}": attribute for i, attribute in enumerate(SNAPSHOT_ATTRIBUTES)}
+    scan_args = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'ProjectionExpression': ', '.join(names.keys()),
+        'ExpressionAttributeNames': names
+    }
+
+    rows = []
+    while True:
+        response = table.scan(**scan_args)
+        for item in response.get('Items', []):
+            rows.append((
+                item.get('timestamp') or 'NaT',
+                RATINGS.get(item.get('feedback_type'), 0),
+                item.get('user_id') or 'anonymous',
+                item.get('model_id') or 'unknown',
+                (item.get('reviewer_id') or '') if item.get('reviewed') else '',
+                (item.get('reviewed_at') or 'NaT') if item.get('reviewed') else 'NaT',
+                int(item.get('response_length', -1))
+            ))
+        if 'LastEvaluatedKey' not in response:
+            return rows
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def build_snapshot(table_name, version=None):
+    """Scan the feedback table into a columnar snapshot of NumPy arrays"""
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=SCAN_SEGMENTS) as executor:
+        futures = [executor.submit(_scan_segment, table_name, segment, SCAN_SEGMENTS) for segment in range(SCAN_SEGMENTS)]
+        rows = [row for future in futures for row in future.result()]
+
+    snapshot = columns_from_rows(rows)
+    snapshot['version'] = np.array(-1 if version is None else version)
+    snapshot['built_at'] = np.array(time.time())
+    logger.info(f"Built analytics snapshot of {len(rows)} items in {time.time() - started:.2f}s")
+    return snapshot
+
+def columns_from_rows(rows):
+    """Convert snapshot rows into typed, dictionary-encoded columns"""
+    timestamps, ratings, users, models, reviewers, reviewed_at, lengths = zip(*rows) if rows else ([],) * 7
+
+    user_names, user_codes = np.unique(np.array(users, dtype=str), return_inverse=True)
+    model_names, model_codes = np.unique(np.array(models, dtype=str), return_inverse=True)
+    reviewer_names, reviewer_codes = np.unique(np.array(reviewers, dtype=str), return_inverse=True)
+
+    return {
+        'timestamp': np.array(timestamps, dtype='datetime64[us]'),
+        'rating': np.array(ratings, dtype=np.int8),
+        'user': user_codes.astype(np.int32),
+        'user_names': user_names,
+        'model': model_codes.astype(np.int32),
+        'model_names': model_names,
+        'reviewer': reviewer_codes.astype(np.int32),
+        'reviewer_names': reviewer_names,
+        'reviewed_at': np.array(reviewed_at, dtype='datetime64[us]'),
+        'response_length': np.array(lengths, dtype=np.int64)
+    }
+
+def save_snapshot(store, snapshot):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **snapshot)
+    store.put(SNAPSHOT_KEY, buffer.getvalue())
+
+def load_snapshot(store):
+    data = store.get(SNAPSHOT_KEY)
+    if data is None:
+        return None
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        return {name: archive[name] for name in archive.files}
+
+def _is_current(snapshot, version):
+    """A snapshot is current if nothing changed in the table since it was built"""
+    return snapshot is not None and version is not None and int(snapshot['version']) == version
+
+def _group_ratios(codes, names, rating):
+    """Positive and negative counts and ratios per group"""
+    size = len(names)
+    total = np.bincount(codes, minlength=size)
+    positive = np.bincount(codes, weights=(rating == 1), minlength=size).astype(np.int64)
+    negative = np.bincount(codes, weights=(rating == -1), minlength=size).astype(np.int64)
+    rated = positive + negative
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(rated > 0, positive / rated, np.nan)
+
+    return [
+        {
+            'key': str(names[i]),
+            'total': int(total[i]),
+            'positive': int(positive[i]),
+            'negative': int(negative[i]),
+            'positive_ratio': None if np.isnan(ratio[i]) else round(float(ratio[i]), 4)
+        }
+        for i in np.flatnonzero(total)
+    ]
+
+def _day_codes(timestamps):
+    """Dense day codes (days since the earliest day) and their labels, without sorting"""
+    days = timestamps.astype('datetime64[D]').astype(np.int64)
+    first = days.min() if len(days) else 0
+    codes = days - first
+    labels = (np.arange(codes.max() + 1 if len(codes) else 0) + first).astype('datetime64[D]').astype(str)
+    return codes, labels
+
+def satisfaction_ratios(snapshot):
+    """Positive/negative ratios by day, user and model"""
+    rating = snapshot['rating']
+    valid = ~np.isnat(snapshot['timestamp'])
+    day_codes, day_names = _day_codes(snapshot['timestamp'][valid])
+    return {
+        'by_day': _group_ratios(day_codes, day_names, rating[valid]),
+        'by_user': _group_ratios(snapshot['user'], snapshot['user_names'], rating),
+        'by_model': _group_ratios(snapshot['model'], snapshot['model_names'], rating)
+    }
+
+def review_turnaround(snapshot):
+    """Time from feedback submission to review, in seconds"""
+    reviewed = ~np.isnat(snapshot['reviewed_at']) & ~np.isnat(snapshot['timestamp'])
+    seconds = (snapshot['reviewed_at'][reviewed] - snapshot['timestamp'][reviewed]) / np.timedelta64(1, 's')
+    if not len(seconds):
+        return {'reviewed': 0}
+
+    p50, p90, p99 = np.percentile(seconds, [50, 90, 99])
+    return {
+        'reviewed': int(len(seconds)),
+        'mean_seconds': round(float(seconds.mean()), 1),
+        'p50_seconds': round(float(p50), 1),
+        'p90_seconds': round(float(p90), 1),
+        'p99_seconds': round(float(p99), 1)
+    }
+
+def reviewer_throughput(snapshot):
+    """Reviews completed per reviewer, overall and per active day"""
+    reviewed = ~np.isnat(snapshot['reviewed_at'])
+    reviewers = snapshot['reviewer'][reviewed]
+    names = snapshot['reviewer_names']
+    if not len(reviewers):
+        return []
+
+    reviews = np.bincount(reviewers, minlength=len(names))
+
+    # Count distinct (reviewer, day) pairs to get each reviewer's active days
+    day_codes, day_names = _day_codes(snapshot['reviewed_at'][reviewed])
+    pairs = np.bincount(reviewers.astype(np.int64) * len(day_names) + day_codes, minlength=len(names) * len(day_names))
+    active_days = np.count_nonzero(pairs.reshape(len(names), len(day_names)), axis=1)
+
+    return [
+        {
+            'reviewer_id': str(names[i]),
+            'reviews': int(reviews[i]),
+            'active_days': int(active_days[i]),
+            'reviews_per_active_day': round(float(reviews[i] / active_days[i]), 2)
+        }
+        for i in np.flatnonzero(reviews)
+        if names[i]
+    ]
+
+def length_correlation(snapshot):
+    """Correlation between response length and rating, plus ratios by length quartile"""
+    rated = (snapshot['rating'] != 0) & (snapshot['response_length'] >= 0)
+    lengths = snapshot['response_length'][rated].astype(np.float64)
+    rating = snapshot['rating'][rated]
+    if len(lengths) < 2 or lengths.std() == 0 or rating.std() == 0:
+        return {'rated': int(len(lengths)), 'pearson_r': None, 'by_length_quartile': []}
+
+    edges = np.quantile(lengths, [0.25, 0.5, 0.75])
+    buckets = np.searchsorted(edges, lengths, side='right')
+    labels = np.array([f"q{i + 1}" for i in range(4)])
+
+    return {
+        'rated': int(len(lengths)),
+        'pearson_r': round(float(np.corrcoef(lengths, rating)[0, 1]), 4),
+        'quartile_edges': [int(edge) for edge in edges],
+        'by_length_quartile': _group_ratios(buckets, labels, rating)
+    }
+
+METRIC_FUNCTIONS = {
+    'ratios': satisfaction_ratios,
+    'turnaround': review_turnaround,
+    'throughput': reviewer_throughput,
+    'length': length_correlation
+}
+
+# Snapshot and results kept across invocations of a warm Lambda container
+_snapshot = None
+_snapshot_checked_at = 0
+_results = {}
+
+def read_snapshot():
+    """
+    Get the snapshot built by the snapshot job, from memory or the snapshot store, or None if
+    none has been built yet. Never scans the table, so it stays well within the API timeout
+    """
+    global _snapshot, _snapshot_checked_at
+    if _is_current(_snapshot, feedback_cache.get_current_version()):
+        return _snapshot
+    if _snapshot is not None and time.time() - _snapshot_checked_at < SNAPSHOT_RELOAD_SECONDS:
+        return _snapshot
+
+    store = get_snapshot_store()
+    if store is None:
+        return None
+    _snapshot_checked_at = time.time()
+    stored = load_snapshot(store)
+    if stored is not None:
+        _snapshot = stored
+    return _snapshot
+
+def refresh_snapshot(table_name, store, force=False):
+    """Rebuild the stored snapshot if the table changed since it was built, returning the snapshot"""
+    version = feedback_cache.get_current_version()
+    stored = load_snapshot(store) if not force else None
+    if _is_current(stored, version):
+        logger.info(f"Analytics snapshot is current at version {version}")
+        return stored
+    snapshot = build_snapshot(table_name, version)
+    save_snapshot(store, snapshot)
+    return snapshot
+
+def get_snapshot(table_name, refresh=False):
+    """Get the stored snapshot for the CLI, building it from a table scan if there is none or refresh is set"""
+    store = get_snapshot_store()
+    if store is not None:
+        return refresh_snapshot(table_name, store, force=refresh)
+    return build_snapshot(table_name, feedback_cache.get_current_version())
+
+def compute_metrics(snapshot, metrics):
+    """Compute the requested metrics, reusing results for the same snapshot"""
+    snapshot_id = (int(snapshot['version']), float(snapshot['built_at']))
+    results = {}
+    for metric in metrics:
+        key = (snapshot_id, metric)
+        if key not in _results:
+            started = time.perf_counter()
+            _results[key] = METRIC_FUNCTIONS[metric](snapshot)
+            logger.info(f"Computed {metric} in {(time.perf_counter() - started) * 1000:.1f}ms")
+        results[metric] = _results[key]
+
+    # Only keep results for the current snapshot
+    for key in [key for key in _results if key[0] != snapshot_id]:
+        del _results[key]
+
+    return {
+        'snapshot_version': snapshot_id[0],
+        'snapshot_built_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(snapshot_id[1])),
+        'item_count': int(len(snapshot['rating'])),
+        'metrics': results
+    }
+
+def parse_metrics(metric_param):
+    """Parse the comma separated metric parameter, raising ValueError on unknown metrics"""
+    if not metric_param or metric_param == 'all':
+        return METRICS
+    metrics = [metric.strip() for metric in metric_param.split(',') if metric.strip()]
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    return metrics
+
+def lambda_handler(event, context):
+    # Log the incoming event
+    logger.info(f"Received event: {json.dumps(event)}")
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Methods': 'OPTIONS,GET'
+    }
+
+    try:
+        # Extract user information from JWT token
+        user_info = extract_user_from_token(event)
+        user_id = user_info.get('user_id', 'anonymous') if user_info else 'anonymous'
+        is_reviewer = user_info.get('is_reviewer', False) if user_info else False
+
+        # Analytics cover every user's feedback, so they are limited to reviewers
+        if not is_reviewer:
+            logger.warning(f"User {user_id} does not have reviewer permissions")
+            return {
+                'statusCode': 403,
+                'headers': headers,
+                'body': json.dumps({'error': 'User does not have reviewer permissions'})
+            }
+
+        # Get query parameters
+        query_params = event.get('queryStringParameters', {}) or {}
+        try:
+            metrics = parse_metrics(query_params.get('metric'))
+        except ValueError as e:
+            logger.warning(f"Invalid metric parameter: {str(e)}")
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': str(e)})
+            }
+
+        snapshot = read_snapshot()
+        if snapshot is None:
+            logger.warning("No analytics snapshot has been built yet")
+            return {
+                'statusCode': 503,
+                'headers': headers,
+                'body': json.dumps({'error': 'Analytics snapshot is not built yet, try again in a few minutes'})
+            }
+        result = compute_metrics(snapshot, metrics)
+
+        # Per-user breakdowns can be large, compress them for clients that accept it
+        return response_encoding.compress_response(event, {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps(result)
+        })
+
+    except Exception as e:
+        logger.error(f"Error computing feedback analytics: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': f"Error computing feedback analytics: {str(e)}"})
+        }
+
+def snapshot_handler(event, context):
+    """Scheduled snapshot build, the full table scan runs here instead of in API requests"""
+    store = get_snapshot_store()
+    snapshot = refresh_snapshot(os.environ.get('FEEDBACK_TABLE_NAME'), store)
+    result = {'snapshot_version': int(snapshot['version']), 'item_count': int(len(snapshot['rating']))}
+    logger.info(f"Analytics snapshot run finished: {json.dumps(result)}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute feedback analytics from a columnar snapshot')
+    parser.add_argument('--table-name', default='user-feedback', help='DynamoDB feedback table')
+    parser.add_argument('--metric', default='all', help=f"Comma separated metrics: {', '.join(METRICS)} (default: all)")
+    parser.add_argument('--snapshot-file', help='Read the snapshot from this .npz file instead of the table')
+    parser.add_argument('--save-snapshot', help='Write the snapshot to this .npz file')
+    parser.add_argument('--refresh', action='store_true', help='Rebuild the snapshot from the table')
+
+    args = parser.parse_args()
+
+    if args.snapshot_file:
+        with np.load(args.snapshot_file, allow_pickle=False) as archive:
+            snapshot = {name: archive[name] for name in archive.files}
+    else:
+        snapshot = get_snapshot(args.table_name, refresh=args.refresh)
+
+    if args.save_snapshot:
+        np.savez_compressed(args.save_snapshot, **snapshot)
+        print(f"Saved snapshot of {len(snapshot['rating'])} items to {args.save_snapshot}")
+
+    print(json.dumps(compute_metrics(snapshot, parse_metrics(args.metric)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import io
+import os
+import gzip
+import json
+import time
+import uuid
+import logging
+import argparse
+import boto3
+from decimal import Decimal
+from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Attr
+from feedback_search import S3Store, LocalStore
+import feedback_cache
+
+# pyarrow is optional, without it partitions are written as gzipped NDJSON
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Reviewed items older than this are moved out of the table
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+
+# Archive layout: archive/dt=YYYY-MM-DD/part-<run>.ndjson.gz or .parquet, partitioned on the item timestamp
+ARCHIVE_PREFIX = 'archive/'
+
+# Items scanned before a batch is written out and deleted from the table
+ARCHIVE_BATCH_SIZE = 5000
+
+# Items returned per page when a list reads the archive
+ARCHIVE_PAGE_SIZE = 100
+
+# Day partitions downloaded per archive page, a page that hits it returns early with a cursor to
+# the next partition so sparse matches can't turn one request into a read of the whole archive
+ARCHIVE_MAX_PARTITIONS = int(os.environ.get('ARCHIVE_MAX_PARTITIONS', '7'))
+
+# Columns of the Parquet files, NDJSON files keep every attribute
+PARQUET_COLUMNS = [
+    'id', 'conversation_id', 'feedback_type', 'feedback_text', 'original_query', 'llm_response',
+    'model_id', 'timestamp', 'last_modified', 'user_id', 'reviewed', 'reviewer_comments',
+    'reviewer_id', 'reviewed_at'
+]
+
+def get_archive_store():
+    """Get the store that holds archived feedback, or None if archiving is not configured"""
+    bucket = os.environ.get('ARCHIVE_BUCKET')
+    if bucket:
+        return S3Store(bucket)
+    directory = os.environ.get('ARCHIVE_DIR')
+    if directory:
+        return LocalStore(directory)
+    return None
+
+def archive_cutoff(days=ARCHIVE_AFTER_DAYS):
+    """Get the timestamp before which reviewed items are archived"""
+    return (datetime.utcnow() - timedelta(days=days)).isoformat()
+
+def _plain(value):
+    """Convert DynamoDB Decimals and sets to JSON types"""
+    if isinstance(value, set):
+        return sorted(value)
+    if isinstance(value, Decimal):
+        return int(value) if value == int(value) else float(value)
+    return value
+
+def encode_partition(items, file_format):
+    """Serialize the items of a partition file"""
+    if file_format == 'parquet':
+        schema = pa.schema([
+            (column, pa.bool_() if column == 'reviewed' else pa.string()) for column in PARQUET_COLUMNS
+        ])
+        rows = [
+            {column: item.get(column) if column == 'reviewed' else (None if item.get(column) is None else str(item[column]))
+             for column in PARQUET_COLUMNS}
+            for item in items
+        ]
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), buffer, compression='zstd')
+        return buffer.getvalue()
+
+    lines = ''.join(json.dumps({key: _plain(value) for key, value in item.items()}) + '\n' for item in items)
+    # mtime=0 so rewriting the same items gives the same bytes
+    return gzip.compress(lines.encode('utf-8'), mtime=0)
+
+def decode_partition(key, data):
+    """Read the items of a partition file"""
+    if key.endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError(f"pyarrow is needed to read {key}")
+        return pq.read_table(io.BytesIO(data)).to_pylist()
+    return [json.loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines() if line]
+
+def write_batch(store, items, file_format):
+    """Write a batch of items to their day partitions, returning the keys written"""
+    partitions = {}
+    for item in items:
+        partitions.setdefault(item['timestamp'][:10], []).append(item)
+
+    run = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+    extension = 'parquet' if file_format == 'parquet' else 'ndjson.gz'
+    keys = []
+    for day, day_items in sorted(partitions.items()):
+        key = f"{ARCHIVE_PREFIX}dt={day}/part-{run}.{extension}"
+        store.put(key, encode_partition(day_items, file_format))
+        keys.append(key)
+    return keys
+
+def delete_batch(table, items):
+    """Delete archived items, the batch writer sends 25 deletes per call and retries unprocessed ones"""
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.delete_item(Key={'id': item['id']})
+
+def archive(table, store, days=ARCHIVE_AFTER_DAYS, file_format='ndjson', dry_run=False):
+    """
+    Move reviewed items older than days out of the table into the archive.
+    Each batch is written to the archive before it is deleted, so an interrupted run
+    at worst archives some items twice, and readers drop the duplicates
+    """
+    if file_format == 'parquet' and pa is None:
+        raise RuntimeError("pyarrow is not installed, use the ndjson format")
+
+    cutoff = archive_cutoff(days)
+    scan_args = {
+        'FilterExpression': Attr('reviewed').eq(True) & Attr('timestamp').lt(cutoff)
+    }
+    counts = {'scanned': 0, 'archived': 0, 'files': 0}
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        if not dry_run:
+            counts['files'] += len(write_batch(store, batch, file_format))
+            delete_batch(table, batch)
+        counts['archived'] += len(batch)
+        logger.info(f"{'Would archive' if dry_run else 'Archived'} {counts['archived']} items")
+        batch.clear()
+
+    while True:
+        response = table.scan(**scan_args)
+        counts['scanned'] += response.get('ScannedCount', 0)
+        batch.extend(response.get('Items', []))
+        if len(batch) >= ARCHIVE_BATCH_SIZE:
+            flush()
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    flush()
+
+    # Cached pages and their ETags still hold the archived items
+    if counts['archived'] and not dry_run:
+        feedback_cache.bump_version()
+    return counts
+
+def list_partitions(store):
+    """Get the archived day partitions, newest first"""
+    partitions = {key[len(ARCHIVE_PREFIX):].split('/')[0] for key in store.list(ARCHIVE_PREFIX)}
+    return sorted((partition for partition in partitions if partition.startswith('dt=')), reverse=True)
+
+def read_partition(store, partition):
+    """Read the items of a day partition, newest first and without the duplicates of interrupted runs"""
+    items = {}
+    for key in store.list(f"{ARCHIVE_PREFIX}{partition}/"):
+        for item in decode_partition(key, store.get(key)):
+            items[item['id']] = item
+    return sorted(items.values(), key=lambda item: item.get('timestamp', ''), reverse=True)
+
+def read_page(store, match, cursor=None, limit=ARCHIVE_PAGE_SIZE, max_partitions=ARCHIVE_MAX_PARTITIONS):
+    """
+    Read a page of archived items accepted by match, newest first.
+    cursor is the partition and offset to resume from ({} to start at the newest partition).
+    At most max_partitions are read, so a page can be short with a cursor to carry on from,
+    and the returned cursor is None once the archive is exhausted
+    """
+    partitions = list_partitions(store)
+    cursor = cursor or {}
+    if cursor.get('partition'):
+        # Partitions are never removed, so the cursor's partition is still there
+        partitions = [partition for partition in partitions if partition <= cursor['partition']]
+    offset = cursor.get('offset', 0)
+
+    items = []
+    for read, partition in enumerate(partitions):
+        if read >= max_partitions:
+            return items, {'partition': partition, 'offset': 0}
+        partition_items = read_partition(store, partition)
+        for position in range(offset, len(partition_items)):
+            if not match(partition_items[position]):
+                continue
+            items.append(partition_items[position])
+            if len(items) >= limit:
+                return items, {'partition': partition, 'offset': position + 1}
+        offset = 0
+
+    return items, None
+
+def lambda_handler(event, context):
+    """Scheduled archive run"""
+    table = boto3.resource('dynamodb').Table(os.environ.get('FEEDBACK_TABLE_NAME'))
+    store = get_archive_store()
+    counts = archive(table, store, file_format=os.environ.get('ARCHIVE_FORMAT', 'ndjson'))
+    logger.info(f"Archive run finished: {json.dumps(counts)}")
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive old reviewed feedback out of the table')
+    parser.add_argument('--table-name', default='user-feedback', help='DynamoDB feedback table')
+    parser.add_argument('--bucket', help='S3 bucket to archive to (default: ARCHIVE_BUCKET)')
+    parser.add_argument('--archive-dir', help='Local directory to archive to instead of S3')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='Archive reviewed items older than this many days')
+    parser.add_argument('--format', choices=['ndjson', 'parquet'], default='ndjson', help='Partition file format')
+    parser.add_argument('--dry-run', action='store_true', help='Count the items that would be archived')
+
+    args = parser.parse_args()
+
+    if args.archive_dir:
+        store = LocalStore(args.archive_dir)
+    elif args.bucket:
+        store = S3Store(args.bucket)
+    else:
+        store = get_archive_store()
+    if store is None:
+        parser.error('Give --bucket or --archive-dir, or set ARCHIVE_BUCKET')
+
+    table = boto3.resource('dynamodb').Table(args.table_name)
+    counts = archive(table, store, args.days, args.format, args.dry_run)
+    print(f"{'Would archive' if args.dry_run else 'Archived'} {counts['archived']} of {counts['scanned']} items into {counts['files']} files")
+
+if __name__ == "__main__":
+    main()
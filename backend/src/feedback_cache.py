@@ -0,0 +1,205 @@
+import json
+import os
+import time
+import hashlib
+import logging
+import boto3
+import warmup
+from collections import OrderedDict
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize DynamoDB client
+dynamodb = boto3.resource('dynamodb', config=warmup.CLIENT_CONFIG)
+
+# Key of the version stamp item that writers bump on every change to the feedback table
+VERSION_KEY = 'version#feedback'
+
+# Cache settings
+CACHE_TTL_SECONDS = int(os.environ.get('FEEDBACK_CACHE_TTL_SECONDS', '300'))
+CACHE_MAX_ENTRIES = int(os.environ.get('FEEDBACK_CACHE_MAX_ENTRIES', '256'))
+CACHE_SHARED_TIER = os.environ.get('FEEDBACK_CACHE_SHARED', 'false').lower() == 'true'
+
+# DynamoDB items are limited to 400KB, leave room for the key and metadata
+MAX_SHARED_ENTRY_BYTES = 350 * 1024
+
+# In-process tier, kept across invocations of a warm Lambda container
+_local_cache = OrderedDict()
+
+# Counters for cache metrics
+_stats = {
+    'hits': 0,
+    'shared_hits': 0,
+    'misses': 0,
+    'stale': 0,
+    'max_entry_age': 0.0
+}
+
+def get_cache_table():
+    """Get the DynamoDB table holding version stamps and shared cache entries"""
+    table_name = os.environ.get('FEEDBACK_CACHE_TABLE_NAME')
+    if not table_name:
+        return None
+    return dynamodb.Table(table_name)
+
+def make_cache_key(role, user_id, conversation_id, feedback_type, cursor, fields=None, include_archive=False):
+    """Build a cache key from the parameters that determine a feedback page"""
+    key_parts = [role, user_id, conversation_id, feedback_type, cursor, fields]
+    if include_archive:
+        key_parts.append('archive')
+    raw = json.dumps(key_parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def get_current_version():
+    """Read the current version stamp of the feedback table (0 if never bumped)"""
+    table = get_cache_table()
+    if table is None:
+        return None
+
+    # Strongly consistent read so a page cached before the last write is never served
+    response = table.get_item(
+        Key={'cache_key': VERSION_KEY},
+        ConsistentRead=True
+    )
+    return int(response.get('Item', {}).get('version', 0))
+
+def bump_version():
+    """Increment the version stamp, invalidating every cached feedback page"""
+    table = get_cache_table()
+    if table is None:
+        return None
+
+    try:
+        response = table.update_item(
+            Key={'cache_key': VERSION_KEY},
+            UpdateExpression="ADD version :one SET updated_at = :t",
+            ExpressionAttributeValues={
+                ':one': 1,
+                ':t': int(time.time())
+            },
+            ReturnValues="UPDATED_NEW"
+        )
+        version = int(response['Attributes']['version'])
+        logger.info(f"Bumped feedback cache version to: {version}")
+        return version
+    except Exception as e:
+        # The write itself succeeded, cached pages will still expire after CACHE_TTL_SECONDS
+        logger.error(f"Error bumping feedback cache version: {str(e)}", exc_info=True)
+        return None
+
+def get(key, version):
+    """Look up a cached page, returning None on a miss or if the page is stale"""
+    if version is None:
+        return None
+
+    now = time.time()
+
+    # Check the in-process tier first
+    entry = _local_cache.get(key)
+    if entry is not None:
+        if entry['version'] == version and now - entry['cached_at'] < CACHE_TTL_SECONDS:
+            _local_cache.move_to_end(key)
+            _record_hit(now - entry['cached_at'])
+            return entry['value']
+
+        # Written under an older version or expired, drop it
+        _stats['stale'] += 1
+        del _local_cache[key]
+
+    # Fall back to the shared tier
+    if CACHE_SHARED_TIER:
+        try:
+            response = get_cache_table().get_item(Key={'cache_key': f"page#{key}"})
+            item = response.get('Item')
+            if item is not None:
+                cached_at = float(item.get('cached_at', 0))
+                if int(item.get('version', -1)) == version and now - cached_at < CACHE_TTL_SECONDS:
+                    value = json.loads(item['value'])
+                    _store_local(key, version, value, cached_at)
+                    _stats['shared_hits'] += 1
+                    _record_hit(now - cached_at)
+                    return value
+                _stats['stale'] += 1
+        except Exception as e:
+            logger.error(f"Error reading shared feedback cache: {str(e)}", exc_info=True)
+
+    _stats['misses'] += 1
+    return None
+
+def put(key, version, value):
+    """Store a page in the cache under the version it was read at"""
+    if version is None:
+        return
+
+    now = time.time()
+    _store_local(key, version, value, now)
+
+    if CACHE_SHARED_TIER:
+        body = json.dumps(value)
+        if len(body) > MAX_SHARED_ENTRY_BYTES:
+            logger.info(f"Page of {len(body)} bytes too large for shared feedback cache")
+            return
+        try:
+            get_cache_table().put_item(
+                Item={
+                    'cache_key': f"page#{key}",
+                    'version': version,
+                    'value': body,
+                    'cached_at': str(now),
+                    'expires_at': int(now) + CACHE_TTL_SECONDS
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error writing shared feedback cache: {str(e)}", exc_info=True)
+
+def get_metrics():
+    """Get cache hit rate and staleness counters for this container"""
+    lookups = _stats['hits'] + _stats['misses']
+    return {
+        'hits': _stats['hits'],
+        'shared_hits': _stats['shared_hits'],
+        'misses': _stats['misses'],
+        'stale': _stats['stale'],
+        'hit_rate': _stats['hits'] / lookups if lookups else 0.0,
+        'max_entry_age': _stats['max_entry_age'],
+        'entries': len(_local_cache)
+    }
+
+def emit_metrics():
+    """Emit cache metrics to CloudWatch using the Embedded Metric Format"""
+    metrics = get_metrics()
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': 'FeedbackCache',
+                'Dimensions': [[]],
+                'Metrics': [
+                    {'Name': 'CacheHitRate', 'Unit': 'None'},
+                    {'Name': 'CacheStaleEntries', 'Unit': 'Count'},
+                    {'Name': 'CacheMaxEntryAge', 'Unit': 'Seconds'}
+                ]
+            }]
+        },
+        'CacheHitRate': metrics['hit_rate'],
+        'CacheStaleEntries': metrics['stale'],
+        'CacheMaxEntryAge': metrics['max_entry_age']
+    }))
+
+def _record_hit(age):
+    _stats['hits'] += 1
+    _stats['max_entry_age'] = max(_stats['max_entry_age'], age)
+
+def _store_local(key, version, value, cached_at):
+    _local_cache[key] = {
+        'version': version,
+        'value': value,
+        'cached_at': cached_at
+    }
+    _local_cache.move_to_end(key)
+
+    # Evict least recently used entries
+    while len(_local_cache) > CACHE_MAX_ENTRIES:
+        _local_cache.popitem(last=False)
@@ -0,0 +1,285 @@
+import os
+import uuid
+import hashlib
+import logging
+import argparse
+import boto3
+import numpy as np
+from decimal import Decimal
+from datetime import datetime
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import Key, Attr
+from feedback_search import tokenize
+from feedback_spikes import stream_items
+import feedback_cache
+import warmup
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize DynamoDB client
+dynamodb = boto3.resource('dynamodb', config=warmup.CLIENT_CONFIG)
+
+# Feedback types that are clustered for triage
+CLUSTERED_TYPES = ('negative',)
+CLUSTER_FIELDS = ('feedback_text', 'original_query')
+
+# MinHash signature of NUM_PERMUTATIONS values, split into BANDS bands of ROWS values for LSH.
+# Items sharing any band are candidates, which catches pairs above a Jaccard similarity of about
+# (1 / BANDS) ** (1 / ROWS) = 0.5; candidates then join a cluster if their estimated similarity
+# to its representative reaches SIMILARITY_THRESHOLD.
+# Changing these or the seed invalidates every stored signature, so they are fixed
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SIMILARITY_THRESHOLD = float(os.environ.get('CLUSTER_SIMILARITY_THRESHOLD', '0.5'))
+MINHASH_SEED = 20240501
+
+# Universal hashing (a * x + b) mod P over 32-bit shingle hashes, P is the smallest prime above 2**32.
+# a, b and x are all below 2**32, so a * x + b is at most 2**64 - 2**32 and the uint64 arithmetic never wraps
+HASH_PRIME = np.uint64(4294967311)
+_random = np.random.RandomState(MINHASH_SEED)
+_hash_a = _random.randint(1, 2 ** 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_hash_b = _random.randint(0, 2 ** 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+# Preview length of the representative text stored on a cluster
+PREVIEW_LENGTH = 280
+
+# Table layout:
+#   band#<band>#<hash>  -> cluster_id of the first cluster seen in the LSH bucket
+#   cluster#<id>        -> representative, signature and item_count, in the sparse ClusterSizeIndex
+BAND_PREFIX = 'band#'
+CLUSTER_PREFIX = 'cluster#'
+CLUSTER_INDEX = 'ClusterSizeIndex'
+
+def get_cluster_table():
+    """Get the DynamoDB table holding LSH buckets and clusters, or None if clustering is not configured"""
+    table_name = os.environ.get('CLUSTER_TABLE_NAME')
+    if not table_name:
+        return None
+    return dynamodb.Table(table_name)
+
+def shingles(item):
+    """Get the word unigrams and bigrams of an item's clustered text"""
+    tokens = []
+    for field in CLUSTER_FIELDS:
+        tokens.extend(tokenize(item.get(field) or ''))
+    return set(tokens) | {f"{first} {second}" for first, second in zip(tokens, tokens[1:])}
+
+def signature(features):
+    """Compute the MinHash signature of a set of shingles, as uint32 values"""
+    if not features:
+        return None
+    # 4-byte digests keep every shingle hash below 2**32, see the hashing constants above
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=4).digest(), 'little') for feature in features],
+        dtype=np.uint64
+    )
+    # One row per permutation, the minimum over the shingles in each
+    permuted = (np.outer(_hash_a, hashes) + _hash_b[:, None]) % HASH_PRIME
+    return (permuted.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+def band_keys(sig):
+    """Get the LSH bucket keys of a signature, one per band"""
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).hexdigest()
+        keys.append(f"{BAND_PREFIX}{band}#{digest}")
+    return keys
+
+def similarity(sig, other):
+    """Estimate the Jaccard similarity of two signatures"""
+    return float(np.mean(sig == other))
+
+def _batch_get(table, keys):
+    """Read items by cluster_key, retrying unprocessed keys"""
+    found = {}
+    request = {table.name: {'Keys': [{'cluster_key': key} for key in keys]}}
+    while request:
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for entry in response.get('Responses', {}).get(table.name, []):
+            found[entry['cluster_key']] = entry
+        request = response.get('UnprocessedKeys') or None
+    return found
+
+def set_cluster_id(feedback_table, item_id, cluster_id):
+    """Claim a feedback item for a cluster, returning False if the item was removed or already clustered"""
+    try:
+        feedback_table.update_item(
+            Key={'id': item_id},
+            UpdateExpression='SET cluster_id = :c',
+            ConditionExpression='attribute_exists(id) AND attribute_not_exists(cluster_id)',
+            ExpressionAttributeValues={':c': cluster_id}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def assign(item, feedback_table, table=None):
+    """
+    Assign a feedback item to a cluster of near-duplicates, creating one if none is similar enough.
+    The cluster_id is stored on the item before the cluster is counted, so an item seen again
+    (a retried stream batch) is not counted twice. Returns the cluster id, or None if the item
+    isn't clustered, was removed or already has a cluster
+    """
+    table = table or get_cluster_table()
+    if table is None or item.get('feedback_type') not in CLUSTERED_TYPES:
+        return None
+
+    sig = signature(shingles(item))
+    if sig is None:
+        return None
+    keys = band_keys(sig)
+    buckets = _batch_get(table, keys)
+
+    # Candidate clusters, by the number of bands they share with the item
+    candidates = {}
+    for bucket in buckets.values():
+        candidates[bucket['cluster_id']] = candidates.get(bucket['cluster_id'], 0) + 1
+
+    cluster_id = None
+    if candidates:
+        clusters = _batch_get(table, [f"{CLUSTER_PREFIX}{candidate}" for candidate in candidates])
+        best = 0.0
+        for cluster in clusters.values():
+            score = similarity(sig, np.frombuffer(bytes(cluster['signature']), dtype=np.uint32))
+            if score >= SIMILARITY_THRESHOLD and score > best:
+                best = score
+                cluster_id = cluster['cluster_id']
+
+    # The item becomes the representative of a new cluster if none is similar enough
+    new_cluster = cluster_id is None
+    if new_cluster:
+        cluster_id = str(uuid.uuid4())
+    if not set_cluster_id(feedback_table, item['id'], cluster_id):
+        return None
+
+    now = item.get('timestamp') or datetime.utcnow().isoformat()
+    if new_cluster:
+        table.put_item(Item={
+            'cluster_key': f"{CLUSTER_PREFIX}{cluster_id}",
+            'cluster_id': cluster_id,
+            'cluster_kind': item['feedback_type'],
+            'item_count': 1,
+            'signature': sig.tobytes(),
+            'representative_id': item['id'],
+            'feedback_text': (item.get('feedback_text') or '')[:PREVIEW_LENGTH],
+            'original_query': (item.get('original_query') or '')[:PREVIEW_LENGTH],
+            'first_seen': now,
+            'last_seen': now
+        })
+    else:
+        table.update_item(
+            Key={'cluster_key': f"{CLUSTER_PREFIX}{cluster_id}"},
+            UpdateExpression='ADD item_count :one SET last_seen = :now',
+            ExpressionAttributeValues={':one': 1, ':now': now}
+        )
+
+    # Empty buckets point at the cluster, so later items sharing only those bands still find it
+    missing = [key for key in keys if key not in buckets]
+    if missing:
+        with table.batch_writer() as batch:
+            for key in missing:
+                batch.put_item(Item={'cluster_key': key, 'cluster_id': cluster_id})
+
+    return cluster_id
+
+def list_clusters(table, feedback_type='negative', start_key=None, limit=50):
+    """Get clusters by descending size, returning the clusters and the LastEvaluatedKey"""
+    query_args = {
+        'IndexName': CLUSTER_INDEX,
+        'KeyConditionExpression': Key('cluster_kind').eq(feedback_type),
+        'ScanIndexForward': False,
+        'Limit': limit
+    }
+    if start_key:
+        query_args['ExclusiveStartKey'] = start_key
+    response = table.query(**query_args)
+
+    clusters = []
+    for cluster in response.get('Items', []):
+        clusters.append({
+            'cluster_id': cluster['cluster_id'],
+            'count': int(cluster['item_count']),
+            'first_seen': cluster.get('first_seen'),
+            'last_seen': cluster.get('last_seen'),
+            'representative': {
+                'id': cluster['representative_id'],
+                'feedback_text': cluster.get('feedback_text', ''),
+                'original_query': cluster.get('original_query', '')
+            }
+        })
+    # item_count is a key of the index, made JSON safe for pagination cursors
+    last_key = response.get('LastEvaluatedKey')
+    if last_key:
+        last_key = {name: int(value) if isinstance(value, Decimal) else value for name, value in last_key.items()}
+    return clusters, last_key
+
+def lambda_handler(event, context):
+    """DynamoDB stream consumer clustering new feedback off the writer's request path"""
+    cluster_table = get_cluster_table()
+    if cluster_table is None:
+        logger.warning("CLUSTER_TABLE_NAME is not set, skipping batch")
+        return {'clustered': 0}
+    feedback_table = dynamodb.Table(os.environ.get('FEEDBACK_TABLE_NAME', 'user-feedback'))
+
+    clustered = 0
+    failed = 0
+    for item in stream_items(event.get('Records', [])):
+        if item.get('feedback_type') not in CLUSTERED_TYPES or item.get('cluster_id'):
+            continue
+        try:
+            if assign(item, feedback_table, cluster_table):
+                clustered += 1
+        except Exception as e:
+            logger.error(f"Error clustering feedback {item.get('id')}: {str(e)}", exc_info=True)
+            failed += 1
+
+    # Cached pages hold the items without their cluster
+    if clustered:
+        feedback_cache.bump_version()
+    if failed:
+        # Items clustered before the retry already carry their cluster_id and are skipped
+        raise RuntimeError(f"{failed} feedback items failed to cluster, retrying the batch")
+    return {'clustered': clustered}
+
+def rebuild(feedback_table, cluster_table):
+    """Cluster feedback stored before clustering was enabled, setting cluster_id on each item"""
+    scan_args = {
+        'FilterExpression': Attr('feedback_type').is_in(list(CLUSTERED_TYPES)) & Attr('cluster_id').not_exists()
+    }
+    assigned = 0
+    while True:
+        response = feedback_table.scan(**scan_args)
+        for item in response.get('Items', []):
+            if assign(item, feedback_table, cluster_table):
+                assigned += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logger.info(f"Clustered {assigned} feedback items")
+    return assigned
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the near-duplicate clusters of negative feedback')
+    parser.add_argument('command', choices=['rebuild', 'list'], help='Operation to run')
+    parser.add_argument('--table-name', default='user-feedback', help='DynamoDB feedback table')
+    parser.add_argument('--cluster-table-name', default='feedback-clusters', help='DynamoDB cluster table')
+    parser.add_argument('--limit', type=int, default=20, help='Clusters to list')
+
+    args = parser.parse_args()
+
+    cluster_table = dynamodb.Table(args.cluster_table_name)
+    if args.command == 'rebuild':
+        print(f"Clustered {rebuild(dynamodb.Table(args.table_name), cluster_table)} feedback items")
+    else:
+        clusters, _ = list_clusters(cluster_table, limit=args.limit)
+        for cluster in clusters:
+            print(f"{cluster['count']:6d}  {cluster['cluster_id']}  {cluster['representative']['feedback_text'][:80]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,553 @@
+import os
+import json
+import math
+import time
+import zlib
+import random
+import logging
+import argparse
+import importlib
+import threading
+from decimal import Decimal
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+import feedback_sharding
+import feedback_cache
+import review_queue
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Migration settings
+DEFAULT_SEGMENTS = 4
+PAGE_SIZE = 100
+TRANSACTION_SIZE = 25
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 0.1
+PROGRESS_INTERVAL = 10
+SAMPLE_SIZE = 5
+
+# Starting capacity estimates, followed by what the calls consume: an eventually consistent scan page of
+# PAGE_SIZE items of about 1KB, and a transactional write of an item up to 1KB
+INITIAL_PAGE_READ_UNITS = PAGE_SIZE / 8
+INITIAL_ITEM_WRITE_UNITS = 2
+ESTIMATE_WEIGHT = 0.2
+
+# Throttling and transient errors of a scan or transaction, which are retried. Any other error of a
+# transaction is charged to its items
+RETRYABLE_ERRORS = frozenset([
+    'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded',
+    'InternalServerError', 'TransactionInProgressException'
+])
+
+# Cancellation reasons of single items: conditions that no longer hold are conflicts,
+# items that can never be written fail, and throttling or contention is retried
+CANCELLATION_STATUSES = {
+    'None': 'rolled_back',
+    'ConditionalCheckFailed': 'conflict',
+    'ValidationError': 'failed',
+    'ItemCollectionSizeLimitExceeded': 'failed'
+}
+
+# A transform returns REMOVE as the value of an attribute to delete it
+REMOVE = object()
+
+def shard_keys(item):
+    """Set the sharded user and conversation GSI keys, see feedback_sharding"""
+    sharded = feedback_sharding.add_shard_keys(dict(item))
+    return {
+        attribute: sharded[attribute]
+        for _, attribute, _ in (feedback_sharding.USER_SHARD_INDEX, feedback_sharding.CONVERSATION_SHARD_INDEX)
+        if attribute in sharded and sharded[attribute] != item.get(attribute)
+    }
+
+def archive_ttl(item):
+    """Stamp reviewed items with the expires_at TTL the reviewer sets, ARCHIVE_TTL_DAYS after review"""
+    days = int(os.environ.get('ARCHIVE_TTL_DAYS', '0'))
+    if not days:
+        raise ValueError("Set ARCHIVE_TTL_DAYS for the archive_ttl migration")
+    if not item.get('reviewed') or not item.get('reviewed_at') or 'expires_at' in item:
+        return None
+    expires_at = datetime.fromisoformat(item['reviewed_at']) + timedelta(days=days)
+    return {'expires_at': int((expires_at - datetime(1970, 1, 1)).total_seconds())}
+
+def review_queue_keys(item):
+    """Add unreviewed items written before the review queue existed to the queue"""
+    if item.get('reviewed') is False and 'review_queue' not in item:
+        return {'review_queue': review_queue.PENDING}
+    return None
+
+def response_length(item):
+    """Store the response length that analytics snapshots read instead of the response text"""
+    if 'response_length' in item:
+        return None
+    return {'response_length': len(item.get('llm_response') or '')}
+
+# Built-in migrations, any other module:function taking an item and returning its changes can be run too
+MIGRATIONS = {
+    'shard_keys': shard_keys,
+    'archive_ttl': archive_ttl,
+    'review_queue': review_queue_keys,
+    'response_length': response_length
+}
+
+def load_transform(name):
+    """Get a built-in migration, or import a transform given as module:function"""
+    if name in MIGRATIONS:
+        return MIGRATIONS[name]
+    module_name, _, function_name = name.partition(':')
+    if not function_name:
+        raise ValueError(f"Unknown migration {name}, use one of {', '.join(MIGRATIONS)} or module:function")
+    return getattr(importlib.import_module(module_name), function_name)
+
+def build_update(table_name, item, changes):
+    """
+    Build the transaction update of an item's changes. The condition skips items that were deleted or
+    modified since they were scanned, their new version is picked up by a verify pass or a rerun
+    """
+    names = {'#id': 'id', '#lm': 'last_modified'}
+    values = {}
+    sets = []
+    removes = []
+    for i, (attribute, value) in enumerate(changes.items()):
+        names[f"#a{i}"] = attribute
+        if value is REMOVE:
+            removes.append(f"#a{i}")
+        else:
+            values[f":v{i}"] = value
+            sets.append(f"#a{i} = :v{i}")
+
+    update_expression = ' '.join(part for part in (
+        'SET ' + ', '.join(sets) if sets else '',
+        'REMOVE ' + ', '.join(removes) if removes else ''
+    ) if part)
+    if 'last_modified' in item:
+        condition = 'attribute_exists(#id) AND #lm = :lm'
+        values[':lm'] = item['last_modified']
+    else:
+        condition = 'attribute_exists(#id) AND attribute_not_exists(#lm)'
+
+    update = {
+        'TableName': table_name,
+        'Key': {'id': item['id']},
+        'UpdateExpression': update_expression,
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': names
+    }
+    if values:
+        update['ExpressionAttributeValues'] = values
+    return update
+
+class CapacityLimiter:
+    """
+    Token bucket over consumed capacity units per second, shared by the segment workers. The cost of a
+    call is only known after it, so callers reserve its estimated cost first and settle the difference
+    after. The bucket starts empty and holds at most one second of capacity, so the rate holds from the start
+    """
+
+    def __init__(self, rate, initial_estimate):
+        self.rate = rate
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        # Capacity units per unit of work (a scanned page or a written item), from the calls so far
+        self.estimate = initial_estimate
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, count=1):
+        """Take the estimated cost of count units of work, waiting until it is covered. Returns the units reserved"""
+        if not self.rate:
+            return 0
+        with self.lock:
+            self._refill()
+            reserved = self.estimate * count
+            # Each caller takes its share before sleeping, so concurrent callers queue up instead of all passing
+            self.tokens -= reserved
+            delay = -self.tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+        return reserved
+
+    def settle(self, reserved, units, count=1):
+        """Correct a reservation by the capacity the call actually consumed"""
+        if not self.rate:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.rate, self.tokens + reserved - units)
+            if count and units:
+                self.estimate += ESTIMATE_WEIGHT * (units / count - self.estimate)
+
+class DynamoTarget:
+    """The feedback table, or a DynamoDB Local table with --endpoint-url"""
+
+    def __init__(self, table):
+        self.table = table
+        self.client = table.meta.client
+
+    def scan(self, segment, total_segments, start_key, limit):
+        scan_args = {
+            'Segment': segment,
+            'TotalSegments': total_segments,
+            'Limit': limit,
+            'ReturnConsumedCapacity': 'TOTAL'
+        }
+        if start_key:
+            scan_args['ExclusiveStartKey'] = start_key
+        response = self.table.scan(**scan_args)
+        return response.get('Items', []), response.get('LastEvaluatedKey'), response['ConsumedCapacity']['CapacityUnits']
+
+    def write(self, updates):
+        """
+        Apply updates in one transaction, returning one status per update (written, conflict, rolled_back,
+        retry or failed) and the consumed write capacity
+        """
+        try:
+            response = self.client.transact_write_items(
+                TransactItems=[{'Update': update} for update in updates],
+                ReturnConsumedCapacity='TOTAL'
+            )
+            return ['written'] * len(updates), sum(entry['CapacityUnits'] for entry in response.get('ConsumedCapacity', []))
+        except self.client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get('CancellationReasons', [])
+            statuses = []
+            for i in range(len(updates)):
+                code = reasons[i].get('Code', 'None') if i < len(reasons) else 'None'
+                statuses.append(CANCELLATION_STATUSES.get(code, 'retry'))
+            return statuses, 0
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code in RETRYABLE_ERRORS:
+                return ['retry'] * len(updates), 0
+            if len(updates) == 1:
+                logger.error(f"Error writing item {updates[0]['Key']['id']}: {str(e)}")
+                return ['failed'], 0
+            # A rejected transaction doesn't say which update was at fault, write them one at a time to find it
+            statuses = []
+            units = 0
+            for update in updates:
+                status, update_units = self.write([update])
+                statuses.extend(status)
+                units += update_units
+            return statuses, units
+
+class LocalTarget:
+    """
+    In-memory stand-in for the feedback table, loaded from NDJSON of plain items or DynamoDB export
+    lines. Scans, conditions and consumed capacity are simulated, so migrations can be tested offline
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.items = {}
+        self.lock = threading.Lock()
+        deserializer = TypeDeserializer()
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line, parse_float=Decimal)
+                if 'Item' in item:
+                    item = {key: deserializer.deserialize(value) for key, value in item['Item'].items()}
+                self.items[item['id']] = item
+
+    @staticmethod
+    def _units(item, unit_bytes):
+        return math.ceil(len(json.dumps(item, default=str)) / unit_bytes)
+
+    def scan(self, segment, total_segments, start_key, limit):
+        with self.lock:
+            # Items are spread over segments by a hash of their key, like DynamoDB partitions
+            ids = sorted(
+                item_id for item_id in self.items
+                if zlib.crc32(item_id.encode('utf-8')) % total_segments == segment
+                and (not start_key or item_id > start_key['id'])
+            )
+            page = [dict(self.items[item_id]) for item_id in ids[:limit]]
+        last_key = {'id': page[-1]['id']} if len(ids) > limit else None
+        # Eventually consistent reads cost half a unit per 4KB, summed over the page
+        units = math.ceil(sum(len(json.dumps(item, default=str)) for item in page) / 4096) * 0.5
+        return page, last_key, units
+
+    def write(self, updates):
+        with self.lock:
+            statuses = []
+            for update in updates:
+                current = self.items.get(update['Key']['id'])
+                expected = update.get('ExpressionAttributeValues', {}).get(':lm')
+                if current is None or current.get('last_modified') != expected:
+                    statuses.append('conflict')
+                else:
+                    statuses.append(None)
+            if 'conflict' in statuses:
+                return [status or 'rolled_back' for status in statuses], 0
+
+            units = 0
+            for update in updates:
+                item = self.items[update['Key']['id']]
+                names = update['ExpressionAttributeNames']
+                values = update.get('ExpressionAttributeValues', {})
+                for name, attribute in names.items():
+                    if not name.startswith('#a'):
+                        continue
+                    value_name = ':v' + name[2:]
+                    if value_name in values:
+                        item[attribute] = values[value_name]
+                    else:
+                        item.pop(attribute, None)
+                # Transactional writes cost two units per 1KB
+                units += 2 * self._units(item, 1024)
+            return ['written'] * len(updates), units
+
+    def save(self):
+        with open(self.path + '.part', 'w', encoding='utf-8') as f:
+            for item in self.items.values():
+                f.write(json.dumps(item, default=_json_default) + '\n')
+        os.replace(self.path + '.part', self.path)
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('latin-1')
+    return str(value)
+
+class Checkpoint:
+    """Per-segment scan positions of a migration in a local JSON file, saved after every page"""
+
+    def __init__(self, path, migration, total_segments, restart=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {'migration': migration, 'total_segments': total_segments, 'segments': {}}
+        if path and os.path.exists(path) and not restart:
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('migration') != migration or saved.get('total_segments') != total_segments:
+                raise ValueError(
+                    f"Checkpoint {path} is for {saved.get('migration')} with {saved.get('total_segments')} segments, "
+                    f"rerun with the same settings or --restart"
+                )
+            self.state = saved
+
+    def position(self, segment):
+        """Get the (start key, done) of a segment"""
+        entry = self.state['segments'].get(str(segment), {})
+        return entry.get('last_key'), entry.get('done', False)
+
+    def update(self, segment, last_key, done):
+        with self.lock:
+            self.state['segments'][str(segment)] = {'last_key': last_key, 'done': done}
+            if not self.path:
+                return
+            with open(self.path + '.part', 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, default=_json_default)
+            os.replace(self.path + '.part', self.path)
+
+class Migration:
+    """Run a transform over every item of the feedback table with a parallel segmented scan"""
+
+    def __init__(self, target, table_name, transform, mode='apply', segments=DEFAULT_SEGMENTS,
+                 read_rate=None, write_rate=None, checkpoint=None, batch_size=TRANSACTION_SIZE):
+        self.target = target
+        self.table_name = table_name
+        self.transform = transform
+        self.mode = mode
+        self.segments = segments
+        self.read_limiter = CapacityLimiter(read_rate, INITIAL_PAGE_READ_UNITS)
+        self.write_limiter = CapacityLimiter(write_rate, INITIAL_ITEM_WRITE_UNITS)
+        self.checkpoint = checkpoint or Checkpoint(None, transform.__name__, segments)
+        self.batch_size = batch_size
+        self.counts = {'scanned': 0, 'changed': 0, 'written': 0, 'conflicts': 0, 'failed': 0, 'read_units': 0.0, 'write_units': 0.0}
+        self.samples = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def _count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                self.counts[name] += value
+
+    def _write(self, pending):
+        """
+        Write (item, changes) pairs in transactions, retrying rolled back and throttled updates.
+        Updates that can't be written are counted as failed and the run carries on
+        """
+        updates = [build_update(self.table_name, item, changes) for item, changes in pending]
+        for attempt in range(MAX_ATTEMPTS):
+            reserved = self.write_limiter.reserve(len(updates))
+            try:
+                statuses, units = self.target.write(updates)
+            except Exception as e:
+                logger.error(f"Error writing {len(updates)} updates: {str(e)}", exc_info=True)
+                statuses, units = ['retry'] * len(updates), 0
+            self.write_limiter.settle(reserved, units, len(updates))
+            self._count(
+                write_units=units,
+                written=statuses.count('written'),
+                conflicts=statuses.count('conflict'),
+                failed=statuses.count('failed')
+            )
+            # Updates rolled back because of another item's conflict, or throttled, are tried again
+            updates = [update for update, status in zip(updates, statuses) if status in ('rolled_back', 'retry')]
+            if not updates:
+                return
+            if 'retry' in statuses:
+                time.sleep(random.uniform(0, RETRY_BASE_SECONDS * 2 ** attempt))
+        logger.error(f"Gave up on {len(updates)} updates after {MAX_ATTEMPTS} attempts")
+        self._count(failed=len(updates))
+
+    def _run_segment(self, segment):
+        start_key, done = self.checkpoint.position(segment)
+        attempt = 0
+        while not done and not self.stopped.is_set():
+            reserved = self.read_limiter.reserve()
+            try:
+                items, last_key, units = self.target.scan(segment, self.segments, start_key, PAGE_SIZE)
+            except ClientError as e:
+                self.read_limiter.settle(reserved, 0)
+                attempt += 1
+                if e.response.get('Error', {}).get('Code') not in RETRYABLE_ERRORS or attempt >= MAX_ATTEMPTS:
+                    raise
+                # The page is read again from the same position
+                time.sleep(random.uniform(0, RETRY_BASE_SECONDS * 2 ** attempt))
+                continue
+            attempt = 0
+            self.read_limiter.settle(reserved, units)
+            self._count(scanned=len(items), read_units=units)
+
+            pending = []
+            for item in items:
+                try:
+                    changes = self.transform(item)
+                except Exception as e:
+                    logger.error(f"Error transforming item {item.get('id')}: {str(e)}")
+                    self._count(failed=1)
+                    continue
+                if changes:
+                    pending.append((item, changes))
+            self._count(changed=len(pending))
+            with self.lock:
+                for item, changes in pending[:SAMPLE_SIZE - len(self.samples)]:
+                    self.samples.append({'id': item['id'], 'changes': {
+                        attribute: None if value is REMOVE else value for attribute, value in changes.items()
+                    }})
+
+            if self.mode == 'apply':
+                for start in range(0, len(pending), self.batch_size):
+                    self._write(pending[start:start + self.batch_size])
+
+            done = last_key is None
+            start_key = last_key
+            # Read-only passes start over every time, only applied pages are checkpointed
+            if self.mode == 'apply':
+                self.checkpoint.update(segment, last_key, done)
+
+    def report(self, elapsed):
+        """Counts and rates of the run so far"""
+        with self.lock:
+            counts = dict(self.counts)
+        seconds = max(elapsed, 1e-9)
+        return dict(
+            counts,
+            read_units=round(counts['read_units'], 1),
+            write_units=round(counts['write_units'], 1),
+            mode=self.mode,
+            elapsed_seconds=round(elapsed, 1),
+            items_per_second=round(counts['scanned'] / seconds, 1),
+            writes_per_second=round(counts['written'] / seconds, 1),
+            read_units_per_second=round(counts['read_units'] / seconds, 1),
+            write_units_per_second=round(counts['write_units'] / seconds, 1)
+        )
+
+    def run(self):
+        started = time.time()
+
+        def progress():
+            while not self.stopped.wait(PROGRESS_INTERVAL):
+                r = self.report(time.time() - started)
+                print(f"[{r['elapsed_seconds']:.0f}s] scanned {r['scanned']}, changed {r['changed']}, written {r['written']}, "
+                      f"conflicts {r['conflicts']}, failed {r['failed']} | {r['items_per_second']} items/s, "
+                      f"{r['read_units_per_second']} RCU/s, {r['write_units_per_second']} WCU/s")
+
+        reporter = threading.Thread(target=progress, daemon=True)
+        reporter.start()
+        executor = ThreadPoolExecutor(max_workers=self.segments)
+        try:
+            futures = [executor.submit(self._run_segment, segment) for segment in range(self.segments)]
+            for future in futures:
+                future.result()
+        except KeyboardInterrupt:
+            # Workers finish their current page, the checkpoint resumes from the next one
+            print("Stopping after the current pages")
+            raise
+        finally:
+            self.stopped.set()
+            executor.shutdown(wait=True)
+        return self.report(time.time() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description='Rewrite feedback items with a transform, at a controlled capacity')
+    parser.add_argument('migration', help=f"Built-in migration ({', '.join(MIGRATIONS)}) or module:function")
+    parser.add_argument('--table-name', default='user-feedback', help='DynamoDB feedback table')
+    parser.add_argument('--endpoint-url', help='DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local')
+    parser.add_argument('--local-file', help='Run against an in-memory copy of this NDJSON export, written back when done')
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS, help='Parallel scan segments')
+    parser.add_argument('--read-rate', type=float, help='Target read capacity units per second (default: unlimited)')
+    parser.add_argument('--write-rate', type=float, help='Target write capacity units per second (default: unlimited)')
+    parser.add_argument('--batch-size', type=int, default=TRANSACTION_SIZE, help='Items per write transaction (max 100)')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: migrate-<migration>.checkpoint.json)')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start over')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--dry-run', action='store_true', help='Count and sample the changes without writing')
+    mode.add_argument('--verify', action='store_true', help='Count the items the migration would still change')
+    parser.add_argument('--report', help='Write the final throughput report to this JSON file')
+
+    args = parser.parse_args()
+
+    transform = load_transform(args.migration)
+    if args.local_file:
+        target = LocalTarget(args.local_file)
+    else:
+        target = DynamoTarget(boto3.resource('dynamodb', endpoint_url=args.endpoint_url).Table(args.table_name))
+
+    mode = 'dry_run' if args.dry_run else 'verify' if args.verify else 'apply'
+    checkpoint = None
+    if mode == 'apply':
+        path = args.checkpoint or f"migrate-{args.migration.replace(':', '-')}.checkpoint.json"
+        checkpoint = Checkpoint(path, args.migration, args.segments, args.restart)
+
+    migration = Migration(
+        target, args.table_name, transform, mode, args.segments,
+        args.read_rate, args.write_rate, checkpoint, min(args.batch_size, 100)
+    )
+    report = migration.run()
+
+    if mode == 'apply':
+        if isinstance(target, LocalTarget):
+            target.save()
+        elif report['written']:
+            # Readers may have cached pages of the old items
+            feedback_cache.bump_version()
+
+    if mode == 'verify':
+        print(f"{report['changed']} of {report['scanned']} items still need the migration")
+    elif mode == 'dry_run':
+        print(f"Would change {report['changed']} of {report['scanned']} items, for example:")
+    for sample in migration.samples if mode != 'apply' else []:
+        print(f"  {sample['id']}: {json.dumps(sample['changes'], default=_json_default)}")
+    print(json.dumps(report, indent=2))
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(dict(report, samples=migration.samples), f, indent=2, default=_json_default)
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,51 @@ import os
 import boto3
 import logging
 import jwt
-from boto3.dynamodb.conditions import Key
+import base64
+import hashlib
+from decimal import Decimal
+from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Key, Attr
+import feedback_cache
+import feedback_search
+import feedback_sharding
+import feedback_archive
+import feedback_clusters
+import latency_metrics
+import profiling
+import warmup
+import response_encoding
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = boto3.resource('dynamodb', config=warmup.CLIENT_CONFIG)
 cognito = boto3.client('cognito-idp')
 
+# Attributes that can be requested with the fields parameter
+FEEDBACK_FIELDS = [
+    'id', 'conversation_id', 'feedback_type', 'feedback_text', 'original_query',
+    'llm_response', 'model_id', 'timestamp', 'last_modified', 'user_id', 'reviewed', 'reviewer_comments',
+    'reviewer_id', 'reviewed_at', 'lease_owner', 'lease_expires_at'
+]
+
+# Long text attributes that are shortened to a preview in the default summary shape
+PREVIEW_FIELDS = ['original_query', 'llm_response']
+PREVIEW_LENGTH = int(os.environ.get('FEEDBACK_PREVIEW_LENGTH', '280'))
+
+# Bookkeeping attributes that are never returned, expires_at is the numeric TTL of reviewed items
+INTERNAL_FIELDS = ['expires_at']
+
+# Delta sync tokens trail the current time so late index updates are picked up on the next sync
+SYNC_OVERLAP_SECONDS = int(os.environ.get('SYNC_OVERLAP_SECONDS', '10'))
+MAX_SYNC_DAYS = int(os.environ.get('MAX_SYNC_DAYS', '31'))
+
+# Maximum number of ranked matches returned by a search (BatchGetItem reads up to 100 keys)
+SEARCH_RESULT_LIMIT = int(os.environ.get('SEARCH_RESULT_LIMIT', '50'))
+
+@latency_metrics.span('auth')
 def extract_user_from_token(event):
     """Extract user information from JWT token"""
     try:
@@ -42,7 +77,367 @@ def extract_user_from_token(event):
         logger.error(f"Error extracting user from token: {str(e)}", exc_info=True)
         return None
 
+def encode_cursor(last_evaluated_key):
+    """Encode a DynamoDB LastEvaluatedKey as an opaque pagination cursor"""
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode('utf-8')).decode('utf-8')
+
+def decode_cursor(cursor):
+    """Decode a pagination cursor back into a DynamoDB ExclusiveStartKey"""
+    if not cursor:
+        return None
+    return json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+
+def parse_fields(fields_param):
+    """Parse the comma separated fields parameter, raising ValueError on unknown fields"""
+    if not fields_param:
+        return None
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in FEEDBACK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def build_projection(fields):
+    """Build ProjectionExpression arguments for the requested fields"""
+    if not fields:
+        return {}
+    # Use placeholders since some attribute names (e.g. timestamp) are reserved words
+    names = {f"#f{i}": field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(names.keys()),
+        'ExpressionAttributeNames': names
+    }
+
+def public_item(item):
+    """Copy an item without its internal bookkeeping attributes, with numbers made JSON safe"""
+    public = {}
+    for key, value in item.items():
+        if key in INTERNAL_FIELDS:
+            continue
+        # Numeric attributes such as response_length are read back as Decimal
+        if isinstance(value, Decimal):
+            value = int(value) if value == value.to_integral_value() else float(value)
+        public[key] = value
+    return public
+
+def summarize_item(item):
+    """Shorten long text attributes to a preview for list views"""
+    summary = public_item(item)
+    for field in PREVIEW_FIELDS:
+        value = summary.get(field)
+        if isinstance(value, str) and len(value) > PREVIEW_LENGTH:
+            summary[field] = value[:PREVIEW_LENGTH]
+            summary['truncated'] = True
+    return summary
+
+@latency_metrics.span('dynamodb')
+def query_feedback(table, user_id, is_reviewer, conversation_id, feedback_type, start_key, fields=None, include_archive=False):
+    """
+    Query or scan the feedback table, returning the items and the key to resume from:
+    the LastEvaluatedKey of a scan, the per-shard start keys of a sharded index query,
+    or the archive position once the table is exhausted and include_archive was asked for
+    """
+    # Older reviewed items have been moved to the archive, which is only read after the table on request
+    archive_store = feedback_archive.get_archive_store()
+    if start_key and 'archive' in start_key:
+        if archive_store is None:
+            return [], None
+        items, archive_key = feedback_archive.read_page(
+            archive_store, archive_filter(user_id, is_reviewer, conversation_id, feedback_type), start_key['archive']
+        )
+        if fields:
+            items = [{field: item[field] for field in fields if field in item} for item in items]
+        else:
+            items = [summarize_item(item) for item in items]
+        return items, {'archive': archive_key} if archive_key else None
+    
+    # Only read the requested attributes
+    projection = build_projection(fields)
+    
+    # If the user is not a reviewer, they can only see their own feedback
+    if not is_reviewer:
+        logger.info(f"Regular user {user_id} can only see their own feedback")
+        
+        # If conversation_id is provided, get feedback for that conversation and user
+        if conversation_id:
+            logger.info(f"Querying feedback for conversation: {conversation_id} and user: {user_id}")
+            items, last_key = feedback_sharding.query_shards(
+                table, feedback_sharding.CONVERSATION_SHARD_INDEX, conversation_id, start_key,
+                FilterExpression=Key('user_id').eq(user_id),
+                **projection
+            )
+        # Otherwise, get all feedback for this user
+        else:
+            logger.info(f"Querying all feedback for user: {user_id}")
+            items, last_key = feedback_sharding.query_shards(
+                table, feedback_sharding.USER_SHARD_INDEX, user_id, start_key, **projection
+            )
+    
+    # If the user is a reviewer, they can see all feedback
+    else:
+        logger.info(f"Reviewer {user_id} can see all feedback")
+        
+        # Resume from the previous page if a cursor was given
+        paging = {'ExclusiveStartKey': start_key} if start_key else {}
+        paging.update(projection)
+        
+        # If conversation_id is provided, get feedback for that conversation
+        if conversation_id:
+            logger.info(f"Querying feedback for conversation: {conversation_id}")
+            items, last_key = feedback_sharding.query_shards(
+                table, feedback_sharding.CONVERSATION_SHARD_INDEX, conversation_id, start_key, **projection
+            )
+        # If feedback_type is provided, scan for that type
+        elif feedback_type:
+            logger.info(f"Scanning feedback for type: {feedback_type}")
+            response = table.scan(
+                FilterExpression=Key('feedback_type').eq(feedback_type),
+                **paging
+            )
+            items, last_key = response.get('Items', []), response.get('LastEvaluatedKey')
+        # Otherwise, get all feedback (with limit)
+        else:
+            logger.info("Scanning all feedback (limit 100)")
+            response = table.scan(Limit=100, **paging)
+            items, last_key = response.get('Items', []), response.get('LastEvaluatedKey')
+    
+    # Without an explicit field list, return the summary shape with truncated previews
+    if not fields:
+        items = [summarize_item(item) for item in items]
+    
+    # Continue into the archive once the table has no more pages, if the client asked for it
+    if last_key is None and include_archive and archive_store is not None:
+        last_key = {'archive': {}}
+    
+    return items, last_key
+
+def archive_filter(user_id, is_reviewer, conversation_id, feedback_type):
+    """Build the check that archived items pass to be listed, matching the table query for the same parameters"""
+    def match(item):
+        if not is_reviewer and item.get('user_id') != user_id:
+            return False
+        if conversation_id:
+            return item.get('conversation_id') == conversation_id
+        if is_reviewer and feedback_type:
+            return item.get('feedback_type') == feedback_type
+        return True
+    return match
+
+@latency_metrics.span('dynamodb')
+def get_feedback_detail(table, feedback_id, user_id, is_reviewer):
+    """Get the full feedback item by id, as a Lambda proxy response"""
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+        'Access-Control-Allow-Methods': 'OPTIONS,GET'
+    }
+    
+    logger.info(f"Getting feedback item: {feedback_id}")
+    response = table.get_item(Key={'id': feedback_id})
+    item = response.get('Item')
+    
+    # Regular users can only see their own feedback
+    if item is None or (not is_reviewer and item.get('user_id') != user_id):
+        logger.warning(f"Feedback item {feedback_id} not found for user {user_id}")
+        return {
+            'statusCode': 404,
+            'headers': headers,
+            'body': json.dumps({'error': 'Feedback item not found'})
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': json.dumps({
+            'feedback_item': public_item(item),
+            'is_reviewer': is_reviewer
+        })
+    }
+
+def make_sync_token(since=None):
+    """Build the token a client passes as since on its next delta sync"""
+    token = (datetime.utcnow() - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+    # Never move a client's token backwards
+    return max(token, since) if since else token
+
+def parse_since(since):
+    """Validate a since token, raising ValueError if it is malformed or too old"""
+    try:
+        since_time = datetime.fromisoformat(since)
+    except ValueError:
+        raise ValueError("Invalid since token")
+    if datetime.utcnow() - since_time > timedelta(days=MAX_SYNC_DAYS):
+        raise ValueError("since token is too old, reload the full feedback list")
+    return since_time
+
+@latency_metrics.span('dynamodb')
+def query_feedback_changes(table, user_id, is_reviewer, conversation_id, feedback_type, since, fields=None):
+    """Get feedback items created or reviewed after the since token"""
+    changed = Attr('last_modified').gt(since)
+    projection = build_projection(fields)
+    
+    if conversation_id:
+        # Feedback for a single conversation is small, filter it by modification time
+        condition = changed if is_reviewer else changed & Attr('user_id').eq(user_id)
+        items = feedback_sharding.query_all_shards(
+            table, feedback_sharding.CONVERSATION_SHARD_INDEX, conversation_id,
+            FilterExpression=condition, **projection
+        )
+    elif not is_reviewer:
+        items = feedback_sharding.query_all_shards(
+            table, feedback_sharding.USER_SHARD_INDEX, user_id,
+            FilterExpression=changed, **projection
+        )
+    else:
+        # Reviewers read the modification index, one partition per day since the token
+        day = datetime.fromisoformat(since).date()
+        today = datetime.utcnow().date()
+        items = []
+        while day <= today:
+            request = {
+                'IndexName': 'ModifiedIndex',
+                'KeyConditionExpression': Key('modified_day').eq(day.isoformat()) & Key('last_modified').gt(since),
+                **projection
+            }
+            if feedback_type:
+                request['FilterExpression'] = Attr('feedback_type').eq(feedback_type)
+            while True:
+                response = table.query(**request)
+                items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    break
+                request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            day += timedelta(days=1)
+    
+    # Without an explicit field list, return the summary shape with truncated previews
+    if not fields:
+        items = [summarize_item(item) for item in items]
+    
+    return items
+
+@latency_metrics.span('search')
+def search_feedback(table, search_query, user_id, is_reviewer, fields):
+    """Search feedback text, queries and responses, returning items ranked by BM25 score"""
+    logger.info(f"Searching feedback for: {search_query}")
+    # Regular users' searches only rank their own items, reviewers search everything
+    matches = feedback_search.search(search_query, SEARCH_RESULT_LIMIT, None if is_reviewer else user_id)
+    if not matches:
+        return []
+    
+    # The user_id is always needed to enforce visibility
+    projection = build_projection(sorted(set(fields) | {'id', 'user_id'})) if fields else {}
+    
+    # Fetch the matching items, retrying any unprocessed keys
+    request = {table.name: {'Keys': [{'id': feedback_id} for feedback_id, _ in matches], **projection}}
+    found = {}
+    while request:
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(table.name, []):
+            found[item['id']] = item
+        request = response.get('UnprocessedKeys') or None
+    
+    items = []
+    for feedback_id, score in matches:
+        item = found.get(feedback_id)
+        
+        # Regular users can only see their own feedback
+        if item is None or (not is_reviewer and item.get('user_id') != user_id):
+            continue
+        
+        if fields:
+            item = {field: item[field] for field in fields if field in item}
+        else:
+            item = summarize_item(item)
+        item['search_score'] = round(score, 4)
+        items.append(item)
+    
+    return items
+
+@latency_metrics.span('dynamodb')
+def get_feedback_clusters(group_by, feedback_type, cursor, is_reviewer):
+    """List the near-duplicate clusters of a feedback type by size, as a Lambda proxy response"""
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+        'Access-Control-Allow-Methods': 'OPTIONS,GET'
+    }
+    
+    feedback_type = feedback_type or 'negative'
+    if group_by != 'cluster' or feedback_type not in feedback_clusters.CLUSTERED_TYPES:
+        error = f"Unknown group_by: {group_by}" if group_by != 'cluster' else f"Feedback type {feedback_type} is not clustered"
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': error})}
+    
+    # Clusters span all users, so only reviewers see them
+    if not is_reviewer:
+        logger.warning("Regular user requested feedback clusters")
+        return {'statusCode': 403, 'headers': headers, 'body': json.dumps({'error': 'Only reviewers can group feedback'})}
+    
+    table = feedback_clusters.get_cluster_table()
+    if table is None:
+        return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'Feedback clustering is not configured'})}
+    
+    clusters, last_key = feedback_clusters.list_clusters(table, feedback_type, decode_cursor(cursor))
+    logger.info(f"Retrieved {len(clusters)} feedback clusters")
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': json.dumps({
+            'cluster_count': len(clusters),
+            'clusters': clusters,
+            'next_cursor': encode_cursor(last_key),
+            'is_reviewer': is_reviewer
+        })
+    }
+
+def make_etag(version, cache_key, items=None):
+    """Build an ETag from the table version stamp, or from the item ids and timestamps"""
+    if version is not None:
+        return f'"{version}-{cache_key[:16]}"'
+    digest = hashlib.sha256()
+    for item in items:
+        digest.update(f"{item.get('id')}|{item.get('timestamp')}|{item.get('reviewed')}|{item.get('reviewer_id')};".encode('utf-8'))
+    return f'"{digest.hexdigest()[:32]}"'
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in [candidate.replace('W/', '', 1) for candidate in candidates]
+
+def not_modified_response(etag):
+    """Build an empty 304 Not Modified response"""
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+            'Access-Control-Allow-Methods': 'OPTIONS,GET',
+            'Access-Control-Expose-Headers': 'ETag'
+        },
+        'body': ''
+    }
+
+def warm_up():
+    """Open the table and cache connections and load the search index ahead of the first read"""
+    table = dynamodb.Table(os.environ.get('FEEDBACK_TABLE_NAME'))
+    warmup.open_connections(lambda: table.get_item(Key={'id': 'warmup'}))
+    warmup.open_connections(feedback_cache.get_current_version, count=1)
+    feedback_search.warm_up(preload=True)
+
+@warmup.warmable(warm_up)
+@latency_metrics.instrument('reader')
+@profiling.profiled('reader')
 def lambda_handler(event, context):
+    # Compress large responses for clients that accept it
+    return response_encoding.compress_response(event, read_feedback(event, context))
+
+def read_feedback(event, context):
     # Log the incoming event
     logger.info(f"Received event: {json.dumps(event)}")
     
@@ -61,57 +456,152 @@ def lambda_handler(event, context):
         query_params = event.get('queryStringParameters', {}) or {}
         conversation_id = query_params.get('conversation_id')
         feedback_type = query_params.get('feedback_type')
+        cursor = query_params.get('cursor')
+        feedback_id = query_params.get('id')
+        search_query = query_params.get('q')
+        since = query_params.get('since')
+        group_by = query_params.get('group_by')
+        include_archive = query_params.get('archive', 'false').lower() == 'true'
         
         logger.info(f"Query parameters - conversation_id: {conversation_id}, feedback_type: {feedback_type}")
         
-        # If the user is not a reviewer, they can only see their own feedback
-        if not is_reviewer:
-            logger.info(f"Regular user {user_id} can only see their own feedback")
+        # Validate requested fields
+        try:
+            fields = parse_fields(query_params.get('fields'))
+        except ValueError as e:
+            logger.warning(f"Invalid fields parameter: {str(e)}")
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+                    'Access-Control-Allow-Methods': 'OPTIONS,GET'
+                },
+                'body': json.dumps({'error': str(e)})
+            }
+        
+        # Validate the delta sync token
+        if since:
+            try:
+                parse_since(since)
+            except ValueError as e:
+                logger.warning(f"Invalid since parameter: {str(e)}")
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+                        'Access-Control-Allow-Methods': 'OPTIONS,GET'
+                    },
+                    'body': json.dumps({'error': str(e)})
+                }
+        
+        # If a feedback id is provided, return the full item
+        if feedback_id:
+            return get_feedback_detail(table, feedback_id, user_id, is_reviewer)
+        
+        # If grouping by cluster, return one representative per group of near-duplicates
+        if group_by:
+            return get_feedback_clusters(group_by, feedback_type, cursor, is_reviewer)
+        
+        # If a search query is provided, return ranked matches
+        if search_query:
+            items = search_feedback(table, search_query, user_id, is_reviewer, fields)
+            logger.info(f"Search returned {len(items)} feedback items")
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+                    'Access-Control-Allow-Methods': 'OPTIONS,GET'
+                },
+                'body': json.dumps({
+                    'feedback_count': len(items),
+                    'feedback_items': items,
+                    'is_reviewer': is_reviewer
+                })
+            }
+        
+        # Serve repeated dashboard reads from the cache while the table version is unchanged
+        role = 'reviewer' if is_reviewer else 'user'
+        cache_key = feedback_cache.make_cache_key(role, user_id, conversation_id, feedback_type, cursor, fields, include_archive)
+        version = feedback_cache.get_current_version()
+        
+        # Nothing has changed since the client's copy, skip the read entirely
+        if_none_match = response_encoding.get_header(event, 'If-None-Match')
+        if version is not None:
+            etag = make_etag(version, cache_key)
+            if etag_matches(if_none_match, etag):
+                logger.info("Feedback unchanged, returning 304 Not Modified")
+                return not_modified_response(etag)
+        
+        # If a since token is provided, return only the changes after it
+        if since:
+            sync_token = make_sync_token(since)
+            items = query_feedback_changes(table, user_id, is_reviewer, conversation_id, feedback_type, since, fields)
+            logger.info(f"Retrieved {len(items)} feedback items changed since {since}")
             
-            # If conversation_id is provided, get feedback for that conversation and user
-            if conversation_id:
-                logger.info(f"Querying feedback for conversation: {conversation_id} and user: {user_id}")
-                response = table.query(
-                    IndexName="ConversationIndex",
-                    KeyConditionExpression=Key('conversation_id').eq(conversation_id),
-                    FilterExpression=Key('user_id').eq(user_id)
-                )
-                items = response.get('Items', [])
-            # Otherwise, get all feedback for this user
-            else:
-                logger.info(f"Querying all feedback for user: {user_id}")
-                response = table.query(
-                    IndexName="UserIndex",
-                    KeyConditionExpression=Key('user_id').eq(user_id)
-                )
-                items = response.get('Items', [])
-        
-        # If the user is a reviewer, they can see all feedback
-        else:
-            logger.info(f"Reviewer {user_id} can see all feedback")
+            headers = {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+                'Access-Control-Allow-Methods': 'OPTIONS,GET',
+                'Access-Control-Expose-Headers': 'ETag'
+            }
+            
+            # The client can skip the next delta while the version stamp is unchanged
+            if version is not None:
+                headers['ETag'] = etag
             
-            # If conversation_id is provided, get feedback for that conversation
-            if conversation_id:
-                logger.info(f"Querying feedback for conversation: {conversation_id}")
-                response = table.query(
-                    IndexName="ConversationIndex",
-                    KeyConditionExpression=Key('conversation_id').eq(conversation_id)
-                )
-                items = response.get('Items', [])
-            # If feedback_type is provided, scan for that type
-            elif feedback_type:
-                logger.info(f"Scanning feedback for type: {feedback_type}")
-                response = table.scan(
-                    FilterExpression=Key('feedback_type').eq(feedback_type)
-                )
-                items = response.get('Items', [])
-            # Otherwise, get all feedback (with limit)
-            else:
-                logger.info("Scanning all feedback (limit 100)")
-                response = table.scan(Limit=100)
-                items = response.get('Items', [])
-        
-        logger.info(f"Retrieved {len(items)} feedback items")
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({
+                    'feedback_count': len(items),
+                    'feedback_items': items,
+                    'sync_token': sync_token,
+                    'is_reviewer': is_reviewer
+                })
+            }
+        
+        with latency_metrics.span('cache'):
+            page = feedback_cache.get(cache_key, version)
+        cache_status = 'HIT' if page is not None else 'MISS'
+        
+        if page is None:
+            # Taken before the read so changes made during it are included in the next delta
+            sync_token = make_sync_token()
+            items, next_cursor = query_feedback(
+                table, user_id, is_reviewer, conversation_id, feedback_type, decode_cursor(cursor), fields, include_archive
+            )
+            page = {
+                'items': items,
+                'next_cursor': encode_cursor(next_cursor),
+                'sync_token': sync_token
+            }
+            feedback_cache.put(cache_key, version, page)
+        
+        items = page['items']
+        logger.info(f"Retrieved {len(items)} feedback items (cache {cache_status})")
+        feedback_cache.emit_metrics()
+        
+        # Without a version stamp, the ETag is derived from the result set
+        etag = make_etag(version, cache_key, items)
+        if etag_matches(if_none_match, etag):
+            logger.info("Feedback unchanged, returning 304 Not Modified")
+            return not_modified_response(etag)
+        
+        with latency_metrics.span('serialize'):
+            body = json.dumps({
+                'feedback_count': len(items),
+                'feedback_items': items,
+                'next_cursor': page['next_cursor'],
+                'sync_token': page['sync_token'],
+                'is_reviewer': is_reviewer
+            })
         
         # Return successful response
         return {
@@ -119,14 +609,13 @@ def lambda_handler(event, context):
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-                'Access-Control-Allow-Methods': 'OPTIONS,GET'
+                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
+                'Access-Control-Allow-Methods': 'OPTIONS,GET',
+                'Access-Control-Expose-Headers': 'ETag',
+                'ETag': etag,
+                'X-Cache': cache_status
             },
-            'body': json.dumps({
-                'feedback_count': len(items),
-                'feedback_items': items,
-                'is_reviewer': is_reviewer
-            })
+            'body': body
         }
         
     except Exception as e:
@@ -136,8 +625,11 @@ def lambda_handler(event, context):
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match',
                 'Access-Control-Allow-Methods': 'OPTIONS,GET'
             },
             'body': json.dumps({'error': f"Error reading feedback: {str(e)}"})
-        }
\ No newline at end of file
+        }
+
+# Provisioned concurrency runs the warm-up during init
+warmup.warm_on_provisioned_init(warm_up)
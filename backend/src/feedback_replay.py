@@ -0,0 +1,365 @@
+import os
+import re
+import gzip
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeDeserializer
+
+# pyarrow is optional, without it the replayed results are left in the NDJSON staging files
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Attributes read from the feedback table or export for each replayed item
+REPLAY_ATTRIBUTES = ['id', 'feedback_type', 'original_query', 'llm_response', 'model_id', 'timestamp']
+
+# Replay settings
+DEFAULT_CONCURRENCY = 16
+PROGRESS_INTERVAL = 30
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# Columns of the side-by-side output, one row per feedback item
+OUTPUT_COLUMNS = [
+    'feedback_id', 'feedback_type', 'timestamp', 'query_hash', 'original_query',
+    'stored_model_id', 'stored_response', 'replay_model_id', 'replay_response', 'replay_sources',
+    'replay_truncation', 'input_tokens', 'output_tokens', 'latency_ms', 'replayed_at'
+]
+
+def query_hash(query):
+    """Hash a query for deduplication, ignoring differences in whitespace"""
+    normalized = re.sub(r'\s+', ' ', query).strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def iter_table_items(table, feedback_type=None):
+    """Stream feedback items from the table"""
+    names = {f"#a{i}": attribute for i, attribute in enumerate(REPLAY_ATTRIBUTES)}
+    scan_args = {
+        'ProjectionExpression': ', '.join(names.keys()),
+        'ExpressionAttributeNames': names
+    }
+    if feedback_type:
+        scan_args['FilterExpression'] = Attr('feedback_type').eq(feedback_type)
+
+    while True:
+        response = table.scan(**scan_args)
+        for item in response.get('Items', []):
+            yield item
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def iter_export_items(path, feedback_type=None):
+    """
+    Stream feedback items from an export file, either NDJSON of plain items or a
+    DynamoDB export to S3 ({"Item": {...}} lines in DynamoDB JSON), optionally gzipped
+    """
+    deserializer = TypeDeserializer()
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if 'Item' in item:
+                item = {key: deserializer.deserialize(value) for key, value in item['Item'].items()}
+            if feedback_type and item.get('feedback_type') != feedback_type:
+                continue
+            yield item
+
+class RateLimiter:
+    """Token bucket limiting the calls per second across all workers"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class FakeBedrock:
+    """Offline stand-in for the bedrock-runtime client, answering with a deterministic echo"""
+
+    def __init__(self, latency=0.05, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+
+    def converse_stream(self, modelId, messages, inferenceConfig=None, **kwargs):
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.error_rate:
+            raise RuntimeError("Fake Bedrock error")
+        # The question comes after any grounding passages
+        text = messages[-1]['content'][-1]['text']
+        words = f"[{modelId}] {text[::-1]}".split(' ')
+        # One word per output token, cut off at maxTokens like a real generation
+        max_tokens = (inferenceConfig or {}).get('maxTokens', len(words))
+        stop_reason = 'max_tokens' if len(words) > max_tokens else 'end_turn'
+        words = words[:max_tokens]
+
+        def events():
+            yield {'messageStart': {'role': 'assistant'}}
+            for i, word in enumerate(words):
+                yield {'contentBlockDelta': {'delta': {'text': word if i == 0 else f" {word}"}, 'contentBlockIndex': 0}}
+            yield {'messageStop': {'stopReason': stop_reason}}
+            yield {'metadata': {
+                'usage': {'inputTokens': len(text.split()), 'outputTokens': len(words)},
+                'metrics': {'latencyMs': int(self.latency * 1000)}
+            }}
+
+        return {'stream': events()}
+
+def staging_paths(output_path):
+    """Get the staging files of an output: replayed answers (the checkpoint) and the items seen"""
+    return f"{output_path}.results.ndjson", f"{output_path}.items.ndjson"
+
+def load_checkpoint(results_path):
+    """Get the hashes of the queries already replayed"""
+    done = set()
+    if os.path.exists(results_path):
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['query_hash'])
+                except (ValueError, KeyError):
+                    # Partial last line from an interrupted run, the query is replayed again
+                    continue
+    return done
+
+def replay(items, output_path, model_id, client, concurrency=DEFAULT_CONCURRENCY, rate=None, limit=None):
+    """
+    Replay the unique queries of a stream of feedback items through Bedrock,
+    staging the answers so an interrupted replay resumes where it left off
+    """
+    # app and retrieval create boto3 clients at import time, main sets a region first for the offline fake
+    import app
+    import retrieval
+    import bedrock_deadline
+    
+    results_path, items_path = staging_paths(output_path)
+    done = load_checkpoint(results_path)
+    if done:
+        print(f"Resuming, {len(done)} queries already replayed")
+
+    limiter = RateLimiter(rate)
+    counts = {'items': 0, 'unique': 0, 'replayed': 0, 'resumed': 0, 'failed': 0}
+    lock = threading.Lock()
+    started = time.time()
+    last_report = [started]
+
+    # Bound the queries read ahead of the workers so the source is streamed
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    def report():
+        elapsed = time.time() - started
+        rate_done = counts['replayed'] / elapsed if elapsed > 0 else 0.0
+        print(f"[{elapsed:.0f}s] {', '.join(f'{name}: {count}' for name, count in counts.items())} | {rate_done:.2f} queries/s")
+
+    def run(hash_value, query, results_file):
+        try:
+            limiter.acquire()
+            call_started = time.time()
+            # Grounded like live traffic, with the same retrieval and system prompt
+            passages = retrieval.retrieve(query)
+            # The live streamed call, with the deadline a conversation request starts with
+            response = app.converse_within(query, model_id, bedrock_deadline.Deadline(), passages=passages, client=client)
+            result = {
+                'query_hash': hash_value,
+                'replay_model_id': model_id,
+                'replay_response': app.get_response_text(response),
+                'replay_sources': json.dumps(list(dict.fromkeys(passage['source'] for passage in passages or []))),
+                'replay_truncation': response.get('truncationReason'),
+                'input_tokens': response.get('usage', {}).get('inputTokens'),
+                'output_tokens': response.get('usage', {}).get('outputTokens'),
+                'latency_ms': int((time.time() - call_started) * 1000),
+                'replayed_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime())
+            }
+            with lock:
+                results_file.write(json.dumps(result) + '\n')
+                results_file.flush()
+                counts['replayed'] += 1
+        except Exception as e:
+            # Not checkpointed, so the next run retries it
+            logger.error(f"Error replaying query {hash_value}: {str(e)}")
+            with lock:
+                counts['failed'] += 1
+        finally:
+            slots.release()
+            with lock:
+                if time.time() - last_report[0] >= PROGRESS_INTERVAL:
+                    last_report[0] = time.time()
+                    report()
+
+    seen = set()
+    with open(results_path, 'a', encoding='utf-8') as results_file, \
+            open(items_path, 'w', encoding='utf-8') as items_file, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for item in items:
+            query = item.get('original_query')
+            if not query:
+                continue
+
+            hash_value = query_hash(query)
+            items_file.write(json.dumps({
+                'feedback_id': item.get('id'),
+                'feedback_type': item.get('feedback_type'),
+                'timestamp': item.get('timestamp'),
+                'query_hash': hash_value,
+                'original_query': query,
+                'stored_model_id': item.get('model_id'),
+                'stored_response': item.get('llm_response')
+            }) + '\n')
+            counts['items'] += 1
+
+            # Each distinct query is sent to Bedrock once
+            if hash_value in seen:
+                continue
+            seen.add(hash_value)
+            counts['unique'] += 1
+            if hash_value in done:
+                counts['resumed'] += 1
+                continue
+            if limit is not None and counts['unique'] - counts['resumed'] > limit:
+                continue
+
+            slots.acquire()
+            executor.submit(run, hash_value, query, results_file)
+
+    report()
+    return counts
+
+def read_rows(output_path):
+    """Join the staged items with their replayed answers, one row per feedback item"""
+    results_path, items_path = staging_paths(output_path)
+    results = {}
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            results[result['query_hash']] = result
+
+    with open(items_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            result = results.get(row['query_hash'])
+            if result is None:
+                continue
+            row.update(result)
+            yield row
+
+def write_parquet(output_path):
+    """Write the side-by-side results as a Parquet file, returning the number of rows"""
+    schema = pa.schema([
+        (column, pa.int64() if column in ('input_tokens', 'output_tokens', 'latency_ms') else pa.string())
+        for column in OUTPUT_COLUMNS
+    ])
+
+    written = 0
+    with pq.ParquetWriter(output_path, schema, compression='zstd') as writer:
+        batch = []
+        for row in read_rows(output_path):
+            batch.append(row)
+            if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                written += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            written += len(batch)
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay stored queries through Bedrock and compare the answers')
+    parser.add_argument('--table-name', default='user-feedback', help='DynamoDB feedback table to read queries from')
+    parser.add_argument('--export-file', help='Read queries from an NDJSON or DynamoDB export file instead of the table')
+    parser.add_argument('--feedback-type', help='Only replay items with this feedback type, e.g. negative')
+    parser.add_argument('--model-id', help='Model to replay with (default: the conversation Lambda model)')
+    parser.add_argument('--output', default='replay.parquet', help='Parquet file for the side-by-side results')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Concurrent Bedrock calls')
+    parser.add_argument('--rate', type=float, help='Maximum Bedrock calls per second')
+    parser.add_argument('--limit', type=int, help='Replay at most this many new queries')
+    parser.add_argument('--restart', action='store_true', help='Discard the results of a previous interrupted run')
+    parser.add_argument('--fake-bedrock', action='store_true', help='Answer with an offline fake instead of calling Bedrock')
+    parser.add_argument('--retrieval-bucket', help='Ground queries in the retrieval index in this bucket (default: RETRIEVAL_INDEX_BUCKET)')
+    parser.add_argument('--retrieval-dir', help='Ground queries in a local retrieval index directory (default: RETRIEVAL_INDEX_DIR)')
+
+    args = parser.parse_args()
+
+    if args.fake_bedrock:
+        # app and retrieval create boto3 clients at import time, the offline fake needs no real region
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    import app
+    import retrieval
+
+    model_id = args.model_id or app.get_model_id()
+
+    if args.fake_bedrock:
+        client = FakeBedrock()
+    else:
+        # botocore's adaptive retry mode slows the client down when Bedrock throttles
+        client = boto3.client('bedrock-runtime', config=Config(
+            max_pool_connections=args.concurrency,
+            retries={'mode': 'adaptive', 'max_attempts': 10}
+        ))
+
+    # Load the retrieval index once, before the workers share it
+    if args.retrieval_bucket:
+        os.environ['RETRIEVAL_INDEX_BUCKET'] = args.retrieval_bucket
+    if args.retrieval_dir:
+        os.environ['RETRIEVAL_INDEX_DIR'] = args.retrieval_dir
+    retrieval.warm_up()
+    if retrieval.get_store() is None:
+        print("No retrieval index configured, queries are replayed without grounding passages")
+
+    if args.restart:
+        for path in staging_paths(args.output):
+            if os.path.exists(path):
+                os.remove(path)
+
+    if args.export_file:
+        items = iter_export_items(args.export_file, args.feedback_type)
+    else:
+        items = iter_table_items(boto3.resource('dynamodb').Table(args.table_name), args.feedback_type)
+
+    counts = replay(items, args.output, model_id, client, args.concurrency, args.rate, args.limit)
+
+    if pa is None:
+        print(f"pyarrow is not installed, results are in {staging_paths(args.output)[0]}")
+    else:
+        rows = write_parquet(args.output)
+        print(f"Wrote {rows} rows to {args.output}")
+
+    if counts['failed']:
+        print(f"{counts['failed']} queries failed, rerun to retry them")
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,36 @@ import os
 import boto3
 import logging
 import jwt
+import response_encoding
 from boto3.dynamodb.conditions import Key
+import feedback_cache
+import review_queue
+import latency_metrics
+import profiling
+import warmup
+from decimal import Decimal
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = boto3.resource('dynamodb', config=warmup.CLIENT_CONFIG)
 cognito = boto3.client('cognito-idp')
 
+# Bulk review limits
+MAX_BULK_REVIEW_ITEMS = int(os.environ.get('MAX_BULK_REVIEW_ITEMS', '500'))
+TRANSACTION_CHUNK_SIZE = 100
+PARALLEL_REVIEW_WORKERS = int(os.environ.get('PARALLEL_REVIEW_WORKERS', '16'))
+
+# Reviewed items expire from the table this many days after review (0 to keep them until archived).
+# A backstop for the archive job, so it must exceed ARCHIVE_AFTER_DAYS plus the time between archive runs
+ARCHIVE_TTL_DAYS = int(os.environ.get('ARCHIVE_TTL_DAYS', '0'))
+
+@latency_metrics.span('auth')
 def extract_user_from_token(event):
     """Extract user information from JWT token"""
     try:
@@ -42,6 +62,191 @@ def extract_user_from_token(event):
         logger.error(f"Error extracting user from token: {str(e)}", exc_info=True)
         return None
 
+def build_review_update(feedback_id, reviewer_comments, reviewer_id, reviewed_at):
+    """Build the update that marks a feedback item reviewed, and modified for delta sync"""
+    update = {
+        'Key': {'id': feedback_id},
+        # Reviewing takes the item off the work queue and ends its lease
+        'UpdateExpression': "set reviewed = :r, reviewer_comments = :c, reviewer_id = :i, reviewed_at = :m, last_modified = :m, modified_day = :d remove review_queue, lease_owner, lease_expires_at",
+        # Only the holder of an unexpired lease may review a claimed item, and unknown ids aren't created
+        'ConditionExpression': "attribute_exists(id) AND (attribute_not_exists(lease_owner) OR lease_owner = :i OR lease_expires_at < :m)",
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD',
+        'ExpressionAttributeValues': {
+            ':r': True,
+            ':c': reviewer_comments,
+            ':i': reviewer_id,
+            ':m': reviewed_at,
+            ':d': reviewed_at[:10]
+        }
+    }
+    if ARCHIVE_TTL_DAYS:
+        expires_at = datetime.fromisoformat(reviewed_at) + timedelta(days=ARCHIVE_TTL_DAYS)
+        update['UpdateExpression'] = update['UpdateExpression'].replace(' remove ', ', expires_at = :x remove ', 1)
+        update['ExpressionAttributeValues'][':x'] = int((expires_at - datetime(1970, 1, 1)).total_seconds())
+    return update
+
+def parse_bulk_reviews(body):
+    """Get (feedback_id, reviewer_comments) pairs from a bulk review request, raising ValueError if invalid"""
+    if 'reviews' in body:
+        # Per-item comments
+        if not isinstance(body['reviews'], list) or not all(isinstance(review, dict) for review in body['reviews']):
+            raise ValueError("reviews must be a list of objects")
+        reviews = [(review.get('feedback_id'), review.get('reviewer_comments', '')) for review in body['reviews']]
+    else:
+        # One comment shared by every item
+        if not isinstance(body.get('feedback_ids'), list):
+            raise ValueError("feedback_ids must be a list")
+        shared_comments = body.get('reviewer_comments', '')
+        reviews = [(feedback_id, shared_comments) for feedback_id in body['feedback_ids']]
+    
+    if not reviews:
+        raise ValueError("No feedback items to review")
+    if any(not feedback_id for feedback_id, _ in reviews):
+        raise ValueError("Missing required field: feedback_id")
+    if any(not isinstance(feedback_id, str) for feedback_id, _ in reviews):
+        raise ValueError("feedback_id must be a string")
+    if len(reviews) > MAX_BULK_REVIEW_ITEMS:
+        raise ValueError(f"Too many feedback items, the limit is {MAX_BULK_REVIEW_ITEMS}")
+    
+    # A transaction can't touch the same item twice, keep the first review of each item
+    unique = {}
+    for feedback_id, reviewer_comments in reviews:
+        unique.setdefault(feedback_id, reviewer_comments)
+    return list(unique.items())
+
+@latency_metrics.span('dynamodb')
+def review_transactional(table_name, reviews, reviewer_id):
+    """Apply reviews in chunked transactions, each chunk is all-or-nothing"""
+    client = dynamodb.meta.client
+    reviewed_at = datetime.utcnow().isoformat()
+    results = []
+    
+    for start in range(0, len(reviews), TRANSACTION_CHUNK_SIZE):
+        chunk = reviews[start:start + TRANSACTION_CHUNK_SIZE]
+        transact_items = []
+        for feedback_id, reviewer_comments in chunk:
+            update = build_review_update(feedback_id, reviewer_comments, reviewer_id, reviewed_at)
+            update['TableName'] = table_name
+            transact_items.append({'Update': update})
+        
+        try:
+            client.transact_write_items(TransactItems=transact_items)
+            results.extend({'feedback_id': feedback_id, 'status': 'reviewed'} for feedback_id, _ in chunk)
+        except client.exceptions.TransactionCanceledException as e:
+            # Report which items caused the chunk to be rolled back
+            reasons = e.response.get('CancellationReasons', [])
+            logger.warning(f"Review transaction cancelled: {reasons}")
+            for i, (feedback_id, _) in enumerate(chunk):
+                reason = reasons[i] if i < len(reasons) else {}
+                code = reason.get('Code', 'None')
+                if code == 'ConditionalCheckFailed':
+                    # The old item is only returned if it exists, so its lease is held by someone else
+                    status = 'leased' if reason.get('Item') else 'not_found'
+                    results.append({'feedback_id': feedback_id, 'status': status})
+                elif code == 'None':
+                    results.append({'feedback_id': feedback_id, 'status': 'rolled_back'})
+                else:
+                    results.append({'feedback_id': feedback_id, 'status': 'failed', 'error': code})
+    
+    return results
+
+@latency_metrics.span('dynamodb')
+def review_parallel(table_name, reviews, reviewer_id):
+    """Apply reviews with concurrent update_item calls, each item succeeds or fails on its own"""
+    # The low-level client is thread safe, unlike the Table resource
+    client = dynamodb.meta.client
+    reviewed_at = datetime.utcnow().isoformat()
+    
+    def review_one(review):
+        feedback_id, reviewer_comments = review
+        update = build_review_update(feedback_id, reviewer_comments, reviewer_id, reviewed_at)
+        try:
+            client.update_item(TableName=table_name, **update)
+            return {'feedback_id': feedback_id, 'status': 'reviewed'}
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code == 'ConditionalCheckFailedException':
+                status = 'leased' if e.response.get('Item') else 'not_found'
+                return {'feedback_id': feedback_id, 'status': status}
+            logger.error(f"Error reviewing feedback {feedback_id}: {str(e)}")
+            return {'feedback_id': feedback_id, 'status': 'failed', 'error': code}
+    
+    with ThreadPoolExecutor(max_workers=PARALLEL_REVIEW_WORKERS) as executor:
+        return list(executor.map(review_one, reviews))
+
+def parse_queue_int(body, field, default, maximum):
+    """Get a positive integer option of a work queue request, raising ValueError if invalid"""
+    value = body.get(field, default)
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{field} must be an integer")
+    if not 1 <= value <= maximum:
+        raise ValueError(f"{field} must be between 1 and {maximum}")
+    return value
+
+@latency_metrics.span('dynamodb')
+def handle_queue_action(table, action, body, reviewer_id):
+    """Claim, extend or release work queue leases for a reviewer"""
+    try:
+        lease_seconds = parse_queue_int(body, 'lease_seconds', review_queue.LEASE_SECONDS, review_queue.MAX_LEASE_SECONDS)
+        count = parse_queue_int(body, 'count', 1, review_queue.MAX_CLAIM_COUNT)
+        if 'feedback_ids' in body and not isinstance(body['feedback_ids'], list):
+            raise ValueError("feedback_ids must be a list")
+    except ValueError as e:
+        logger.warning(f"Invalid {action} request: {str(e)}")
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST'
+            },
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    if action == 'claim':
+        items, expires_at = review_queue.claim_items(table, reviewer_id, count, lease_seconds)
+        result = {
+            'message': f"Claimed {len(items)} feedback items",
+            'lease_expires_at': expires_at,
+            'items': items
+        }
+    else:
+        feedback_ids = body.get('feedback_ids') or ([body['feedback_id']] if body.get('feedback_id') else [])
+        if action == 'extend':
+            results = review_queue.extend_leases(table, reviewer_id, feedback_ids, lease_seconds)
+        else:
+            results = review_queue.release_leases(table, reviewer_id, feedback_ids)
+        result = {'results': results}
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+            'Access-Control-Allow-Methods': 'OPTIONS,POST'
+        },
+        # Claimed items carry numeric attributes such as response_length
+        'body': json.dumps(result, default=_json_default)
+    }
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def warm_up():
+    """Open the table and cache connections ahead of the first review"""
+    table = dynamodb.Table(os.environ.get('FEEDBACK_TABLE_NAME'))
+    warmup.open_connections(lambda: table.get_item(Key={'id': 'warmup'}))
+    warmup.open_connections(feedback_cache.get_current_version, count=1)
+
+@warmup.warmable(warm_up)
+@latency_metrics.instrument('reviewer')
+@profiling.profiled('reviewer')
 def lambda_handler(event, context):
     # Log the incoming event
     logger.info(f"Received event: {json.dumps(event)}")
@@ -53,15 +258,17 @@ def lambda_handler(event, context):
         is_reviewer = user_info.get('is_reviewer', False) if user_info else False
         
         # Get request body from API Gateway event
-        body = json.loads(event.get('body', '{}'))
+        body = response_encoding.get_json_body(event)
         logger.info(f"Request body: {json.dumps(body)}")
         
         # Extract review data
         feedback_id = body.get('feedback_id')
         reviewer_comments = body.get('reviewer_comments', '')
+        action = body.get('action', 'review')
+        is_bulk = 'feedback_ids' in body or 'reviews' in body
         
         # Validate required fields
-        if not feedback_id:
+        if action == 'review' and not feedback_id and not is_bulk:
             logger.warning("Missing required field: feedback_id")
             return {
                 'statusCode': 400,
@@ -93,19 +300,89 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'User does not have reviewer permissions'})
             }
         
+        # Manage work queue leases
+        if action in ('claim', 'extend', 'release'):
+            return handle_queue_action(table, action, body, user_id)
+        
+        # Review a batch of feedback items
+        if is_bulk:
+            try:
+                reviews = parse_bulk_reviews(body)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Invalid bulk review request: {str(e)}")
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+                        'Access-Control-Allow-Methods': 'OPTIONS,POST'
+                    },
+                    'body': json.dumps({'error': str(e)})
+                }
+            
+            mode = body.get('mode', 'transactional')
+            logger.info(f"Reviewing {len(reviews)} feedback items in {mode} mode")
+            if mode == 'parallel':
+                results = review_parallel(table_name, reviews, user_id)
+            else:
+                results = review_transactional(table_name, reviews, user_id)
+            
+            reviewed_count = sum(1 for result in results if result['status'] == 'reviewed')
+            logger.info(f"Reviewed {reviewed_count} of {len(results)} feedback items")
+            
+            # Invalidate cached feedback pages
+            if reviewed_count:
+                feedback_cache.bump_version()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST'
+                },
+                'body': json.dumps({
+                    'message': f"Reviewed {reviewed_count} of {len(results)} feedback items",
+                    'reviewed_count': reviewed_count,
+                    'failed_count': len(results) - reviewed_count,
+                    'results': results
+                })
+            }
+        
         # Update the feedback item with review information
-        response = table.update_item(
-            Key={'id': feedback_id},
-            UpdateExpression="set reviewed = :r, reviewer_comments = :c, reviewer_id = :i",
-            ExpressionAttributeValues={
-                ':r': True,
-                ':c': reviewer_comments,
-                ':i': user_id
-            },
-            ReturnValues="UPDATED_NEW"
-        )
+        try:
+            with latency_metrics.span('dynamodb'):
+                response = table.update_item(
+                    **build_review_update(feedback_id, reviewer_comments, user_id, datetime.utcnow().isoformat()),
+                    ReturnValues="UPDATED_NEW"
+                )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            existing = e.response.get('Item')
+            if existing:
+                logger.warning(f"Feedback {feedback_id} is claimed by another reviewer")
+                status_code, error = 409, 'Feedback item is claimed by another reviewer'
+            else:
+                logger.warning(f"Feedback {feedback_id} not found")
+                status_code, error = 404, 'Feedback item not found'
+            return {
+                'statusCode': status_code,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST'
+                },
+                'body': json.dumps({'error': error, 'feedback_id': feedback_id})
+            }
         
-        logger.info(f"Updated feedback item: {json.dumps(response.get('Attributes', {}))}")
+        logger.info(f"Updated feedback item: {json.dumps(response.get('Attributes', {}), default=str)}")
+        
+        # Invalidate cached feedback pages
+        feedback_cache.bump_version()
         
         # Return successful response
         return {
@@ -133,4 +410,7 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Methods': 'OPTIONS,POST'
             },
             'body': json.dumps({'error': f"Error reviewing feedback: {str(e)}"})
-        }
\ No newline at end of file
+        }
+
+# Provisioned concurrency runs the warm-up during init
+warmup.warm_on_provisioned_init(warm_up)
@@ -0,0 +1,666 @@
+import json
+import os
+import re
+import math
+import mmap
+import time
+import uuid
+import heapq
+import struct
+import logging
+import argparse
+import boto3
+from botocore.exceptions import ClientError
+import feedback_cache
+import warmup
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize S3 client
+s3 = boto3.client('s3', config=warmup.CLIENT_CONFIG)
+
+# Feedback attributes that are indexed for search
+SEARCH_FIELDS = ['feedback_text', 'original_query', 'llm_response']
+
+# Index settings
+BM25_K1 = 1.2
+BM25_B = 0.75
+REFRESH_INTERVAL_SECONDS = float(os.environ.get('SEARCH_REFRESH_INTERVAL_SECONDS', '2'))
+
+# Compaction runs from the scheduled search compaction job, never in a reader request. A lease in
+# the cache table keeps overlapping runs from each writing a base and orphaning one of them
+COMPACTION_LEASE_KEY = 'lease#search-compaction'
+COMPACTION_LEASE_SECONDS = 900
+
+# Each document is also indexed under its owner's term, so a regular user's search only ranks
+# their own items. Query tokens are alphanumeric, so they never match an owner term
+OWNER_TERM_PREFIX = 'user:'
+
+# Segments written in the last few seconds may still be arriving out of order,
+# so compaction leaves them for the next run
+SETTLE_SECONDS = 30
+
+# Object layout in the index store
+INDEX_PREFIX = 'search/'
+MANIFEST_KEY = 'search/manifest.json'
+SEGMENT_PREFIX = 'search/segments/'
+BASE_PREFIX = 'search/base-'
+LOCAL_CACHE_DIR = '/tmp/feedback-search'
+
+# Binary base segment layout:
+#   header: magic, format version, doc count, term count, total doc length,
+#           then the offsets of the seven sections below
+#   doc id offsets (u32 * doc_count+1), doc id bytes, doc lengths (u32 * doc_count),
+#   term offsets (u32 * term_count+1), sorted term bytes,
+#   posting offsets (u32 * term_count+1), postings (varint doc delta, varint tf)
+SEGMENT_MAGIC = b'FBIX'
+SEGMENT_VERSION = 1
+HEADER = struct.Struct('<4sHHIIQ7I')
+U32 = struct.Struct('<I')
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'if', 'in', 'into',
+    'is', 'it', 'no', 'not', 'of', 'on', 'or', 'such', 'that', 'the', 'their', 'then',
+    'there', 'these', 'they', 'this', 'to', 'was', 'will', 'with'
+])
+
+def tokenize(text):
+    """Split text into lowercase search terms"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def owner_term(user_id):
+    """Get the term a user's documents are indexed under"""
+    return f"{OWNER_TERM_PREFIX}{user_id}"
+
+def analyze_item(item):
+    """Build the indexed document for a feedback item"""
+    tokens = []
+    for field in SEARCH_FIELDS:
+        tokens.extend(tokenize(item.get(field) or ''))
+
+    terms = {}
+    for token in tokens:
+        terms[token] = terms.get(token, 0) + 1
+    # Not counted in the document length, so it doesn't change BM25 scores
+    if item.get('user_id'):
+        terms[owner_term(item['user_id'])] = 1
+
+    return {
+        'id': item['id'],
+        'length': len(tokens),
+        'terms': terms
+    }
+
+class S3Store:
+    """Index storage in an S3 bucket"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def get(self, key):
+        try:
+            return s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except s3.exceptions.NoSuchKey:
+            return None
+
+    def put(self, key, data):
+        s3.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def list(self, prefix, start_after=''):
+        keys = []
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, StartAfter=start_after or prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return keys
+
+    def delete(self, keys):
+        # DeleteObjects accepts up to 1000 keys per call
+        for i in range(0, len(keys), 1000):
+            s3.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': key} for key in keys[i:i + 1000]], 'Quiet': True}
+            )
+
+    def local_path(self, key):
+        """Download an object to the Lambda /tmp directory so it can be memory-mapped"""
+        path = os.path.join(LOCAL_CACHE_DIR, key.replace('/', '_'))
+        if not os.path.exists(path):
+            os.makedirs(LOCAL_CACHE_DIR, exist_ok=True)
+            s3.download_file(self.bucket, key, path + '.part')
+            os.replace(path + '.part', path)
+        return path
+
+    def prune_local(self, prefix, keep=None):
+        """Remove the downloaded copies of objects under prefix, except keep"""
+        if not os.path.isdir(LOCAL_CACHE_DIR):
+            return
+        local_prefix = prefix.replace('/', '_')
+        keep_name = keep.replace('/', '_') if keep else None
+        for name in os.listdir(LOCAL_CACHE_DIR):
+            if name.startswith(local_prefix) and name != keep_name:
+                try:
+                    os.remove(os.path.join(LOCAL_CACHE_DIR, name))
+                except FileNotFoundError:
+                    pass
+
+class LocalStore:
+    """Index storage in a local directory, for development and tests"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.part', path)
+
+    def list(self, prefix, start_after=''):
+        directory = self._path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        keys = sorted(prefix + name for name in os.listdir(directory) if not name.endswith('.part'))
+        return [key for key in keys if key > start_after]
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def local_path(self, key):
+        return self._path(key)
+
+    def prune_local(self, prefix, keep=None):
+        # The store's own files are the local copies
+        pass
+
+def get_store():
+    """Get the configured index store, or None if search is not configured"""
+    bucket = os.environ.get('SEARCH_INDEX_BUCKET')
+    if bucket:
+        return S3Store(bucket)
+    directory = os.environ.get('SEARCH_INDEX_DIR')
+    if directory:
+        return LocalStore(directory)
+    return None
+
+def _write_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(buf, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def encode_segment(doc_ids, doc_lengths, postings):
+    """Encode documents and their posting lists (term -> [(doc, tf)] sorted by doc) as a binary segment"""
+    doc_id_bytes = bytearray()
+    doc_id_offsets = [0]
+    for doc_id in doc_ids:
+        doc_id_bytes.extend(doc_id.encode('utf-8'))
+        doc_id_offsets.append(len(doc_id_bytes))
+
+    term_bytes = bytearray()
+    term_offsets = [0]
+    posting_bytes = bytearray()
+    posting_offsets = [0]
+    for term in sorted(postings):
+        term_bytes.extend(term.encode('utf-8'))
+        term_offsets.append(len(term_bytes))
+        previous = 0
+        for doc, tf in postings[term]:
+            _write_varint(doc - previous, posting_bytes)
+            _write_varint(tf, posting_bytes)
+            previous = doc
+        posting_offsets.append(len(posting_bytes))
+
+    sections = [
+        struct.pack(f'<{len(doc_id_offsets)}I', *doc_id_offsets),
+        bytes(doc_id_bytes),
+        struct.pack(f'<{len(doc_lengths)}I', *doc_lengths),
+        struct.pack(f'<{len(term_offsets)}I', *term_offsets),
+        bytes(term_bytes),
+        struct.pack(f'<{len(posting_offsets)}I', *posting_offsets),
+        bytes(posting_bytes)
+    ]
+
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    header = HEADER.pack(
+        SEGMENT_MAGIC, SEGMENT_VERSION, 0, len(doc_ids), len(postings), sum(doc_lengths), *offsets
+    )
+    return header + b''.join(sections)
+
+class BinarySegment:
+    """Read-only view over an encoded segment, usually backed by a memory-mapped file"""
+
+    def __init__(self, buf):
+        self.buf = buf
+        (magic, version, _, self.doc_count, self.term_count, self.total_length,
+         self.doc_id_offsets, self.doc_id_bytes, self.doc_lengths,
+         self.term_offsets, self.term_bytes, self.posting_offsets, self.postings_start) = HEADER.unpack_from(buf, 0)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            raise ValueError("Not a feedback search segment")
+
+    def _u32(self, section, i):
+        return U32.unpack_from(self.buf, section + 4 * i)[0]
+
+    def doc_id(self, doc):
+        start = self.doc_id_bytes + self._u32(self.doc_id_offsets, doc)
+        end = self.doc_id_bytes + self._u32(self.doc_id_offsets, doc + 1)
+        return bytes(self.buf[start:end]).decode('utf-8')
+
+    def doc_length(self, doc):
+        return self._u32(self.doc_lengths, doc)
+
+    def term(self, i):
+        start = self.term_bytes + self._u32(self.term_offsets, i)
+        end = self.term_bytes + self._u32(self.term_offsets, i + 1)
+        return bytes(self.buf[start:end])
+
+    def find_term(self, term):
+        """Binary search the sorted term dictionary"""
+        target = term.encode('utf-8')
+        low, high = 0, self.term_count - 1
+        while low <= high:
+            middle = (low + high) // 2
+            current = self.term(middle)
+            if current < target:
+                low = middle + 1
+            elif current > target:
+                high = middle - 1
+            else:
+                return middle
+        return -1
+
+    def postings_at(self, i):
+        pos = self.postings_start + self._u32(self.posting_offsets, i)
+        end = self.postings_start + self._u32(self.posting_offsets, i + 1)
+        result = []
+        doc = 0
+        while pos < end:
+            delta, pos = _read_varint(self.buf, pos)
+            tf, pos = _read_varint(self.buf, pos)
+            doc += delta
+            result.append((doc, tf))
+        return result
+
+    def postings(self, term):
+        i = self.find_term(term)
+        return self.postings_at(i) if i >= 0 else []
+
+    def terms(self):
+        for i in range(self.term_count):
+            yield self.term(i).decode('utf-8'), i
+
+class MemorySegment:
+    """Growable in-memory segment for documents indexed since the last compaction"""
+
+    def __init__(self):
+        self.doc_ids = []
+        self.doc_lengths = []
+        self.total_length = 0
+        self.index = {}
+
+    @property
+    def doc_count(self):
+        return len(self.doc_ids)
+
+    def add(self, document):
+        doc = len(self.doc_ids)
+        self.doc_ids.append(document['id'])
+        self.doc_lengths.append(document['length'])
+        self.total_length += document['length']
+        for term, tf in document['terms'].items():
+            self.index.setdefault(term, []).append((doc, tf))
+
+    def doc_id(self, doc):
+        return self.doc_ids[doc]
+
+    def doc_length(self, doc):
+        return self.doc_lengths[doc]
+
+    def postings(self, term):
+        return self.index.get(term, [])
+
+class SearchIndex:
+    """BM25 search over the compacted base segment plus incrementally loaded segments"""
+
+    def __init__(self, store):
+        self.store = store
+        self.base = None
+        self.base_key = None
+        self.watermark = ''
+        self.pending = MemorySegment()
+        self.loaded = set()
+        self.refreshed_at = 0
+
+    def refresh(self, force=False):
+        """Load the latest base segment and any segments written since"""
+        now = time.time()
+        if not force and now - self.refreshed_at < REFRESH_INTERVAL_SECONDS:
+            return
+        self.refreshed_at = now
+
+        manifest = json.loads(self.store.get(MANIFEST_KEY) or '{}')
+        if manifest.get('base') != self.base_key:
+            self.base_key = manifest.get('base')
+            self.base = None
+            if self.base_key:
+                logger.info(f"Loading search base segment: {self.base_key}")
+                with open(self.store.local_path(self.base_key), 'rb') as f:
+                    self.base = BinarySegment(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            # Superseded bases would otherwise fill up /tmp over the life of the container
+            self.store.prune_local(BASE_PREFIX, self.base_key)
+            self.watermark = manifest.get('watermark', '')
+            self.pending = MemorySegment()
+            self.loaded = set()
+
+        for key in self.store.list(SEGMENT_PREFIX, self.watermark):
+            if key in self.loaded:
+                continue
+            data = self.store.get(key)
+            if data is None:
+                continue
+            self.pending.add(json.loads(data))
+            self.loaded.add(key)
+
+    def segments(self):
+        return [segment for segment in (self.base, self.pending) if segment is not None and segment.doc_count]
+
+    def search(self, query, limit=50, user_id=None):
+        """Return up to limit (feedback id, score) pairs ranked by BM25, only the user's own if user_id is given"""
+        return rank(self.segments(), query, limit, owner_term(user_id) if user_id else None)
+
+def rank(segments, query, limit, filter_term=None):
+    """
+    Return up to limit (document id, score) pairs from the segments ranked by BM25.
+    With filter_term only documents indexed under that term are ranked
+    """
+    terms = set(tokenize(query))
+    doc_count = sum(segment.doc_count for segment in segments)
+    if not terms or not doc_count:
+        return []
+    average_length = sum(segment.total_length for segment in segments) / doc_count
+
+    # Collect postings once per term and segment, document frequencies are global
+    term_postings = {}
+    for term in terms:
+        lists = [(segment, segment.postings(term)) for segment in segments]
+        document_frequency = sum(len(postings) for _, postings in lists)
+        if document_frequency:
+            term_postings[term] = (lists, document_frequency)
+
+    # Filtering happens before ranking, so matches outside the filter can't crowd out the top results
+    allowed = None
+    if filter_term is not None:
+        allowed = {id(segment): {doc for doc, _ in segment.postings(filter_term)} for segment in segments}
+
+    scores = {}
+    for lists, document_frequency in term_postings.values():
+        idf = math.log(1 + (doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+        for segment, postings in lists:
+            for doc, tf in postings:
+                if allowed is not None and doc not in allowed[id(segment)]:
+                    continue
+                length = segment.doc_length(doc)
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+                key = (id(segment), doc)
+                if key in scores:
+                    scores[key][1] += idf * norm
+                else:
+                    scores[key] = [segment, idf * norm]
+
+    top = heapq.nlargest(limit, scores.items(), key=lambda entry: entry[1][1])
+    return [(segment.doc_id(doc), score) for (_, doc), (segment, score) in top]
+
+def _merge(base, documents):
+    """Merge a base segment and new documents into encoded segment bytes"""
+    doc_ids = []
+    doc_lengths = []
+    postings = {}
+
+    if base is not None:
+        doc_ids = [base.doc_id(doc) for doc in range(base.doc_count)]
+        doc_lengths = [base.doc_length(doc) for doc in range(base.doc_count)]
+        for term, i in base.terms():
+            postings[term] = base.postings_at(i)
+
+    for document in documents:
+        doc = len(doc_ids)
+        doc_ids.append(document['id'])
+        doc_lengths.append(document['length'])
+        for term, tf in document['terms'].items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    return encode_segment(doc_ids, doc_lengths, postings)
+
+def _delete_stale_bases(store, keep):
+    """Remove base segments other than the current and previous ones, including any left by an interrupted run"""
+    stale = [key for key in store.list(INDEX_PREFIX) if key.startswith(BASE_PREFIX) and key not in keep]
+    if stale:
+        store.delete(stale)
+        logger.info(f"Deleted {len(stale)} superseded search base segments")
+
+def compact(store):
+    """Fold settled segments into a new base segment and drop segments merged by the previous run"""
+    manifest = json.loads(store.get(MANIFEST_KEY) or '{}')
+    base = None
+    if manifest.get('base'):
+        with open(store.local_path(manifest['base']), 'rb') as f:
+            base = BinarySegment(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    # Only merge segments old enough that no earlier-named segment can still arrive
+    settled_before = SEGMENT_PREFIX + time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(time.time() - SETTLE_SECONDS))
+    keys = [key for key in store.list(SEGMENT_PREFIX, manifest.get('watermark', '')) if key < settled_before]
+    if not keys:
+        logger.info("No settled search segments to compact")
+        return manifest
+
+    documents = []
+    for key in keys:
+        data = store.get(key)
+        if data is not None:
+            documents.append(json.loads(data))
+
+    base_key = f"{BASE_PREFIX}{int(time.time() * 1000)}.seg"
+    store.put(base_key, _merge(base, documents))
+
+    new_manifest = {
+        'base': base_key,
+        'previous_base': manifest.get('base'),
+        'watermark': keys[-1],
+        'previous_watermark': manifest.get('watermark', ''),
+        'doc_count': (base.doc_count if base else 0) + len(documents)
+    }
+    store.put(MANIFEST_KEY, json.dumps(new_manifest).encode('utf-8'))
+    logger.info(f"Compacted {len(documents)} search segments into {base_key}")
+
+    # Readers on the previous manifest may still need its segments and base, so only
+    # remove what was already folded into the previous base
+    stale = [key for key in store.list(SEGMENT_PREFIX) if key <= manifest.get('previous_watermark', '')]
+    store.delete(stale)
+    _delete_stale_bases(store, {base_key, manifest.get('base')})
+    store.prune_local(BASE_PREFIX)
+
+    return new_manifest
+
+def rebuild(store, table):
+    """Build a new base segment from every item in the feedback table"""
+    documents = []
+    scan_args = {}
+    while True:
+        response = table.scan(**scan_args)
+        documents.extend(analyze_item(item) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    # Segments written up to now are covered by the scan
+    manifest = json.loads(store.get(MANIFEST_KEY) or '{}')
+    keys = store.list(SEGMENT_PREFIX)
+    base_key = f"{BASE_PREFIX}{int(time.time() * 1000)}.seg"
+    store.put(base_key, _merge(None, documents))
+    store.put(MANIFEST_KEY, json.dumps({
+        'base': base_key,
+        'previous_base': manifest.get('base'),
+        'watermark': keys[-1] if keys else '',
+        'previous_watermark': manifest.get('watermark', ''),
+        'doc_count': len(documents)
+    }).encode('utf-8'))
+    _delete_stale_bases(store, {base_key, manifest.get('base')})
+    logger.info(f"Rebuilt search index with {len(documents)} documents")
+
+def acquire_compaction_lease(owner):
+    """Take the compaction lease, False if another run holds it. Without a cache table runs aren't coordinated"""
+    table = feedback_cache.get_cache_table()
+    if table is None:
+        return True
+    now = int(time.time())
+    try:
+        table.put_item(
+            Item={
+                'cache_key': COMPACTION_LEASE_KEY,
+                'lease_owner': owner,
+                'lease_expires_at': now + COMPACTION_LEASE_SECONDS,
+                'expires_at': now + 2 * COMPACTION_LEASE_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(cache_key) OR lease_expires_at < :now',
+            ExpressionAttributeValues={':now': now}
+        )
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+def release_compaction_lease(owner):
+    """End the compaction lease early, if it is still ours"""
+    table = feedback_cache.get_cache_table()
+    if table is None:
+        return
+    try:
+        table.update_item(
+            Key={'cache_key': COMPACTION_LEASE_KEY},
+            UpdateExpression='SET lease_expires_at = :zero',
+            ConditionExpression='lease_owner = :owner',
+            ExpressionAttributeValues={':zero': 0, ':owner': owner}
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+
+def run_with_lease(operation, owner=None):
+    """Run an index maintenance operation under the compaction lease, returning False if it is held"""
+    owner = owner or str(uuid.uuid4())
+    if not acquire_compaction_lease(owner):
+        logger.info("Search index maintenance is already running elsewhere")
+        return False
+    try:
+        operation()
+    finally:
+        release_compaction_lease(owner)
+    return True
+
+def compaction_handler(event, context):
+    """Scheduled compaction of the segments written since the last run"""
+    store = get_store()
+    compacted = run_with_lease(lambda: compact(store), getattr(context, 'aws_request_id', None))
+    return {'compacted': compacted}
+
+# Index kept across invocations of a warm Lambda container
+_index = None
+
+def index_item(item):
+    """Write a search segment for a newly stored feedback item"""
+    store = get_store()
+    if store is None:
+        return
+
+    try:
+        # Keys sort by write time so readers can list new segments incrementally
+        key = f"{SEGMENT_PREFIX}{item['timestamp']}-{item['id']}.json"
+        store.put(key, json.dumps(analyze_item(item)).encode('utf-8'))
+        logger.info(f"Indexed feedback item for search: {item['id']}")
+    except Exception as e:
+        # The item is stored, it will be picked up by the next rebuild
+        logger.error(f"Error indexing feedback item for search: {str(e)}", exc_info=True)
+
+def load_index(store):
+    """Get the index of this container, loading new segments first"""
+    global _index
+    if _index is None:
+        _index = SearchIndex(store)
+    _index.refresh()
+    return _index
+
+def search(query, limit=50, user_id=None):
+    """Search the feedback index, returning ranked (feedback id, score) pairs, only the user's own if user_id is given"""
+    store = get_store()
+    if store is None:
+        raise RuntimeError("Search index is not configured")
+
+    return load_index(store).search(query, limit, user_id)
+
+def warm_up(preload=False):
+    """Open the index store connections, and with preload load the index into this container"""
+    store = get_store()
+    if store is None:
+        return
+    if preload:
+        load_index(store)
+    else:
+        warmup.open_connections(lambda: store.get(f"{SEGMENT_PREFIX}warmup"))
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the feedback search index')
+    parser.add_argument('command', choices=['compact', 'rebuild', 'search'], help='Operation to run')
+    parser.add_argument('--table-name', default='user-feedback', help='DynamoDB feedback table (for rebuild)')
+    parser.add_argument('--query', help='Search query (for search)')
+
+    args = parser.parse_args()
+
+    store = get_store()
+    if store is None:
+        print("Set SEARCH_INDEX_BUCKET or SEARCH_INDEX_DIR")
+        return
+
+    if args.command == 'compact':
+        run_with_lease(lambda: print(json.dumps(compact(store), indent=2)))
+    elif args.command == 'rebuild':
+        run_with_lease(lambda: rebuild(store, boto3.resource('dynamodb').Table(args.table_name)))
+    else:
+        for feedback_id, score in search(args.query or ''):
+            print(f"{score:8.3f}  {feedback_id}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import json
+import hashlib
+import logging
+import argparse
+import boto3
+from boto3.dynamodb.conditions import Key
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Sharded GSIs: (index name, sharded attribute, source attribute)
+USER_SHARD_INDEX = ('UserShardIndex', 'user_shard', 'user_id')
+CONVERSATION_SHARD_INDEX = ('ConversationShardIndex', 'conversation_shard', 'conversation_id')
+
+# Unsharded GSIs keyed on the source attribute, read until the backfill is verified
+UNSHARDED_INDEXES = {'UserShardIndex': 'UserIndex', 'ConversationShardIndex': 'ConversationIndex'}
+
+# Read the sharded GSIs, only enable once the backfill has set shard keys on every existing item
+SHARDED_READS = os.environ.get('GSI_SHARDED_READS', 'false').lower() == 'true'
+
+# Shard counts, GSI_HOT_KEY_SHARDS maps hot user or conversation ids to their own count.
+# Counts may be raised at any time but never lowered, readers query every shard below the count
+DEFAULT_SHARD_COUNT = int(os.environ.get('GSI_SHARD_COUNT', '1'))
+HOT_KEY_SHARDS = json.loads(os.environ.get('GSI_HOT_KEY_SHARDS') or '{}')
+
+def shard_count(key):
+    """Get the number of shards a GSI key is spread over"""
+    return max(1, int(HOT_KEY_SHARDS.get(key, DEFAULT_SHARD_COUNT)))
+
+def shard_key(key, item_id):
+    """Get the sharded GSI key of an item, the suffix is derived from the item id so writes spread evenly"""
+    shard = int(hashlib.md5(item_id.encode('utf-8')).hexdigest()[:8], 16) % shard_count(key)
+    return f"{key}#{shard}"
+
+def add_shard_keys(item):
+    """Set the sharded GSI key attributes of a feedback item"""
+    for _, attribute, source in (USER_SHARD_INDEX, CONVERSATION_SHARD_INDEX):
+        if item.get(source):
+            item[attribute] = shard_key(item[source], item['id'])
+    return item
+
+def query_shards(table, index, key, state=None, **query_args):
+    """
+    Query every shard of a GSI key in parallel and merge the pages, newest first.
+    state maps the shards still to be read to their ExclusiveStartKey (None for a fresh query),
+    and the returned state is None once every shard is exhausted.
+    Without GSI_SHARDED_READS the unsharded index is read as a single shard keyed on the source attribute
+    """
+    index_name, attribute, source = index
+    if not SHARDED_READS:
+        index_name, attribute = UNSHARDED_INDEXES[index_name], source
+        # A cursor from before the flag changed starts again from the first page
+        if state is None or set(state) != {key}:
+            state = {key: None}
+    elif state is None or not all(shard.startswith(f"{key}#") for shard in state):
+        state = {f"{key}#{shard}": None for shard in range(shard_count(key))}
+
+    # The low-level client is thread safe, unlike the Table resource
+    client = table.meta.client
+
+    def query_shard(shard):
+        params = dict(query_args)
+        params['TableName'] = table.name
+        params['IndexName'] = index_name
+        params['KeyConditionExpression'] = Key(attribute).eq(shard)
+        params['ScanIndexForward'] = False
+        if state[shard]:
+            params['ExclusiveStartKey'] = state[shard]
+        response = client.query(**params)
+        return shard, response.get('Items', []), response.get('LastEvaluatedKey')
+
+    shards = list(state.keys())
+    if len(shards) == 1:
+        results = [query_shard(shards[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(shards), 16)) as executor:
+            results = list(executor.map(query_shard, shards))
+
+    items = []
+    next_state = {}
+    for shard, shard_items, last_key in results:
+        items.extend(shard_items)
+        if last_key:
+            next_state[shard] = last_key
+
+    items.sort(key=lambda item: item.get('timestamp', ''), reverse=True)
+    return items, next_state or None
+
+def query_all_shards(table, index, key, **query_args):
+    """Read every page of every shard of a GSI key"""
+    items, state = query_shards(table, index, key, **query_args)
+    while state:
+        page, state = query_shards(table, index, key, state, **query_args)
+        items.extend(page)
+    return items
+
+def backfill(table):
+    """Set the sharded key attributes on items written before sharding, or after a shard count change"""
+    updated = 0
+    scan_args = {
+        'ProjectionExpression': 'id, user_id, conversation_id, user_shard, conversation_shard'
+    }
+    while True:
+        response = table.scan(**scan_args)
+        for item in response.get('Items', []):
+            sharded = add_shard_keys(dict(item))
+            changes = {
+                attribute: sharded[attribute]
+                for _, attribute, _ in (USER_SHARD_INDEX, CONVERSATION_SHARD_INDEX)
+                if attribute in sharded and sharded[attribute] != item.get(attribute)
+            }
+            if not changes:
+                continue
+            names = {f"#a{i}": attribute for i, attribute in enumerate(changes)}
+            values = {f":v{i}": value for i, value in enumerate(changes.values())}
+            table.update_item(
+                Key={'id': item['id']},
+                UpdateExpression='SET ' + ', '.join(f"{name} = :v{i}" for i, name in enumerate(names)),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+            updated += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logger.info(f"Set shard keys on {updated} items")
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the sharded feedback GSI keys')
+    parser.add_argument('command', choices=['backfill'], help='Operation to run')
+    parser.add_argument('--table-name', default='user-feedback', help='DynamoDB feedback table')
+
+    args = parser.parse_args()
+
+    table = boto3.resource('dynamodb').Table(args.table_name)
+    print(f"Set shard keys on {backfill(table)} items")
+
+if __name__ == "__main__":
+    main()
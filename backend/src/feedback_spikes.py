@@ -0,0 +1,386 @@
+import os
+import json
+import math
+import time
+import array
+import logging
+import argparse
+import calendar
+from datetime import datetime
+import boto3
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
+import warmup
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize DynamoDB and SNS clients
+dynamodb = boto3.resource('dynamodb', config=warmup.CLIENT_CONFIG)
+sns = boto3.client('sns', config=warmup.CLIENT_CONFIG)
+
+# Ring buffers kept per window key: the last MINUTE_BUCKETS minutes, and the last HOUR_BUCKETS hours
+# as the baseline. Both hold (negative, total) counts, so a window is a fixed 1.8KB whatever the traffic
+MINUTE_BUCKETS = 60
+HOUR_BUCKETS = 168
+
+# The detection window is the latest DETECTION_MINUTES minutes, compared against the rest of the week
+DETECTION_MINUTES = int(os.environ.get('SPIKE_DETECTION_MINUTES', '15'))
+
+# A window is a spike when its negative rate is Z_THRESHOLD standard errors above the baseline rate
+# (one-sided binomial z-test) and at least MIN_RATE_INCREASE higher. The threshold is high because
+# every model and cohort is tested on every batch
+Z_THRESHOLD = float(os.environ.get('SPIKE_Z_THRESHOLD', '4'))
+MIN_RATE_INCREASE = float(os.environ.get('SPIKE_MIN_RATE_INCREASE', '0.1'))
+MIN_WINDOW_COUNT = int(os.environ.get('SPIKE_MIN_WINDOW_COUNT', '20'))
+MIN_BASELINE_COUNT = int(os.environ.get('SPIKE_MIN_BASELINE_COUNT', '100'))
+
+# A window alerts at most once per cooldown, in minutes of feedback time
+ALERT_COOLDOWN_MINUTES = 60
+
+# Optimistic locking retries when several stream shards update the same window at once
+MAX_WRITE_ATTEMPTS = 5
+
+NAMESPACE = 'FeedbackSpikes'
+
+# Window keys: every item counts towards all, its model and its cohort
+ALL_KEY = 'all'
+MODEL_PREFIX = 'model#'
+COHORT_PREFIX = 'cohort#'
+
+def get_spike_table():
+    """Get the DynamoDB table holding the spike windows, or None if detection is not configured"""
+    table_name = os.environ.get('SPIKE_TABLE_NAME')
+    if not table_name:
+        return None
+    return dynamodb.Table(table_name)
+
+def cohort(item):
+    """Get the cohort of an item: its cohort attribute if set, otherwise the user's email domain"""
+    if item.get('cohort'):
+        return item['cohort']
+    user_id = item.get('user_id') or ''
+    return user_id.rsplit('@', 1)[1].lower() if '@' in user_id else 'unknown'
+
+def window_keys(item):
+    return [ALL_KEY, f"{MODEL_PREFIX}{item.get('model_id') or 'unknown'}", f"{COHORT_PREFIX}{cohort(item)}"]
+
+def event_minute(item):
+    """Minutes since the epoch of an item's timestamp"""
+    timestamp = datetime.fromisoformat(item['timestamp'].replace('Z', ''))
+    return calendar.timegm(timestamp.utctimetuple()) // 60
+
+class Ring:
+    """Fixed number of (negative, total) buckets ending at head, older buckets are overwritten"""
+
+    def __init__(self, size, counts, head):
+        self.size = size
+        # counts holds the negative counts of every bucket, then the totals
+        self.counts = counts
+        self.head = head
+
+    def add(self, bucket, negative):
+        if bucket > self.head:
+            # Clear the buckets skipped since the last event, at most the whole ring
+            for skipped in range(max(self.head + 1, bucket - self.size + 1), bucket + 1):
+                self.counts[skipped % self.size] = 0
+                self.counts[self.size + skipped % self.size] = 0
+            self.head = bucket
+        elif bucket <= self.head - self.size:
+            # Older than the ring holds
+            return
+        self.counts[bucket % self.size] += 1 if negative else 0
+        self.counts[self.size + bucket % self.size] += 1
+
+    def sum(self, buckets):
+        """Sum the (negative, total) counts of the latest buckets"""
+        negative = total = 0
+        for bucket in range(self.head - min(buckets, self.size) + 1, self.head + 1):
+            negative += self.counts[bucket % self.size]
+            total += self.counts[self.size + bucket % self.size]
+        return negative, total
+
+class SpikeWindow:
+    """Minute and hour rings of one window key, stored as one fixed size item"""
+
+    def __init__(self, key, counts=None, minute_head=0, alerted_minute=0, version=0):
+        self.key = key
+        if counts is None:
+            counts = array.array('I', bytes(4 * 2 * (MINUTE_BUCKETS + HOUR_BUCKETS)))
+        self.counts = counts
+        self.minutes = Ring(MINUTE_BUCKETS, memoryview(counts)[:2 * MINUTE_BUCKETS], minute_head)
+        self.hours = Ring(HOUR_BUCKETS, memoryview(counts)[2 * MINUTE_BUCKETS:], minute_head // 60)
+        self.alerted_minute = alerted_minute
+        self.version = version
+
+    def add(self, minute, negative):
+        self.minutes.add(minute, negative)
+        self.hours.add(minute // 60, negative)
+
+    def check(self):
+        """Compare the detection window with the baseline, returning the window statistics"""
+        negative, total = self.minutes.sum(DETECTION_MINUTES)
+        # The hour ring includes the detection window, which is taken out of the baseline
+        hour_negative, hour_total = self.hours.sum(HOUR_BUCKETS)
+        baseline_negative = max(0, hour_negative - negative)
+        baseline_total = max(0, hour_total - total)
+
+        # Laplace smoothing keeps the baseline rate off 0 and 1
+        baseline_rate = (baseline_negative + 1) / (baseline_total + 2)
+        rate = negative / total if total else 0.0
+        z = 0.0
+        if total:
+            z = (negative - total * baseline_rate) / math.sqrt(total * baseline_rate * (1 - baseline_rate))
+
+        spike = (
+            total >= MIN_WINDOW_COUNT
+            and baseline_total >= MIN_BASELINE_COUNT
+            and z >= Z_THRESHOLD
+            and rate - baseline_rate >= MIN_RATE_INCREASE
+        )
+        return {
+            'key': self.key,
+            'minute': self.minutes.head,
+            'negative': negative,
+            'total': total,
+            'rate': round(rate, 4),
+            'baseline_negative': baseline_negative,
+            'baseline_total': baseline_total,
+            'baseline_rate': round(baseline_rate, 4),
+            'z': round(z, 2),
+            'spike': spike
+        }
+
+class DynamoWindowStore:
+    """Spike windows in a DynamoDB table, written with a version condition"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def load(self, key):
+        item = self.table.get_item(Key={'window_key': key}, ConsistentRead=True).get('Item')
+        if not item:
+            return SpikeWindow(key)
+        counts = array.array('I')
+        counts.frombytes(bytes(item['counts']))
+        return SpikeWindow(key, counts, int(item['minute_head']), int(item.get('alerted_minute', 0)), int(item['version']))
+
+    def save(self, window):
+        """Write a window, returning False if another writer updated it since it was loaded"""
+        condition = {'ConditionExpression': 'attribute_not_exists(window_key)'} if not window.version else {
+            'ConditionExpression': 'version = :v',
+            'ExpressionAttributeValues': {':v': window.version}
+        }
+        try:
+            self.table.put_item(
+                Item={
+                    'window_key': window.key,
+                    'counts': window.counts.tobytes(),
+                    'minute_head': window.minutes.head,
+                    'alerted_minute': window.alerted_minute,
+                    'version': window.version + 1
+                },
+                **condition
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        window.version += 1
+        return True
+
+    def keys(self):
+        scan_args = {'ProjectionExpression': 'window_key'}
+        while True:
+            response = self.table.scan(**scan_args)
+            for item in response.get('Items', []):
+                yield item['window_key']
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+class MemoryWindowStore:
+    """Spike windows in memory, for local replay and tests"""
+
+    def __init__(self):
+        self.windows = {}
+
+    def load(self, key):
+        return self.windows.get(key) or SpikeWindow(key)
+
+    def save(self, window):
+        self.windows[window.key] = window
+        return True
+
+    def keys(self):
+        return list(self.windows)
+
+def stream_items(records):
+    """Get the feedback items inserted by a batch of DynamoDB stream records"""
+    deserializer = TypeDeserializer()
+    items = []
+    for record in records:
+        # Reviews modify items and archiving or TTL removes them, only new feedback is counted
+        if record.get('eventName') != 'INSERT':
+            continue
+        image = record.get('dynamodb', {}).get('NewImage')
+        if image:
+            items.append({key: deserializer.deserialize(value) for key, value in image.items()})
+    return items
+
+def process(items, store):
+    """
+    Count a batch of feedback items into their windows and test each touched window for a spike.
+    Returns the statistics of every touched window and the spikes that should be alerted
+    """
+    # Group the events by window, so each window is read and written once per batch
+    events = {}
+    for item in items:
+        if not item.get('timestamp') or not item.get('feedback_type'):
+            continue
+        event = (event_minute(item), item['feedback_type'] == 'negative')
+        for key in window_keys(item):
+            events.setdefault(key, []).append(event)
+
+    results = []
+    alerts = []
+    for key, key_events in events.items():
+        try:
+            for attempt in range(MAX_WRITE_ATTEMPTS):
+                window = store.load(key)
+                for minute, negative in sorted(key_events):
+                    window.add(minute, negative)
+                stats = window.check()
+                alert = stats['spike'] and window.minutes.head - window.alerted_minute >= ALERT_COOLDOWN_MINUTES
+                if alert:
+                    window.alerted_minute = window.minutes.head
+                if store.save(window):
+                    break
+            else:
+                logger.warning(f"Gave up updating spike window {key} after {MAX_WRITE_ATTEMPTS} conflicting writes")
+                continue
+        except Exception as e:
+            # Counts are best effort, a failed window must not hold up the stream
+            logger.error(f"Error updating spike window {key}: {str(e)}", exc_info=True)
+            continue
+        results.append(stats)
+        if alert:
+            alerts.append(stats)
+    return results, alerts
+
+def emf_document(stats, timestamp):
+    """Build the EMF document of a window's statistics"""
+    return {
+        '_aws': {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [['Window']],
+                'Metrics': [
+                    {'Name': 'NegativeRate', 'Unit': 'None'},
+                    {'Name': 'BaselineNegativeRate', 'Unit': 'None'},
+                    {'Name': 'SpikeScore', 'Unit': 'None'},
+                    {'Name': 'Spike', 'Unit': 'Count'}
+                ]
+            }]
+        },
+        'Window': stats['key'],
+        'NegativeRate': stats['rate'],
+        'BaselineNegativeRate': stats['baseline_rate'],
+        'SpikeScore': stats['z'],
+        'Spike': 1 if stats['spike'] else 0
+    }
+
+def describe(stats):
+    return (
+        f"{stats['key']}: {stats['negative']}/{stats['total']} negative ({stats['rate']:.0%}) in the last "
+        f"{DETECTION_MINUTES} minutes against {stats['baseline_rate']:.0%} over the week (z={stats['z']})"
+    )
+
+def send_alert(stats):
+    """Publish a spike to the alert topic, if one is configured"""
+    logger.warning(f"Negative feedback spike: {describe(stats)}")
+    topic_arn = os.environ.get('SPIKE_TOPIC_ARN')
+    if not topic_arn:
+        return
+    try:
+        sns.publish(
+            TopicArn=topic_arn,
+            Subject=f"Negative feedback spike: {stats['key']}"[:100],
+            Message=json.dumps(dict(stats, description=describe(stats)), indent=2)
+        )
+    except Exception as e:
+        logger.error(f"Error publishing spike alert: {str(e)}", exc_info=True)
+
+def lambda_handler(event, context):
+    """DynamoDB stream consumer for the feedback table"""
+    table = get_spike_table()
+    if table is None:
+        logger.warning("SPIKE_TABLE_NAME is not set, skipping batch")
+        return {'processed': 0}
+
+    items = stream_items(event.get('Records', []))
+    results, alerts = process(items, DynamoWindowStore(table))
+
+    timestamp = int(time.time() * 1000)
+    for stats in results:
+        print(json.dumps(emf_document(stats, timestamp)))
+    for stats in alerts:
+        send_alert(stats)
+    return {'processed': len(items), 'windows': len(results), 'alerts': len(alerts)}
+
+def read_replay_items(path):
+    """
+    Read feedback items for a replay: a Lambda stream event ({"Records": [...]}), or NDJSON of
+    plain items or DynamoDB export lines ({"Item": {...}} in DynamoDB JSON)
+    """
+    deserializer = TypeDeserializer()
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('{"Records"'):
+        return stream_items(json.loads(text)['Records'])
+    items = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if 'Item' in item:
+            item = {key: deserializer.deserialize(value) for key, value in item['Item'].items()}
+        items.append(item)
+    return items
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect spikes of negative feedback')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = subparsers.add_parser('replay', help='Replay stored feedback through the detector in memory')
+    replay_parser.add_argument('path', help='Stream event JSON, or NDJSON of feedback items or DynamoDB export lines')
+    replay_parser.add_argument('--batch-size', type=int, default=100, help='Items per simulated stream batch')
+
+    status_parser = subparsers.add_parser('status', help='Print the current windows')
+    status_parser.add_argument('--table-name', default='feedback-spike-windows', help='DynamoDB spike window table')
+
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        store = DynamoWindowStore(dynamodb.Table(args.table_name))
+        for key in sorted(store.keys()):
+            stats = store.load(key).check()
+            print(f"{'SPIKE ' if stats['spike'] else '      '}{describe(stats)}")
+        return
+
+    # Items are replayed in the order they were written, as the stream would deliver them
+    items = sorted(read_replay_items(args.path), key=lambda item: item.get('timestamp') or '')
+    store = MemoryWindowStore()
+    spikes = 0
+    for start in range(0, len(items), args.batch_size):
+        _, alerts = process(items[start:start + args.batch_size], store)
+        for stats in alerts:
+            spikes += 1
+            at = datetime.utcfromtimestamp(stats['minute'] * 60).strftime('%Y-%m-%d %H:%M')
+            print(f"{at}  SPIKE  {describe(stats)}")
+    print(f"Replayed {len(items)} items into {len(store.windows)} windows, {spikes} spikes")
+
+if __name__ == "__main__":
+    main()
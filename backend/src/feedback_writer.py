@@ -4,6 +4,14 @@ import boto3
 import uuid
 import logging
 import jwt
+import response_encoding
+import feedback_cache
+import feedback_search
+import review_queue
+import feedback_sharding
+import latency_metrics
+import profiling
+import warmup
 from datetime import datetime
 
 # Configure logging
@@ -11,8 +19,9 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = boto3.resource('dynamodb', config=warmup.CLIENT_CONFIG)
 
+@latency_metrics.span('auth')
 def extract_user_from_token(event):
     """Extract user information from JWT token"""
     try:
@@ -42,6 +51,16 @@ def extract_user_from_token(event):
         logger.error(f"Error extracting user from token: {str(e)}", exc_info=True)
         return None
 
+def warm_up():
+    """Open the table, cache and search index connections ahead of the first submission"""
+    table = dynamodb.Table(os.environ.get('FEEDBACK_TABLE_NAME'))
+    warmup.open_connections(lambda: table.get_item(Key={'id': 'warmup'}))
+    warmup.open_connections(feedback_cache.get_current_version, count=1)
+    feedback_search.warm_up()
+
+@warmup.warmable(warm_up)
+@latency_metrics.instrument('writer')
+@profiling.profiled('writer')
 def lambda_handler(event, context):
     # Log the incoming event
     logger.info(f"Received event: {json.dumps(event)}")
@@ -52,7 +71,7 @@ def lambda_handler(event, context):
         user_id = user_info.get('user_id', 'anonymous') if user_info else 'anonymous'
         
         # Get request body from API Gateway event
-        body = json.loads(event.get('body', '{}'))
+        body = response_encoding.get_json_body(event)
         logger.info(f"Request body: {json.dumps(body)}")
         
         # Extract feedback data
@@ -61,6 +80,7 @@ def lambda_handler(event, context):
         feedback_text = body.get('feedback_text', '')
         original_query = body.get('original_query', '')
         llm_response = body.get('llm_response', '')
+        model_id = body.get('model_id') or 'unknown'
         
         logger.info(f"Processing feedback for conversation: {conversation_id}, type: {feedback_type}")
         
@@ -94,18 +114,37 @@ def lambda_handler(event, context):
             'feedback_text': feedback_text,
             'original_query': original_query,
             'llm_response': llm_response,
+            # Lets analytics scans skip the response text
+            'response_length': len(llm_response),
+            'model_id': model_id,
             'timestamp': timestamp,
+            'last_modified': timestamp,
+            'modified_day': timestamp[:10],
             'user_id': user_id,
             'reviewed': False,
             'reviewer_comments': '',
-            'reviewer_id': ''
+            'reviewer_id': '',
+            # Puts the item on the reviewers' work queue
+            'review_queue': review_queue.PENDING
         }
         
+        # Spread hot users and conversations over several GSI partitions
+        feedback_sharding.add_shard_keys(item)
+        
         # Store in DynamoDB
         logger.info(f"Storing feedback with ID: {item['id']}")
-        table.put_item(Item=item)
+        with latency_metrics.span('dynamodb'):
+            table.put_item(Item=item)
         logger.info("Feedback stored successfully")
         
+        # Invalidate cached feedback pages
+        with latency_metrics.span('cache'):
+            feedback_cache.bump_version()
+        
+        # Add the item to the search index
+        with latency_metrics.span('search'):
+            feedback_search.index_item(item)
+        
         # Return successful response
         return {
             'statusCode': 200,
@@ -132,4 +171,7 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Methods': 'OPTIONS,POST'
             },
             'body': json.dumps({'error': f"Error storing feedback: {str(e)}"})
-        }
\ No newline at end of file
+        }
+
+# Provisioned concurrency runs the warm-up during init
+warmup.warm_on_provisioned_init(warm_up)
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import functools
+
+# Histograms are flushed as EMF at the end of the first invocation after this many seconds
+FLUSH_INTERVAL_SECONDS = int(os.environ.get('LATENCY_FLUSH_INTERVAL_SECONDS', '60'))
+
+NAMESPACE = 'FeedbackLatency'
+
+# Log-linear buckets: each power of two is split into 2**SUB_BUCKET_BITS linear buckets,
+# so a recorded value is within 1/16 (6.25%) of the true duration
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# EMF accepts at most 100 distinct values per metric in one document
+MAX_EMF_VALUES = 100
+
+PERCENTILES = (50, 90, 99)
+
+def bucket_index(micros):
+    """Get the bucket of a duration in microseconds"""
+    if micros < SUB_BUCKETS:
+        return micros
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (micros >> shift) - SUB_BUCKETS
+
+def bucket_bounds(index):
+    """Get the lowest duration of a bucket and its width, in microseconds"""
+    if index < 2 * SUB_BUCKETS:
+        return index, 1
+    shift = index // SUB_BUCKETS - 1
+    return (SUB_BUCKETS + index % SUB_BUCKETS) << shift, 1 << shift
+
+class Histogram:
+    """Log-linear histogram of durations in microseconds"""
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, micros):
+        index = bucket_index(micros)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += micros
+        if micros > self.max:
+            self.max = micros
+
+    def percentile(self, percent):
+        """Get the midpoint of the bucket holding a percentile, in microseconds"""
+        rank = self.count * percent / 100
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                low, width = bucket_bounds(index)
+                return min(low + width / 2, self.max)
+        return self.max
+
+    def summary(self):
+        """Get the count, mean, max and percentiles in milliseconds"""
+        summary = {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count / 1000, 3) if self.count else 0,
+            'max_ms': round(self.max / 1000, 3)
+        }
+        for percent in PERCENTILES:
+            summary[f"p{percent}_ms"] = round(self.percentile(percent) / 1000, 3)
+        return summary
+
+# Histograms of this container by (handler, phase), kept across invocations until flushed
+_histograms = {}
+_state = {'handler': 'unknown', 'last_flush': time.time()}
+
+class span:
+    """Time a phase of the current handler, as a context manager or a decorator"""
+
+    __slots__ = ('phase', 'started')
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        record(self.phase, (time.perf_counter_ns() - self.started) // 1000)
+        return False
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(self.phase):
+                return function(*args, **kwargs)
+        return wrapper
+
+def record(phase, micros, handler=None):
+    """Add a duration in microseconds to the histogram of a phase"""
+    key = (handler or _state['handler'], phase)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    histogram.record(micros)
+
+def instrument(handler):
+    """Decorate a Lambda handler to time it as a whole and flush the histograms when they are due"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(event, context):
+            _state['handler'] = handler
+            try:
+                with span('total'):
+                    return function(event, context)
+            finally:
+                if time.time() - _state['last_flush'] >= FLUSH_INTERVAL_SECONDS:
+                    flush()
+        return wrapper
+    return decorator
+
+def emf_documents(handler, phase, histogram, timestamp):
+    """Build the EMF documents of a histogram, its buckets as Values and Counts so CloudWatch can compute percentiles"""
+    indexes = sorted(histogram.buckets)
+    summary = histogram.summary()
+    documents = []
+    for start in range(0, len(indexes), MAX_EMF_VALUES):
+        chunk = indexes[start:start + MAX_EMF_VALUES]
+        values = []
+        for index in chunk:
+            low, width = bucket_bounds(index)
+            values.append(round((low + width / 2) / 1000, 4))
+        document = {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Handler', 'Phase']],
+                    'Metrics': [{'Name': 'Latency', 'Unit': 'Milliseconds'}]
+                }]
+            },
+            'Handler': handler,
+            'Phase': phase,
+            'Latency': {'Values': values, 'Counts': [histogram.buckets[index] for index in chunk]}
+        }
+        # The summary rides along in the first document, for reading in the logs
+        if start == 0:
+            document.update(summary)
+        documents.append(document)
+    return documents
+
+def flush():
+    """Print the histograms as EMF and start new ones"""
+    timestamp = int(time.time() * 1000)
+    for (handler, phase), histogram in list(_histograms.items()):
+        for document in emf_documents(handler, phase, histogram, timestamp):
+            print(json.dumps(document))
+    _histograms.clear()
+    _state['last_flush'] = time.time()
+
+def summaries():
+    """Get the percentile summaries of the histograms not yet flushed"""
+    return {f"{handler}.{phase}": histogram.summary() for (handler, phase), histogram in sorted(_histograms.items())}
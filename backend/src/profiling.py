@@ -0,0 +1,249 @@
+import io
+import os
+import sys
+import hmac
+import time
+import random
+import hashlib
+import logging
+import marshal
+import argparse
+import cProfile
+import pstats
+import threading
+import functools
+from collections import Counter
+import response_encoding
+from feedback_search import S3Store, LocalStore
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Fraction of invocations profiled without being asked, 0 to only profile signed requests
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+
+# sample: a stack sampler thread writing collapsed stacks (low overhead, flame-graph ready)
+# cprofile: deterministic cProfile writing pstats (exact call counts, slows the invocation down)
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sample')
+PROFILE_INTERVAL_SECONDS = float(os.environ.get('PROFILE_INTERVAL_MS', '5')) / 1000
+
+# A request carrying X-Profile: <expires>.<signature> is always profiled, see sign_token
+PROFILE_HEADER = 'X-Profile'
+
+PROFILE_PREFIX = 'profiles/'
+
+def get_profile_store():
+    """Get the store profiles are written to, or None if profiling is not configured"""
+    bucket = os.environ.get('PROFILE_BUCKET')
+    if bucket:
+        return S3Store(bucket)
+    directory = os.environ.get('PROFILE_DIR')
+    if directory:
+        return LocalStore(directory)
+    return None
+
+def sign_token(secret, ttl_seconds, now=None):
+    """Build a profiling header value that is valid for ttl_seconds"""
+    expires = int((now or time.time()) + ttl_seconds)
+    signature = hmac.new(secret.encode('utf-8'), str(expires).encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+def verify_token(secret, token, now=None):
+    """Check a profiling header value against the signing secret"""
+    if not secret or not token or '.' not in token:
+        return False
+    expires, signature = token.split('.', 1)
+    if not expires.isdigit() or int(expires) < (now or time.time()):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), expires.encode('utf-8'), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+def should_profile(event):
+    """Decide whether to profile an invocation, by signed header or by sampling"""
+    token = response_encoding.get_header(event, PROFILE_HEADER) if isinstance(event, dict) else None
+    if token and verify_token(os.environ.get('PROFILE_SECRET', ''), token):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Sample the stacks of all threads from a background thread, counting collapsed stacks"""
+
+    def __init__(self, interval=PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names[thread_id] = next((t.name for t in threading.enumerate() if t.ident == thread_id), str(thread_id))
+                stack.append(names[thread_id])
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def output(self):
+        """Get the samples as collapsed stacks, one 'frame;frame;frame count' line per stack"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode('utf-8')
+
+def profile_key(handler, request_id, extension):
+    # Keys sort by time within a handler
+    return f"{PROFILE_PREFIX}{handler}/{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{request_id}.{extension}"
+
+def profiled(handler):
+    """Decorate a Lambda handler to profile sampled or signed invocations into the profile store"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(event, context):
+            store = get_profile_store()
+            if store is None or not should_profile(event):
+                return function(event, context)
+
+            request_id = getattr(context, 'aws_request_id', None) or f"local-{int(time.time() * 1000)}"
+            if PROFILE_MODE == 'cprofile':
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                profiler = StackSampler()
+                profiler.start()
+            try:
+                return function(event, context)
+            finally:
+                try:
+                    if PROFILE_MODE == 'cprofile':
+                        profiler.disable()
+                        profiler.create_stats()
+                        key = profile_key(handler, request_id, 'pstats')
+                        store.put(key, marshal.dumps(profiler.stats))
+                    else:
+                        profiler.stop()
+                        key = profile_key(handler, request_id, 'collapsed')
+                        store.put(key, profiler.output())
+                    logger.info(f"Wrote profile {key}")
+                except Exception as e:
+                    # A failed profile never fails the request
+                    logger.error(f"Error writing profile for {request_id}: {str(e)}", exc_info=True)
+        return wrapper
+    return decorator
+
+def load_pstats(data):
+    """Load a pstats file from bytes"""
+    stats = pstats.Stats()
+    stats.stats = marshal.loads(data)
+    stats.get_top_level_stats()
+    return stats
+
+def aggregate(store, handler=None, since=None):
+    """Merge the stored profiles, returning the summed collapsed stacks, the merged pstats and the profile count"""
+    prefixes = [f"{PROFILE_PREFIX}{handler}/"] if handler else [
+        f"{PROFILE_PREFIX}{name}/" for name in sorted({key[len(PROFILE_PREFIX):].split('/')[0] for key in store.list(PROFILE_PREFIX)})
+    ]
+    stacks = Counter()
+    merged = None
+    count = 0
+    for prefix in prefixes:
+        for key in store.list(prefix):
+            # Key names start with the profile time, e.g. 20250101T120000-<request id>
+            if since and os.path.basename(key) < since:
+                continue
+            data = store.get(key)
+            if key.endswith('.collapsed'):
+                for line in data.decode('utf-8').splitlines():
+                    stack, _, samples = line.rpartition(' ')
+                    if stack:
+                        stacks[stack] += int(samples)
+            elif key.endswith('.pstats'):
+                stats = load_pstats(data)
+                if merged is None:
+                    merged = stats
+                else:
+                    merged.add(stats)
+            else:
+                continue
+            count += 1
+    return stacks, merged, count
+
+def self_time(stacks, top):
+    """Get the frames with the most samples at the top of the stack"""
+    frames = Counter()
+    for stack, samples in stacks.items():
+        frames[stack.rsplit(';', 1)[-1]] += samples
+    return frames.most_common(top)
+
+def main():
+    parser = argparse.ArgumentParser(description='Sign profiling requests and aggregate handler profiles')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sign_parser = subparsers.add_parser('sign', help=f"Print an {PROFILE_HEADER} header value")
+    sign_parser.add_argument('--secret', default=os.environ.get('PROFILE_SECRET'), help='Signing secret (default: PROFILE_SECRET)')
+    sign_parser.add_argument('--ttl', type=int, default=3600, help='Seconds the header stays valid')
+
+    report_parser = subparsers.add_parser('report', help='Merge stored profiles into a flame graph input')
+    report_parser.add_argument('--bucket', help='S3 bucket holding the profiles (default: PROFILE_BUCKET)')
+    report_parser.add_argument('--profile-dir', help='Local directory holding the profiles')
+    report_parser.add_argument('--handler', help='Only merge profiles of this handler, e.g. reader')
+    report_parser.add_argument('--since', help='Only merge profiles taken from this time, e.g. 20250101T0000')
+    report_parser.add_argument('--output', default='profile.collapsed', help='Merged collapsed stacks, for flamegraph.pl or speedscope')
+    report_parser.add_argument('--pstats-output', default='profile.pstats', help='Merged cProfile stats, for snakeviz or pstats')
+    report_parser.add_argument('--top', type=int, default=20, help='Hot spots to print')
+
+    args = parser.parse_args()
+
+    if args.command == 'sign':
+        if not args.secret:
+            parser.error('Give --secret or set PROFILE_SECRET')
+        print(f"{PROFILE_HEADER}: {sign_token(args.secret, args.ttl)}")
+        return
+
+    if args.profile_dir:
+        store = LocalStore(args.profile_dir)
+    elif args.bucket:
+        store = S3Store(args.bucket)
+    else:
+        store = get_profile_store()
+    if store is None:
+        parser.error('Give --bucket or --profile-dir, or set PROFILE_BUCKET')
+
+    stacks, merged, count = aggregate(store, args.handler, args.since)
+    print(f"Merged {count} profiles")
+
+    if stacks:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for stack, samples in stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+        total = sum(stacks.values())
+        print(f"Wrote {len(stacks)} stacks ({total} samples) to {args.output}")
+        print("Hot spots (self samples):")
+        for frame, samples in self_time(stacks, args.top):
+            print(f"{samples / total:7.1%}  {frame}")
+
+    if merged is not None:
+        merged.dump_stats(args.pstats_output)
+        print(f"Wrote merged cProfile stats to {args.pstats_output}")
+        output = io.StringIO()
+        merged.stream = output
+        merged.sort_stats('cumulative').print_stats(args.top)
+        print(output.getvalue())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import time
+import logging
+import boto3
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from botocore.exceptions import ClientError
+import latency_metrics
+import warmup
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize DynamoDB client
+dynamodb = boto3.resource('dynamodb', config=warmup.CLIENT_CONFIG)
+
+# Limits per user
+REQUESTS_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE', '20'))
+BURST = int(os.environ.get('RATE_LIMIT_BURST', '5'))
+DAILY_TOKEN_QUOTA = int(os.environ.get('DAILY_TOKEN_QUOTA', '0'))
+
+WINDOW_SECONDS = 60
+
+# Users tracked by the in-container token buckets
+MAX_LOCAL_BUCKETS = 10000
+
+# Per-user token buckets, kept across invocations of a warm Lambda container
+_buckets = OrderedDict()
+
+def get_limit_table():
+    """Get the DynamoDB table holding the distributed counters"""
+    table_name = os.environ.get('RATE_LIMIT_TABLE_NAME')
+    if not table_name:
+        return None
+    return dynamodb.Table(table_name)
+
+def warm_up():
+    """Open the connections to the counter table"""
+    table = get_limit_table()
+    if table is not None:
+        warmup.open_connections(lambda: table.get_item(Key={'limit_key': 'warmup'}))
+
+def _take_local_token(user_id, now):
+    """Take a token from the user's bucket in this container, returning 0 or the seconds until one is available"""
+    rate = REQUESTS_PER_MINUTE / WINDOW_SECONDS
+    tokens, updated = _buckets.get(user_id, (BURST, now))
+    tokens = min(BURST, tokens + (now - updated) * rate)
+
+    if tokens < 1:
+        _buckets[user_id] = (tokens, now)
+        return (1 - tokens) / rate
+
+    _buckets[user_id] = (tokens - 1, now)
+    _buckets.move_to_end(user_id)
+    while len(_buckets) > MAX_LOCAL_BUCKETS:
+        _buckets.popitem(last=False)
+    return 0
+
+def _count_window_request(table, user_id, now):
+    """Count a request in the user's fixed window, returning 0 or the seconds until the window ends"""
+    window_start = int(now) - int(now) % WINDOW_SECONDS
+    try:
+        table.update_item(
+            Key={'limit_key': f"requests#{user_id}#{window_start}"},
+            UpdateExpression="ADD request_count :one SET expires_at = :ttl",
+            ConditionExpression="attribute_not_exists(request_count) OR request_count < :limit",
+            ExpressionAttributeValues={
+                ':one': 1,
+                ':limit': REQUESTS_PER_MINUTE,
+                ':ttl': window_start + WINDOW_SECONDS * 2
+            }
+        )
+        return 0
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        return window_start + WINDOW_SECONDS - now
+
+def _quota_key(user_id, now):
+    return f"tokens#{user_id}#{datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%d')}"
+
+def _seconds_until_tomorrow(now):
+    today = datetime.fromtimestamp(now, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (today + timedelta(days=1)).timestamp() - now
+
+@latency_metrics.span('rate_limit')
+def check_request(user_id):
+    """
+    Admit a conversation request for a user, returning None if it may proceed
+    or a dict with the error and the seconds to wait before retrying
+    """
+    now = time.time()
+
+    # Fast path, a user over the limit in this container is rejected without a DynamoDB call
+    wait = _take_local_token(user_id, now)
+    if wait:
+        return {'error': 'Rate limit exceeded', 'retry_after': wait}
+
+    table = get_limit_table()
+    if table is None:
+        return None
+
+    try:
+        # Shared counter, so the limit holds across all containers
+        wait = _count_window_request(table, user_id, now)
+        if wait:
+            return {'error': 'Rate limit exceeded', 'retry_after': wait}
+
+        if DAILY_TOKEN_QUOTA:
+            item = table.get_item(Key={'limit_key': _quota_key(user_id, now)}).get('Item', {})
+            if int(item.get('tokens_used', 0)) >= DAILY_TOKEN_QUOTA:
+                return {'error': 'Daily token quota exceeded', 'retry_after': _seconds_until_tomorrow(now)}
+    except Exception as e:
+        # Fail open, an unavailable limiter shouldn't take the conversation API down with it
+        logger.error(f"Error checking rate limit for {user_id}: {str(e)}", exc_info=True)
+
+    return None
+
+@latency_metrics.span('rate_limit')
+def record_usage(user_id, tokens):
+    """Add the Bedrock tokens used by a request to the user's daily quota"""
+    table = get_limit_table()
+    if table is None or not DAILY_TOKEN_QUOTA or not tokens:
+        return
+
+    now = time.time()
+    try:
+        table.update_item(
+            Key={'limit_key': _quota_key(user_id, now)},
+            UpdateExpression="ADD tokens_used :n SET expires_at = :ttl",
+            ExpressionAttributeValues={
+                ':n': tokens,
+                ':ttl': int(now + _seconds_until_tomorrow(now)) + 86400
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error recording token usage for {user_id}: {str(e)}", exc_info=True)
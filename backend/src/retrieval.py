@@ -0,0 +1,282 @@
+import os
+import re
+import json
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from collections import Counter
+from feedback_search import S3Store, LocalStore, BinarySegment, tokenize, encode_segment, rank
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Passages injected into each conversation prompt
+TOP_K = int(os.environ.get('RETRIEVAL_TOP_K', '4'))
+
+# Passages are built from whole paragraphs up to CHUNK_WORDS words. Longer paragraphs are split
+# into windows overlapping by CHUNK_OVERLAP_WORDS, so a sentence cut at a boundary is in both
+CHUNK_WORDS = 200
+CHUNK_OVERLAP_WORDS = 40
+CORPUS_EXTENSIONS = ('.md', '.txt')
+
+# Query terms looked up per question, every term decodes a posting list so long messages are capped
+MAX_QUERY_TERMS = 32
+
+# How often a container checks the manifest for a rebuilt index
+REFRESH_INTERVAL_SECONDS = float(os.environ.get('RETRIEVAL_REFRESH_INTERVAL_SECONDS', '300'))
+
+# Stable prefix of every grounded prompt, kept identical across requests
+SYSTEM_PROMPT = os.environ.get('RETRIEVAL_SYSTEM_PROMPT') or (
+    "You answer questions for users of this application. Before each question you are given "
+    "passages from the knowledge base in <passage> tags, each with its source. Base your answer "
+    "on the passages when they are relevant and name the sources you used. If they don't cover "
+    "the question, say so and answer from general knowledge."
+)
+
+# Object layout in the index store. Each build writes new content-addressed files and then
+# switches the manifest, so containers never see a half-written index
+INDEX_PREFIX = 'retrieval/'
+MANIFEST_KEY = 'retrieval/manifest.json'
+
+# Binary passage file layout, doc n of the BM25 segment is passage n:
+#   header: magic, format version, passage count
+#   passage offsets (u32 * count+1), passages (UTF-8 JSON objects with source, title and text)
+PASSAGE_MAGIC = b'FBPS'
+PASSAGE_VERSION = 1
+PASSAGE_HEADER = struct.Struct('<4sHxxI')
+U32 = struct.Struct('<I')
+
+HEADING_PATTERN = re.compile(r"^#+\s*(.+)$", re.MULTILINE)
+
+def get_store():
+    """Get the configured retrieval index store, or None if retrieval is not configured"""
+    bucket = os.environ.get('RETRIEVAL_INDEX_BUCKET')
+    if bucket:
+        return S3Store(bucket)
+    directory = os.environ.get('RETRIEVAL_INDEX_DIR')
+    if directory:
+        return LocalStore(directory)
+    return None
+
+def split_words(words):
+    """Split a long run of words into overlapping windows"""
+    step = CHUNK_WORDS - CHUNK_OVERLAP_WORDS
+    return [' '.join(words[i:i + CHUNK_WORDS]) for i in range(0, max(len(words) - CHUNK_OVERLAP_WORDS, 1), step)]
+
+def chunk_text(text):
+    """Split a document into passages of whole paragraphs, up to CHUNK_WORDS words each"""
+    passages = []
+    current = []
+    length = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if length and length + len(words) > CHUNK_WORDS:
+            passages.append('\n\n'.join(current))
+            current, length = [], 0
+        if len(words) > CHUNK_WORDS:
+            passages.extend(split_words(words))
+            continue
+        current.append(paragraph.strip())
+        length += len(words)
+    if current:
+        passages.append('\n\n'.join(current))
+    return passages
+
+def load_corpus(corpus_dir):
+    """Read the documents of a corpus directory, yielding (source, title, text)"""
+    for root, _, files in sorted(os.walk(corpus_dir)):
+        for name in sorted(files):
+            if not name.lower().endswith(CORPUS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            heading = HEADING_PATTERN.search(text)
+            title = heading.group(1).strip() if heading else os.path.splitext(name)[0]
+            yield os.path.relpath(path, corpus_dir).replace(os.sep, '/'), title, text
+
+def encode_passages(passages):
+    """Encode passages as a binary passage file"""
+    offsets = [0]
+    body = bytearray()
+    for passage in passages:
+        body.extend(json.dumps(passage, separators=(',', ':')).encode('utf-8'))
+        offsets.append(len(body))
+    header = PASSAGE_HEADER.pack(PASSAGE_MAGIC, PASSAGE_VERSION, len(passages))
+    return header + struct.pack(f'<{len(offsets)}I', *offsets) + bytes(body)
+
+class PassageFile:
+    """Read-only view over an encoded passage file, usually backed by a memory-mapped file"""
+
+    def __init__(self, buf):
+        self.buf = buf
+        magic, version, self.count = PASSAGE_HEADER.unpack_from(buf, 0)
+        if magic != PASSAGE_MAGIC or version != PASSAGE_VERSION:
+            raise ValueError("Not a retrieval passage file")
+        self.body = PASSAGE_HEADER.size + 4 * (self.count + 1)
+
+    def get(self, n):
+        start = self.body + U32.unpack_from(self.buf, PASSAGE_HEADER.size + 4 * n)[0]
+        end = self.body + U32.unpack_from(self.buf, PASSAGE_HEADER.size + 4 * (n + 1))[0]
+        return json.loads(bytes(self.buf[start:end]))
+
+def build(corpus_dir):
+    """Chunk a corpus directory, returning the encoded BM25 segment and passage file"""
+    passages = []
+    doc_lengths = []
+    postings = {}
+    for source, title, text in load_corpus(corpus_dir):
+        for chunk in chunk_text(text):
+            doc = len(passages)
+            # The document title is indexed with every passage, so a title match finds all of them
+            terms = tokenize(f"{title} {chunk}")
+            for term, tf in Counter(terms).items():
+                postings.setdefault(term, []).append((doc, tf))
+            doc_lengths.append(len(terms))
+            passages.append({'source': source, 'title': title, 'text': chunk})
+
+    segment = encode_segment([str(doc) for doc in range(len(passages))], doc_lengths, postings)
+    return segment, encode_passages(passages), len(passages)
+
+def publish(store, corpus_dir):
+    """Build the index of a corpus and make it the current one"""
+    segment, passage_data, count = build(corpus_dir)
+    version = hashlib.sha256(segment + passage_data).hexdigest()[:16]
+    manifest = {
+        'index': f"{INDEX_PREFIX}index-{version}.bin",
+        'passages': f"{INDEX_PREFIX}passages-{version}.bin",
+        'passage_count': count,
+        'built_at': datetime.utcnow().isoformat()
+    }
+    store.put(manifest['index'], segment)
+    store.put(manifest['passages'], passage_data)
+    store.put(MANIFEST_KEY, json.dumps(manifest).encode('utf-8'))
+    logger.info(f"Published retrieval index {version}: {count} passages, {len(segment) + len(passage_data)} bytes")
+    return manifest
+
+def _mmap(path):
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class Retriever:
+    """BM25 top-k lookup over the memory-mapped index, reloaded when the manifest changes"""
+
+    def __init__(self, store):
+        self.store = store
+        self.manifest = {}
+        self.segment = None
+        self.passages = None
+        self.refreshed_at = 0
+
+    def refresh(self, force=False):
+        """Load the current index if it changed since the last check"""
+        now = time.time()
+        if not force and now - self.refreshed_at < REFRESH_INTERVAL_SECONDS:
+            return
+        self.refreshed_at = now
+
+        manifest = json.loads(self.store.get(MANIFEST_KEY) or '{}')
+        if manifest.get('index') == self.manifest.get('index'):
+            return
+        if manifest.get('index'):
+            logger.info(f"Loading retrieval index: {manifest['index']}")
+            self.segment = BinarySegment(_mmap(self.store.local_path(manifest['index'])))
+            self.passages = PassageFile(_mmap(self.store.local_path(manifest['passages'])))
+        else:
+            self.segment = self.passages = None
+        self.manifest = manifest
+
+    def retrieve(self, query, k=TOP_K):
+        """Get the k passages that best match the query"""
+        if self.segment is None or not self.segment.doc_count:
+            return []
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        return [
+            dict(self.passages.get(int(doc_id)), score=round(score, 3))
+            for doc_id, score in rank([self.segment], ' '.join(terms), k)
+        ]
+
+# Loaded on first use and kept for the life of the container
+_retriever = None
+
+def get_retriever(store):
+    global _retriever
+    if _retriever is None:
+        _retriever = Retriever(store)
+    _retriever.refresh()
+    return _retriever
+
+def retrieve(query, k=TOP_K):
+    """
+    Get the passages grounding a question, or None if retrieval is not configured.
+    A failed lookup returns no passages rather than failing the conversation
+    """
+    store = get_store()
+    if store is None:
+        return None
+    try:
+        return get_retriever(store).retrieve(query, k)
+    except Exception as e:
+        logger.error(f"Error retrieving passages: {str(e)}", exc_info=True)
+        return []
+
+def build_request(message, passages=None):
+    """
+    Build the converse arguments for a message. Without passages (retrieval not configured) the message
+    is sent as is; with passages the stable system prompt comes first, followed by the passages and question
+    """
+    if passages is None:
+        return {'messages': [{'role': 'user', 'content': [{'text': message}]}]}
+
+    system = [{'text': SYSTEM_PROMPT}]
+
+    content = []
+    if passages:
+        context = '\n\n'.join(
+            f"<passage source=\"{passage['source']}\" title=\"{passage['title']}\">\n{passage['text']}\n</passage>"
+            for passage in passages
+        )
+        content.append({'text': context})
+    content.append({'text': message})
+    return {'system': system, 'messages': [{'role': 'user', 'content': content}]}
+
+def warm_up():
+    """Download and map the index, so the first conversation doesn't pay for it"""
+    store = get_store()
+    if store is not None:
+        get_retriever(store)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the retrieval index that grounds conversations')
+    parser.add_argument('command', choices=['build', 'query'], help='Operation to run')
+    parser.add_argument('--corpus-dir', help='Directory of .md and .txt documents (for build)')
+    parser.add_argument('--query', help='Question to retrieve passages for (for query)')
+    parser.add_argument('--top-k', type=int, default=TOP_K, help='Passages to retrieve')
+
+    args = parser.parse_args()
+
+    store = get_store()
+    if store is None:
+        print("Set RETRIEVAL_INDEX_BUCKET or RETRIEVAL_INDEX_DIR")
+        return
+
+    if args.command == 'build':
+        if not args.corpus_dir:
+            parser.error('Give --corpus-dir')
+        print(json.dumps(publish(store, args.corpus_dir), indent=2))
+    else:
+        started = time.perf_counter()
+        passages = get_retriever(store).retrieve(args.query or '', args.top_k)
+        print(f"Retrieved {len(passages)} passages in {(time.perf_counter() - started) * 1000:.2f}ms")
+        for passage in passages:
+            print(f"{passage['score']:8.3f}  {passage['source']}  {passage['text'][:80]!r}")
+
+if __name__ == "__main__":
+    main()
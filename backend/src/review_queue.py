@@ -0,0 +1,186 @@
+import os
+import json
+import random
+import logging
+import argparse
+import boto3
+from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Sparse GSI holding only unreviewed items, the writer sets review_queue and a review removes it
+QUEUE_INDEX = 'ReviewQueueIndex'
+PENDING = 'pending'
+
+# Lease settings
+LEASE_SECONDS = int(os.environ.get('REVIEW_LEASE_SECONDS', '900'))
+MAX_LEASE_SECONDS = 3600
+MAX_CLAIM_COUNT = 25
+
+# Candidates read per query page, and pages read before giving up on a claim
+CLAIM_PAGE_SIZE = 100
+MAX_CLAIM_PAGES = 5
+
+def lease_expiry(now, lease_seconds):
+    """Get the ISO expiry time of a lease taken at now"""
+    lease_seconds = max(1, min(int(lease_seconds), MAX_LEASE_SECONDS))
+    return (now + timedelta(seconds=lease_seconds)).isoformat()
+
+def _is_condition_failure(error):
+    return error.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+def try_claim(table, feedback_id, reviewer_id, now, expires_at):
+    """Claim one item if it is unreviewed and not leased to another reviewer, returning it or None"""
+    try:
+        response = table.update_item(
+            Key={'id': feedback_id},
+            UpdateExpression="set lease_owner = :o, lease_expires_at = :e",
+            ConditionExpression="review_queue = :p AND (attribute_not_exists(lease_owner) OR lease_owner = :o OR lease_expires_at < :n)",
+            ExpressionAttributeValues={
+                ':o': reviewer_id,
+                ':e': expires_at,
+                ':p': PENDING,
+                ':n': now
+            },
+            ReturnValues="ALL_NEW"
+        )
+        return response['Attributes']
+    except ClientError as e:
+        if _is_condition_failure(e):
+            # Another reviewer claimed or reviewed it since the index was read
+            return None
+        raise
+
+def claim_items(table, reviewer_id, count, lease_seconds=LEASE_SECONDS):
+    """Claim up to count of the oldest unreviewed items, returning them and the lease expiry"""
+    now = datetime.utcnow()
+    now_iso = now.isoformat()
+    expires_at = lease_expiry(now, lease_seconds)
+    count = max(1, min(int(count), MAX_CLAIM_COUNT))
+
+    claimed = []
+    start_key = None
+    for _ in range(MAX_CLAIM_PAGES):
+        query_params = {
+            'IndexName': QUEUE_INDEX,
+            'KeyConditionExpression': Key('review_queue').eq(PENDING),
+            # Free items, expired leases, and the caller's own leases (which are renewed)
+            'FilterExpression': Attr('lease_owner').not_exists() | Attr('lease_expires_at').lt(now_iso) | Attr('lease_owner').eq(reviewer_id),
+            'Limit': CLAIM_PAGE_SIZE
+        }
+        if start_key:
+            query_params['ExclusiveStartKey'] = start_key
+
+        response = table.query(**query_params)
+
+        # Reviewers claiming at the same time would all race for the oldest item,
+        # shuffling the page spreads them over different items instead
+        candidates = response.get('Items', [])
+        random.shuffle(candidates)
+
+        for candidate in candidates:
+            if len(claimed) >= count:
+                break
+            item = try_claim(table, candidate['id'], reviewer_id, now_iso, expires_at)
+            if item is not None:
+                claimed.append(item)
+
+        start_key = response.get('LastEvaluatedKey')
+        if len(claimed) >= count or not start_key:
+            break
+
+    logger.info(f"Reviewer {reviewer_id} claimed {len(claimed)} of {count} requested items")
+    claimed.sort(key=lambda item: item.get('timestamp', ''))
+    return claimed, expires_at
+
+def extend_leases(table, reviewer_id, feedback_ids, lease_seconds=LEASE_SECONDS):
+    """Extend the caller's leases, returning a result per item"""
+    expires_at = lease_expiry(datetime.utcnow(), lease_seconds)
+    results = []
+    for feedback_id in feedback_ids:
+        try:
+            table.update_item(
+                Key={'id': feedback_id},
+                UpdateExpression="set lease_expires_at = :e",
+                ConditionExpression="lease_owner = :o",
+                ExpressionAttributeValues={
+                    ':o': reviewer_id,
+                    ':e': expires_at
+                }
+            )
+            results.append({'feedback_id': feedback_id, 'status': 'extended', 'lease_expires_at': expires_at})
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+            results.append({'feedback_id': feedback_id, 'status': 'not_held'})
+    return results
+
+def release_leases(table, reviewer_id, feedback_ids):
+    """Give up the caller's leases so other reviewers can claim the items, returning a result per item"""
+    results = []
+    for feedback_id in feedback_ids:
+        try:
+            table.update_item(
+                Key={'id': feedback_id},
+                UpdateExpression="remove lease_owner, lease_expires_at",
+                ConditionExpression="lease_owner = :o",
+                ExpressionAttributeValues={':o': reviewer_id}
+            )
+            results.append({'feedback_id': feedback_id, 'status': 'released'})
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+            results.append({'feedback_id': feedback_id, 'status': 'not_held'})
+    return results
+
+def backfill(table):
+    """Add unreviewed items written before the review queue existed to the queue"""
+    added = 0
+    scan_params = {
+        'FilterExpression': Attr('reviewed').eq(False) & Attr('review_queue').not_exists(),
+        'ProjectionExpression': 'id'
+    }
+    while True:
+        response = table.scan(**scan_params)
+        for item in response.get('Items', []):
+            try:
+                table.update_item(
+                    Key={'id': item['id']},
+                    UpdateExpression="set review_queue = :p",
+                    ConditionExpression="reviewed = :f",
+                    ExpressionAttributeValues={':p': PENDING, ':f': False}
+                )
+                added += 1
+            except ClientError as e:
+                if not _is_condition_failure(e):
+                    raise
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logger.info(f"Added {added} items to the review queue")
+    return added
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the reviewer work queue')
+    parser.add_argument('command', choices=['backfill', 'claim'], help='Operation to run')
+    parser.add_argument('--table-name', default='user-feedback', help='DynamoDB feedback table')
+    parser.add_argument('--reviewer-id', help='Reviewer to claim items for (for claim)')
+    parser.add_argument('--count', type=int, default=5, help='Number of items to claim (for claim)')
+
+    args = parser.parse_args()
+
+    table = boto3.resource('dynamodb').Table(args.table_name)
+    if args.command == 'backfill':
+        print(f"Added {backfill(table)} items to the review queue")
+    else:
+        items, expires_at = claim_items(table, args.reviewer_id or 'cli', args.count)
+        print(json.dumps({'lease_expires_at': expires_at, 'feedback_ids': [item['id'] for item in items]}, indent=2))
+
+if __name__ == "__main__":
+    main()
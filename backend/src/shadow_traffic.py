@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import random
+import logging
+import argparse
+from decimal import Decimal
+from datetime import datetime, timedelta
+import boto3
+import numpy as np
+import warmup
+import retrieval
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize clients
+dynamodb = boto3.resource('dynamodb', config=warmup.CLIENT_CONFIG)
+lambda_client = boto3.client('lambda', config=warmup.CLIENT_CONFIG)
+bedrock = boto3.client('bedrock-runtime', config=warmup.CLIENT_CONFIG)
+
+# Candidate model and the fraction of conversation requests mirrored to it (0 or no model to disable)
+SHADOW_MODEL_ID = os.environ.get('SHADOW_MODEL_ID', '')
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', '0'))
+
+# Shadow records expire after this many days
+SHADOW_TTL_DAYS = int(os.environ.get('SHADOW_TTL_DAYS', '30'))
+
+def get_shadow_table():
+    """Get the DynamoDB table of side-by-side shadow records, or None if shadowing is not configured"""
+    table_name = os.environ.get('SHADOW_TABLE_NAME')
+    if not table_name:
+        return None
+    return dynamodb.Table(table_name)
+
+def _expires_at():
+    return int(time.time()) + SHADOW_TTL_DAYS * 86400
+
+def _usage_values(prefix, usage):
+    return {
+        f"{prefix}_input_tokens": int(usage.get('inputTokens', 0)),
+        f"{prefix}_output_tokens": int(usage.get('outputTokens', 0))
+    }
+
+class Shadow:
+    """
+    The shadow of one sampled conversation request. Once the primary has answered, a single async invoke
+    hands the request and the primary's side to the candidate Lambda, which records both
+    """
+
+    def __init__(self, conversation_id, message, passages, primary_model_id, candidate_model_id):
+        self.conversation_id = conversation_id
+        self.message = message
+        self.passages = passages
+        self.primary_model_id = primary_model_id
+        self.candidate_model_id = candidate_model_id
+
+    def record_primary(self, response, latency_ms):
+        """Send the primary model's side, from its converse-shaped response or None if it failed"""
+        primary = {
+            'primary_model_id': self.primary_model_id,
+            'primary_latency_ms': int(latency_ms),
+            'created_at': datetime.utcnow().isoformat()
+        }
+        if response:
+            primary['primary_response'] = response['output']['message']['content'][0]['text']
+            primary['primary_truncated'] = bool(response.get('truncated'))
+            primary.update(_usage_values('primary', response.get('usage') or {}))
+        else:
+            primary['primary_error'] = 'No answer'
+        try:
+            # An async invoke returns as soon as Lambda has queued the event, nothing is left running
+            lambda_client.invoke(
+                FunctionName=os.environ['SHADOW_FUNCTION_NAME'],
+                InvocationType='Event',
+                Payload=json.dumps({
+                    'conversation_id': self.conversation_id,
+                    'message': self.message,
+                    'passages': self.passages,
+                    'candidate_model_id': self.candidate_model_id,
+                    'primary': primary
+                }).encode('utf-8')
+            )
+        except Exception as e:
+            logger.error(f"Error starting shadow request {self.conversation_id}: {str(e)}", exc_info=True)
+
+def start(conversation_id, message, passages, primary_model_id):
+    """Sample a conversation request for mirroring to the candidate model, returning its Shadow or None"""
+    if not SHADOW_MODEL_ID or SHADOW_MODEL_ID == primary_model_id or random.random() >= SHADOW_SAMPLE_RATE:
+        return None
+    if not os.environ.get('SHADOW_FUNCTION_NAME'):
+        return None
+    return Shadow(conversation_id, message, passages, primary_model_id, SHADOW_MODEL_ID)
+
+def lambda_handler(event, context):
+    """Answer a mirrored request with the candidate model and record it next to the primary's side"""
+    conversation_id = event['conversation_id']
+    model_id = event['candidate_model_id']
+    values = dict(event.get('primary') or {})
+    values.update({
+        'conversation_id': conversation_id,
+        'candidate_model_id': model_id,
+        'message': event['message'],
+        'expires_at': _expires_at()
+    })
+
+    # Same prompt as the primary, grounded in the same passages
+    started = time.time()
+    try:
+        response = bedrock.converse(modelId=model_id, **retrieval.build_request(event['message'], event.get('passages')))
+        values['candidate_latency_ms'] = int((time.time() - started) * 1000)
+        values['candidate_response'] = response['output']['message']['content'][0]['text']
+        values.update(_usage_values('candidate', response.get('usage') or {}))
+    except Exception as e:
+        logger.error(f"Error calling candidate model {model_id}: {str(e)}", exc_info=True)
+        values['candidate_latency_ms'] = int((time.time() - started) * 1000)
+        values['candidate_error'] = str(e)
+
+    get_shadow_table().put_item(Item=values)
+    logger.info(f"Recorded shadow response for {conversation_id} in {values['candidate_latency_ms']}ms")
+    return {'conversation_id': conversation_id, 'latency_ms': values['candidate_latency_ms']}
+
+def _scan(table, **scan_args):
+    while True:
+        response = table.scan(**scan_args)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def load_records(shadow_table, feedback_table, since=None):
+    """Get the complete shadow records, each with the feedback given on its primary response"""
+    records = [
+        record for record in _scan(shadow_table)
+        if 'primary_model_id' in record and 'candidate_model_id' in record
+        and (not since or record.get('created_at', '') >= since)
+    ]
+    wanted = {record['conversation_id'] for record in records}
+
+    # Feedback is linked through the conversation id the primary response was returned with
+    feedback = {}
+    for item in _scan(feedback_table, ProjectionExpression='conversation_id, feedback_type'):
+        if item.get('conversation_id') in wanted:
+            feedback[item['conversation_id']] = item.get('feedback_type')
+    for record in records:
+        record['feedback_type'] = feedback.get(record['conversation_id'])
+    return records
+
+def parse_prices(values):
+    """Parse --price MODEL=INPUT,OUTPUT values, in dollars per 1000 tokens"""
+    prices = {}
+    for value in values or []:
+        model_id, _, pair = value.rpartition('=')
+        input_price, output_price = (float(part) for part in pair.split(','))
+        prices[model_id] = (input_price, output_price)
+    return prices
+
+def summarize_side(records, side, prices):
+    """Latency, token and cost statistics of one side of the shadow records"""
+    answered = [record for record in records if f"{side}_error" not in record and f"{side}_latency_ms" in record]
+    latencies = np.array([float(record[f"{side}_latency_ms"]) for record in answered])
+    input_tokens = np.array([float(record.get(f"{side}_input_tokens", 0)) for record in answered])
+    output_tokens = np.array([float(record.get(f"{side}_output_tokens", 0)) for record in answered])
+    model_id = records[0][f"{side}_model_id"]
+    summary = {
+        'model_id': model_id,
+        'answered': len(answered),
+        'errors': len(records) - len(answered)
+    }
+    if not answered:
+        return summary
+    summary.update({
+        'latency_ms': {f"p{p}": round(float(np.percentile(latencies, p))) for p in (50, 90, 99)},
+        'mean_input_tokens': round(float(input_tokens.mean()), 1),
+        'mean_output_tokens': round(float(output_tokens.mean()), 1)
+    })
+    if model_id in prices:
+        input_price, output_price = prices[model_id]
+        summary['cost_per_1000_requests'] = round(float((input_tokens * input_price + output_tokens * output_price).mean()), 4)
+    return summary
+
+def compare(records, prices=None):
+    """Compare the primary and candidate sides per model pair"""
+    pairs = {}
+    for record in records:
+        pairs.setdefault((record['primary_model_id'], record['candidate_model_id']), []).append(record)
+
+    comparisons = []
+    for (primary_model_id, candidate_model_id), pair_records in sorted(pairs.items()):
+        rated = [record['feedback_type'] for record in pair_records if record['feedback_type'] in ('positive', 'negative')]
+        comparisons.append({
+            'primary': summarize_side(pair_records, 'primary', prices or {}),
+            'candidate': summarize_side(pair_records, 'candidate', prices or {}),
+            'requests': len(pair_records),
+            # Users only see the primary answer, the candidate's answers to the negatively rated ones are the ones to read
+            'primary_feedback': {
+                'rated': len(rated),
+                'positive_ratio': round(rated.count('positive') / len(rated), 4) if rated else None,
+                'negative_conversations': [record['conversation_id'] for record in pair_records if record['feedback_type'] == 'negative']
+            }
+        })
+    return comparisons
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare candidate models on mirrored conversation traffic')
+    parser.add_argument('--table-name', default='conversation-shadows', help='DynamoDB shadow record table')
+    parser.add_argument('--feedback-table-name', default='user-feedback', help='DynamoDB feedback table')
+    parser.add_argument('--since', help='Only compare records created from this time, e.g. 2025-01-01')
+    parser.add_argument('--days', type=int, help='Only compare records from the last N days')
+    parser.add_argument('--price', action='append', help='MODEL=INPUT,OUTPUT dollars per 1000 tokens, repeatable')
+    parser.add_argument('--output', help='Write the side-by-side records with their feedback to this NDJSON file')
+
+    args = parser.parse_args()
+
+    since = args.since
+    if args.days:
+        since = (datetime.utcnow() - timedelta(days=args.days)).isoformat()
+    records = load_records(dynamodb.Table(args.table_name), dynamodb.Table(args.feedback_table_name), since)
+    print(f"Loaded {len(records)} shadow records")
+
+    for comparison in compare(records, parse_prices(args.price)):
+        comparison['primary_feedback']['negative_conversations'] = len(comparison['primary_feedback']['negative_conversations'])
+        print(json.dumps(comparison, indent=2, default=_json_default))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, default=_json_default) + '\n')
+        print(f"Wrote {len(records)} records to {args.output}")
+
+if __name__ == "__main__":
+    main()
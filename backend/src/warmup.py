@@ -0,0 +1,73 @@
+import os
+import time
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Connections each client keeps pooled, enough for the reader's parallel shard queries
+MAX_POOL_CONNECTIONS = int(os.environ.get('BOTO_MAX_POOL_CONNECTIONS', '32'))
+
+# Connections opened per endpoint by a warm-up
+WARMUP_CONNECTIONS = int(os.environ.get('WARMUP_CONNECTIONS', '4'))
+
+# Client settings shared by the handlers. TCP keep-alive stops idle pooled connections from being
+# dropped between scheduled warm-ups, and a short connect timeout retries a stuck handshake quickly
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=5
+)
+
+def is_warmup_event(event):
+    """Check for the {"warmup": true} event sent by the warm-up schedule"""
+    return isinstance(event, dict) and event.get('warmup') is True
+
+def open_connections(call, count=WARMUP_CONNECTIONS):
+    """
+    Make count concurrent calls so the client's pool holds that many open connections.
+    Calls are expected to fail cheaply (a missing key or an invalid model id), the TLS handshake is what matters
+    """
+    def attempt(_):
+        try:
+            call()
+        except Exception as e:
+            logger.debug(f"Warm-up call failed: {str(e)}")
+
+    if count <= 1:
+        attempt(0)
+        return
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        list(executor.map(attempt, range(count)))
+
+def warm(prepare):
+    """Run a handler's warm-up, returning a summary for the invocation result"""
+    started = time.time()
+    try:
+        prepare()
+    except Exception as e:
+        # A failed warm-up leaves the work to the first real request
+        logger.error(f"Error warming up: {str(e)}", exc_info=True)
+    duration_ms = int((time.time() - started) * 1000)
+    logger.info(f"Warmed up in {duration_ms}ms")
+    return {'warmed': True, 'duration_ms': duration_ms}
+
+def warmable(prepare):
+    """Decorate a Lambda handler to answer warm-up events by running prepare instead of the handler"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(event, context):
+            if is_warmup_event(event):
+                return warm(prepare)
+            return function(event, context)
+        return wrapper
+    return decorator
+
+def warm_on_provisioned_init(prepare):
+    """Warm up during the init phase of provisioned concurrency, before any request arrives"""
+    if os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE') == 'provisioned-concurrency':
+        warm(prepare)
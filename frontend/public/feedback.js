@@ -34,20 +34,48 @@ async function fetchFeedbackData() {
             userNameElement.textContent = window.auth.getUserName();
         }
         
-        // Fetch feedback data
-        const response = await fetch(window.CONFIG.API_ENDPOINTS.FEEDBACK_DATA, {
-            method: 'GET',
-            headers: {
-                'Authorization': `Bearer ${token}`
-            }
-        });
+        const cached = loadCachedFeedback();
+        let loaded = false;
+        
+        // With a local copy, only ask for what changed since the last sync
+        if (cached && cached.syncToken) {
+            const url = `${window.CONFIG.API_ENDPOINTS.FEEDBACK_DATA}?since=${encodeURIComponent(cached.syncToken)}`;
+            const response = await fetch(url, {
+                method: 'GET',
+                headers: buildRequestHeaders(token, cached)
+            });
 
-        if (!response.ok) {
-            throw new Error(`API responded with status: ${response.status}`);
+            if (response.status === 304) {
+                allFeedbackItems = cached.items;
+                loaded = true;
+            } else if (response.ok) {
+                const data = await response.json();
+                allFeedbackItems = mergeFeedbackItems(cached.items, data.feedback_items || []);
+                saveCachedFeedback(response.headers.get('ETag'), allFeedbackItems, data.sync_token);
+                loaded = true;
+            }
+            // Otherwise (e.g. the sync token expired) fall back to a full load
         }
+        
+        if (!loaded) {
+            // Fetch feedback data
+            const response = await fetch(window.CONFIG.API_ENDPOINTS.FEEDBACK_DATA, {
+                method: 'GET',
+                headers: buildRequestHeaders(token, cached)
+            });
 
-        const data = await response.json();
-        allFeedbackItems = data.feedback_items || [];
+            if (response.status === 304 && cached) {
+                allFeedbackItems = cached.items;
+            } else {
+                if (!response.ok) {
+                    throw new Error(`API responded with status: ${response.status}`);
+                }
+
+                const data = await response.json();
+                allFeedbackItems = data.feedback_items || [];
+                saveCachedFeedback(response.headers.get('ETag'), allFeedbackItems, data.sync_token);
+            }
+        }
         
         // Display feedback
         displayFeedback(allFeedbackItems);
@@ -104,6 +132,9 @@ function displayFeedback(items) {
                         <strong>AI Response:</strong>
                         ${escapeHtml(item.llm_response)}
                     </div>
+                    ${item.truncated ? `
+                        <button class="show-full-button" data-id="${item.id}">Show full conversation</button>
+                    ` : ''}
                 </div>
                 ${item.feedback_text ? `
                     <div class="feedback-text">
@@ -117,6 +148,11 @@ function displayFeedback(items) {
     
     feedbackItems.innerHTML = html;
     
+    // Add event listeners to load full items
+    document.querySelectorAll('.show-full-button').forEach(button => {
+        button.addEventListener('click', handleShowFull);
+    });
+    
     // Add event listeners to review forms
     if (isReviewer) {
         document.querySelectorAll('.review-form').forEach(form => {
@@ -125,6 +161,43 @@ function displayFeedback(items) {
     }
 }
 
+async function handleShowFull(event) {
+    const feedbackId = event.target.dataset.id;
+    
+    try {
+        // Get the authentication token
+        const token = window.auth.getCurrentUserToken();
+        if (!token) {
+            throw new Error('Not authenticated');
+        }
+
+        // The list only contains previews, fetch the full item
+        const url = `${window.CONFIG.API_ENDPOINTS.FEEDBACK_DATA}?id=${encodeURIComponent(feedbackId)}`;
+        const response = await fetch(url, {
+            method: 'GET',
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+
+        if (!response.ok) {
+            throw new Error(`API responded with status: ${response.status}`);
+        }
+
+        const data = await response.json();
+        
+        // Replace the preview with the full item and redisplay
+        const itemIndex = allFeedbackItems.findIndex(item => item.id === feedbackId);
+        if (itemIndex !== -1) {
+            allFeedbackItems[itemIndex] = data.feedback_item;
+        }
+        filterFeedback();
+    } catch (error) {
+        console.error('Error loading feedback item:', error);
+        alert('Error loading feedback item. Please try again.');
+    }
+}
+
 function generateReviewSection(item) {
     if (item.reviewed) {
         return `
@@ -235,6 +308,49 @@ function filterFeedback() {
 }
 
 // Helper functions
+function feedbackCacheKey() {
+    return `feedback-data:${window.auth.getUserName()}`;
+}
+
+function loadCachedFeedback() {
+    try {
+        const cached = JSON.parse(sessionStorage.getItem(feedbackCacheKey()));
+        return cached && (cached.etag || cached.syncToken) ? cached : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function saveCachedFeedback(etag, items, syncToken) {
+    if (!etag && !syncToken) {
+        return;
+    }
+    try {
+        sessionStorage.setItem(feedbackCacheKey(), JSON.stringify({ etag, items, syncToken }));
+    } catch (error) {
+        // Storage full or unavailable, the next load will just download everything
+        sessionStorage.removeItem(feedbackCacheKey());
+    }
+}
+
+function buildRequestHeaders(token, cached) {
+    const headers = {
+        'Authorization': `Bearer ${token}`
+    };
+    // Send the ETag of the last copy so unchanged data isn't downloaded again
+    if (cached && cached.etag) {
+        headers['If-None-Match'] = cached.etag;
+    }
+    return headers;
+}
+
+function mergeFeedbackItems(items, changes) {
+    // Changed items replace the local copy, new items are added
+    const merged = new Map(items.map(item => [item.id, item]));
+    changes.forEach(item => merged.set(item.id, item));
+    return Array.from(merged.values());
+}
+
 function capitalizeFirst(str) {
     return str.charAt(0).toUpperCase() + str.slice(1);
 }
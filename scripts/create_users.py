@@ -1,17 +1,102 @@
 import boto3
 import argparse
+import csv
 import json
+import os
 import sys
 import time
+import random
 import getpass
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
-def create_user(cognito_client, user_pool_id, email, name, password, is_reviewer=False):
+# Throttling backoff settings, the spacing between calls doubles on throttling and decays on success
+MIN_CALL_INTERVAL = 0.005
+MAX_CALL_INTERVAL = 5.0
+INTERVAL_DECAY = 0.995
+BACKOFF_WINDOW = 0.2
+MAX_THROTTLE_RETRIES = 10
+RETRY_BASE_DELAY = 0.1
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 5
+
+class AdaptiveThrottle:
+    """Paces the calls of all workers, slowing down when Cognito throttles and speeding back up when it doesn't"""
+    
+    def __init__(self):
+        self.interval = 0.0
+        self.next_call = 0.0
+        self.last_backoff = 0.0
+        self.throttled = 0
+        self.lock = threading.Lock()
+    
+    def wait(self):
+        # Reserve the next free call slot
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_call)
+            self.next_call = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+    
+    def on_throttle(self):
+        with self.lock:
+            self.throttled += 1
+            now = time.monotonic()
+            # Calls already in flight get throttled too, count them as one signal
+            if now - self.last_backoff < BACKOFF_WINDOW:
+                return
+            self.last_backoff = now
+            self.interval = min(MAX_CALL_INTERVAL, max(MIN_CALL_INTERVAL, self.interval) * 2)
+            # Jitter so the workers don't all retry at once
+            self.next_call = now + self.interval * random.uniform(1, 2)
+    
+    def on_success(self):
+        with self.lock:
+            self.interval *= INTERVAL_DECAY
+            if self.interval < MIN_CALL_INTERVAL:
+                self.interval = 0.0
+    
+    def rate_limit(self):
+        """Current pace in calls per second, or None when unthrottled"""
+        return 1 / self.interval if self.interval else None
+
+def error_code(error):
+    """Get the Cognito error code of an exception, or None"""
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code')
+    return None
+
+def call_cognito(throttle, method, **kwargs):
+    """Call a Cognito API, backing off and retrying while it is throttled"""
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        if throttle is not None:
+            throttle.wait()
+        try:
+            response = method(**kwargs)
+            if throttle is not None:
+                throttle.on_success()
+            return response
+        except ClientError as e:
+            if error_code(e) != 'TooManyRequestsException' or throttle is None or attempt == MAX_THROTTLE_RETRIES:
+                raise
+            throttle.on_throttle()
+            # Exponential backoff with full jitter before retrying this call
+            time.sleep(random.uniform(0, min(MAX_CALL_INTERVAL, RETRY_BASE_DELAY * 2 ** attempt)))
+
+def provision_user(cognito_client, user_pool_id, email, name, password, is_reviewer=False, throttle=None):
     """
-    Create a user in the Cognito User Pool
+    Create a user with a permanent password, returning 'created' or 'existing'
     """
+    status = 'created'
     try:
         # Create the user
-        response = cognito_client.admin_create_user(
+        call_cognito(
+            throttle,
+            cognito_client.admin_create_user,
             UserPoolId=user_pool_id,
             Username=email,
             UserAttributes=[
@@ -35,51 +120,352 @@ def create_user(cognito_client, user_pool_id, email, name, password, is_reviewer
             TemporaryPassword=password,
             MessageAction='SUPPRESS'
         )
-        
-        # Set the user's password permanently (skip the force change password step)
-        cognito_client.admin_set_user_password(
-            UserPoolId=user_pool_id,
-            Username=email,
-            Password=password,
-            Permanent=True
-        )
-        
-        print(f"Created user: {email} (Reviewer: {is_reviewer})")
-        return response
+    except ClientError as e:
+        # Left over from an interrupted run, finish setting it up
+        if error_code(e) != 'UsernameExistsException':
+            raise
+        status = 'existing'
+    
+    # Set the user's password permanently (skip the force change password step)
+    call_cognito(
+        throttle,
+        cognito_client.admin_set_user_password,
+        UserPoolId=user_pool_id,
+        Username=email,
+        Password=password,
+        Permanent=True
+    )
+    return status
+
+def create_user(cognito_client, user_pool_id, email, name, password, is_reviewer=False):
+    """
+    Create a user in the Cognito User Pool
+    """
+    try:
+        status = provision_user(cognito_client, user_pool_id, email, name, password, is_reviewer, AdaptiveThrottle())
+        print(f"Created user: {email} (Reviewer: {is_reviewer})" if status == 'created' else f"User already exists: {email}")
+        return status
     except Exception as e:
         print(f"Error creating user {email}: {str(e)}")
         return None
 
+def parse_bool(value):
+    """Parse a boolean from JSON or CSV input"""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', '1', 'yes', 'y')
+
+def iter_users(path):
+    """
+    Read users from a JSON array, NDJSON or CSV file, streaming the NDJSON and CSV formats
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'r', newline='') as f:
+        if extension == '.csv':
+            rows = csv.DictReader(f)
+        elif extension in ('.ndjson', '.jsonl'):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = json.load(f)
+        
+        for row in rows:
+            yield {
+                'email': row['email'].strip(),
+                'name': row.get('name', ''),
+                'password': row['password'],
+                'is_reviewer': parse_bool(row.get('is_reviewer', False))
+            }
+
+class Checkpoint:
+    """Append-only file of the users already provisioned, so an interrupted run can resume"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        self.file = None
+        if path:
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    self.done = {line.strip() for line in f if line.strip()}
+            self.file = open(path, 'a')
+    
+    def __contains__(self, email):
+        return email in self.done
+    
+    def record(self, email):
+        if self.file is None:
+            return
+        with self.lock:
+            self.done.add(email)
+            self.file.write(email + '\n')
+            self.file.flush()
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+class Progress:
+    """Counts results and periodically prints throughput"""
+    
+    def __init__(self, throttle, statuses=('created', 'existing', 'skipped', 'failed')):
+        self.throttle = throttle
+        self.counts = {status: 0 for status in statuses}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.last_report = self.started
+    
+    def add(self, status):
+        with self.lock:
+            self.counts[status] += 1
+            now = time.time()
+            if now - self.last_report >= PROGRESS_INTERVAL:
+                self.last_report = now
+                print(self.summary())
+    
+    def summary(self):
+        elapsed = time.time() - self.started
+        processed = sum(count for status, count in self.counts.items() if status not in ('skipped', 'unchanged'))
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        counts = ', '.join(f"{name}: {count}" for name, count in self.counts.items())
+        rate_limit = self.throttle.rate_limit()
+        pace = f"{rate_limit:.1f} calls/s" if rate_limit else 'unlimited'
+        return f"[{elapsed:.0f}s] {counts} | {rate:.1f} users/s | throttled: {self.throttle.throttled}, pace: {pace}"
+
+def create_users_from_file(cognito_client, user_pool_id, users_file, workers=8, checkpoint_file=None):
+    """
+    Create users from a file with a bounded pool of workers, returning the result counts
+    """
+    throttle = AdaptiveThrottle()
+    progress = Progress(throttle)
+    checkpoint = Checkpoint(checkpoint_file)
+    
+    # Bound the users read ahead of the workers so large files are streamed, not queued in memory
+    slots = threading.BoundedSemaphore(workers * 2)
+    
+    def run(user):
+        try:
+            status = provision_user(
+                cognito_client,
+                user_pool_id,
+                user['email'],
+                user['name'],
+                user['password'],
+                user['is_reviewer'],
+                throttle
+            )
+            checkpoint.record(user['email'])
+            progress.add(status)
+        except Exception as e:
+            print(f"Error creating user {user['email']}: {str(e)}")
+            progress.add('failed')
+        finally:
+            slots.release()
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for user in iter_users(users_file):
+                if user['email'] in checkpoint:
+                    progress.add('skipped')
+                    continue
+                slots.acquire()
+                executor.submit(run, user)
+    finally:
+        checkpoint.close()
+    
+    print(progress.summary())
+    return progress.counts
+
+def list_existing_users(cognito_client, user_pool_id, throttle=None):
+    """
+    Page through the user pool once, indexing users by email
+    """
+    existing = {}
+    params = {
+        'UserPoolId': user_pool_id,
+        'AttributesToGet': ['email', 'name', 'custom:is_reviewer'],
+        'Limit': 60
+    }
+    while True:
+        response = call_cognito(throttle, cognito_client.list_users, **params)
+        for user in response.get('Users', []):
+            attributes = {attribute['Name']: attribute['Value'] for attribute in user.get('Attributes', [])}
+            email = attributes.get('email', user['Username'])
+            existing[email] = {
+                'username': user['Username'],
+                'name': attributes.get('name', ''),
+                'is_reviewer': parse_bool(attributes.get('custom:is_reviewer', 'false')),
+                'enabled': user.get('Enabled', True)
+            }
+        
+        if not response.get('PaginationToken'):
+            break
+        params['PaginationToken'] = response['PaginationToken']
+    
+    return existing
+
+def plan_sync(existing, users, disable_missing=False):
+    """
+    Diff the input users against the pool, yielding (action, email, details) for each change needed
+    """
+    seen = set()
+    for user in users:
+        email = user['email']
+        seen.add(email)
+        current = existing.get(email)
+        if current is None:
+            yield 'create', email, user
+            continue
+        
+        # Passwords can't be read back, so only attributes are compared
+        attributes = {}
+        if user['name'] and user['name'] != current['name']:
+            attributes['name'] = user['name']
+        if user['is_reviewer'] != current['is_reviewer']:
+            attributes['custom:is_reviewer'] = 'true' if user['is_reviewer'] else 'false'
+        if attributes:
+            yield 'update', email, {'username': current['username'], 'attributes': attributes}
+        if not current['enabled']:
+            yield 'enable', email, {'username': current['username']}
+        if not attributes and current['enabled']:
+            yield 'unchanged', email, None
+    
+    if disable_missing:
+        for email, current in existing.items():
+            if email not in seen and current['enabled']:
+                yield 'disable', email, {'username': current['username']}
+
+def apply_change(cognito_client, user_pool_id, action, email, details, throttle=None):
+    """
+    Make one planned change to the user pool
+    """
+    if action == 'create':
+        provision_user(cognito_client, user_pool_id, email, details['name'], details['password'], details['is_reviewer'], throttle)
+    elif action == 'update':
+        call_cognito(
+            throttle,
+            cognito_client.admin_update_user_attributes,
+            UserPoolId=user_pool_id,
+            Username=details['username'],
+            UserAttributes=[{'Name': name, 'Value': value} for name, value in details['attributes'].items()]
+        )
+    elif action == 'enable':
+        call_cognito(throttle, cognito_client.admin_enable_user, UserPoolId=user_pool_id, Username=details['username'])
+    elif action == 'disable':
+        call_cognito(throttle, cognito_client.admin_disable_user, UserPoolId=user_pool_id, Username=details['username'])
+
+def describe_change(action, email, details):
+    """Describe a planned change for the dry-run report"""
+    if action == 'create':
+        return f"{action:<8}{email} (Reviewer: {details['is_reviewer']})"
+    if action == 'update':
+        changes = ', '.join(f"{name}={value}" for name, value in details['attributes'].items())
+        return f"{action:<8}{email}: {changes}"
+    return f"{action:<8}{email}"
+
+def sync_users_from_file(cognito_client, user_pool_id, users_file, workers=8, disable_missing=False, dry_run=False):
+    """
+    Bring the user pool in line with a file, making only the creates, updates and disables needed
+    """
+    throttle = AdaptiveThrottle()
+    existing = list_existing_users(cognito_client, user_pool_id, throttle)
+    print(f"Found {len(existing)} users in the pool")
+    
+    statuses = ('create', 'update', 'enable', 'disable', 'unchanged', 'failed')
+    progress = Progress(throttle, statuses)
+    changes = plan_sync(existing, iter_users(users_file), disable_missing)
+    
+    if dry_run:
+        for action, email, details in changes:
+            progress.counts[action] += 1
+            if action != 'unchanged':
+                print(describe_change(action, email, details))
+        print(f"Dry run: {', '.join(f'{status}: {count}' for status, count in progress.counts.items() if status != 'failed')}")
+        return progress.counts
+    
+    # Bound the changes planned ahead of the workers, as in create_users_from_file
+    slots = threading.BoundedSemaphore(workers * 2)
+    
+    def run(action, email, details):
+        try:
+            apply_change(cognito_client, user_pool_id, action, email, details, throttle)
+            progress.add(action)
+        except Exception as e:
+            print(f"Error applying {action} to user {email}: {str(e)}")
+            progress.add('failed')
+        finally:
+            slots.release()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for action, email, details in changes:
+            if action == 'unchanged':
+                progress.add(action)
+                continue
+            slots.acquire()
+            executor.submit(run, action, email, details)
+    
+    print(progress.summary())
+    return progress.counts
+
 def main():
     parser = argparse.ArgumentParser(description='Create users in Cognito User Pool')
     parser.add_argument('--user-pool-id', required=True, help='Cognito User Pool ID')
     parser.add_argument('--region', default='us-east-1', help='AWS region')
-    parser.add_argument('--users-file', help='JSON file with user data')
+    parser.add_argument('--users-file', help='JSON, NDJSON (.ndjson/.jsonl) or CSV file with user data')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent Cognito workers for --users-file')
+    parser.add_argument('--checkpoint-file', help='File recording created users, rerun with the same file to resume')
+    parser.add_argument('--sync', action='store_true', help='Only create, update or re-enable the users in --users-file that differ from the pool')
+    parser.add_argument('--disable-missing', action='store_true', help='With --sync, disable pool users that are not in --users-file')
+    parser.add_argument('--dry-run', action='store_true', help='With --sync, report the changes without making them')
+    parser.add_argument('--endpoint-url', help='Cognito endpoint, e.g. a local Cognito stand-in for testing')
     parser.add_argument('--interactive', action='store_true', help='Create users interactively')
     
     args = parser.parse_args()
     
-    # Initialize Cognito client
-    cognito_client = boto3.client('cognito-idp', region_name=args.region)
+    # Initialize Cognito client, throttling retries are handled by AdaptiveThrottle
+    cognito_client = boto3.client(
+        'cognito-idp',
+        region_name=args.region,
+        endpoint_url=args.endpoint_url,
+        config=Config(
+            max_pool_connections=max(10, args.workers),
+            retries={'mode': 'standard', 'total_max_attempts': 1}
+        )
+    )
     
-    if args.users_file:
+    if args.users_file and args.sync:
+        # Sync the pool with the file
+        try:
+            counts = sync_users_from_file(
+                cognito_client,
+                args.user_pool_id,
+                args.users_file,
+                args.workers,
+                args.disable_missing,
+                args.dry_run
+            )
+            if counts['failed']:
+                print(f"{counts['failed']} changes failed, rerun to retry them")
+                sys.exit(1)
+        
+        except Exception as e:
+            print(f"Error syncing users from file: {str(e)}")
+            sys.exit(1)
+    
+    elif args.users_file:
         # Create users from file
         try:
-            with open(args.users_file, 'r') as f:
-                users = json.load(f)
-            
-            for user in users:
-                create_user(
-                    cognito_client,
-                    args.user_pool_id,
-                    user['email'],
-                    user['name'],
-                    user['password'],
-                    user.get('is_reviewer', False)
-                )
-                # Small delay to avoid throttling
-                time.sleep(0.5)
-                
+            counts = create_users_from_file(
+                cognito_client,
+                args.user_pool_id,
+                args.users_file,
+                args.workers,
+                args.checkpoint_file
+            )
+            if counts['failed']:
+                print(f"{counts['failed']} users failed, rerun to retry them")
+                sys.exit(1)
+        
         except Exception as e:
             print(f"Error creating users from file: {str(e)}")
             sys.exit(1)
@@ -90,7 +476,7 @@ def main():
             email = input("Enter user email (or 'q' to quit): ")
             if email.lower() == 'q':
                 break
-                
+            
             name = input("Enter user name: ")
             password = getpass.getpass("Enter password (min 8 chars, uppercase, lowercase, number): ")
             is_reviewer = input("Is this user a reviewer? (y/n): ").lower() == 'y'
@@ -118,7 +504,6 @@ def main():
                 default_password,
                 False
             )
-            time.sleep(0.5)
         
         # Create reviewer users
         for i in range(1, 3):
@@ -130,7 +515,6 @@ def main():
                 default_password,
                 True
             )
-            time.sleep(0.5)
     
     print("User creation completed.")
 
@@ -28,7 +28,7 @@ Copy-Item -Path "$projectRoot\backend\src\*" -Destination $tempDir -Recurse
 
 # Install dependencies
 Push-Location $tempDir
-pip install -r requirements.txt -t .
+pip install -r requirements.txt -t . --platform manylinux2014_x86_64 --python-version 3.11 --only-binary=:all:
 Pop-Location
 
 # Create zip package
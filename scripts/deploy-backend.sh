@@ -26,7 +26,7 @@ cp -r "$PROJECT_ROOT/backend/src/"* "$TEMP_DIR/"
 
 # Install dependencies
 cd "$TEMP_DIR"
-pip install -r requirements.txt -t .
+pip install -r requirements.txt -t . --platform manylinux2014_x86_64 --python-version 3.11 --only-binary=:all:
 cd -
 
 # Create zip package
@@ -30,13 +30,13 @@ $distributionId = ($outputs | Where-Object { $_.OutputKey -eq "CloudFrontDistrib
 Write-Host "S3 Bucket: $s3BucketName"
 Write-Host "CloudFront URL: $cloudFrontUrl"
 
-# Upload files to S3
-Write-Host "Uploading files to S3..."
-aws s3 sync "$projectRoot\frontend\public" "s3://$s3BucketName" --delete
+# Build minified, fingerprinted and precompressed assets
+Write-Host "Building frontend..."
+python "$projectRoot\spa\scripts\build.py" --public-dir "$projectRoot\frontend\public" --dist-dir "$projectRoot\frontend\dist"
 
-# Create invalidation to clear CloudFront cache
-Write-Host "Creating CloudFront invalidation..."
-aws cloudfront create-invalidation --distribution-id $distributionId --paths "/*"
+# Upload changed files to S3 and invalidate changed pages in CloudFront
+Write-Host "Uploading changed files to S3..."
+python "$projectRoot\spa\scripts\upload_assets.py" --dist-dir "$projectRoot\frontend\dist" --bucket $s3BucketName --distribution-id $distributionId
 
 Write-Host "Frontend deployment complete!"
 Write-Host "Your application is available at: $cloudFrontUrl"
\ No newline at end of file
@@ -32,13 +32,13 @@ DISTRIBUTION_ID=$(echo "$OUTPUTS" | jq -r '.[] | select(.OutputKey=="CloudFrontD
 echo "S3 Bucket: $S3_BUCKET_NAME"
 echo "CloudFront URL: $CLOUDFRONT_URL"
 
-# Upload files to S3
-echo "Uploading files to S3..."
-aws s3 sync "$PROJECT_ROOT/frontend/public" "s3://$S3_BUCKET_NAME" --delete
+# Build minified, fingerprinted and precompressed assets
+echo "Building frontend..."
+python "$PROJECT_ROOT/spa/scripts/build.py" --public-dir "$PROJECT_ROOT/frontend/public" --dist-dir "$PROJECT_ROOT/frontend/dist"
 
-# Create invalidation to clear CloudFront cache
-echo "Creating CloudFront invalidation..."
-aws cloudfront create-invalidation --distribution-id "$DISTRIBUTION_ID" --paths "/*"
+# Upload changed files to S3 and invalidate changed pages in CloudFront
+echo "Uploading changed files to S3..."
+python "$PROJECT_ROOT/spa/scripts/upload_assets.py" --dist-dir "$PROJECT_ROOT/frontend/dist" --bucket "$S3_BUCKET_NAME" --distribution-id "$DISTRIBUTION_ID"
 
 echo "Frontend deployment complete!"
 echo "Your application is available at: $CLOUDFRONT_URL"
\ No newline at end of file
@@ -94,19 +94,13 @@ Write-Host "Found S3 bucket: $bucketName"
 Write-Host "Found CloudFront distribution ID: $distributionId"
 Write-Host "Found CloudFront URL: $cloudFrontUrl"
 
-# Upload config.js to S3
-Write-Host "Uploading config.js to S3..."
-aws s3 cp $configPath "s3://$bucketName/config.js"
+# Rebuild the frontend with the new config.js, the pages refer to it by its fingerprinted name
+Write-Host "Building frontend..."
+python "$projectRoot\spa\scripts\build.py" --public-dir "$projectRoot\frontend\public" --dist-dir "$projectRoot\frontend\dist"
 
-# Create invalidation
-Write-Host "Creating CloudFront invalidation..."
-$invalidationId = aws cloudfront create-invalidation --distribution-id $distributionId --paths "/config.js" --query "Invalidation.Id" --output text
-
-Write-Host "Invalidation created with ID: $invalidationId"
-Write-Host "Waiting for invalidation to complete (this may take a few minutes)..."
-
-# Wait for invalidation to complete
-aws cloudfront wait invalidation-completed --distribution-id $distributionId --id $invalidationId
+# Upload changed files to S3 and invalidate changed pages in CloudFront
+Write-Host "Uploading changed files to S3..."
+python "$projectRoot\spa\scripts\upload_assets.py" --dist-dir "$projectRoot\frontend\dist" --bucket $bucketName --distribution-id $distributionId
 
 Write-Host "Update complete! Your changes should now be visible at:"
 Write-Host "$cloudFrontUrl"
\ No newline at end of file
@@ -94,19 +94,13 @@ echo "Found S3 bucket: $BUCKET_NAME"
 echo "Found CloudFront distribution ID: $DISTRIBUTION_ID"
 echo "Found CloudFront URL: $CLOUDFRONT_URL"
 
-# Upload config.js to S3
-echo "Uploading config.js to S3..."
-aws s3 cp "$CONFIG_PATH" "s3://$BUCKET_NAME/config.js"
+# Rebuild the frontend with the new config.js, the pages refer to it by its fingerprinted name
+echo "Building frontend..."
+python "$PROJECT_ROOT/spa/scripts/build.py" --public-dir "$PROJECT_ROOT/frontend/public" --dist-dir "$PROJECT_ROOT/frontend/dist"
 
-# Create invalidation
-echo "Creating CloudFront invalidation..."
-INVALIDATION_ID=$(aws cloudfront create-invalidation --distribution-id $DISTRIBUTION_ID --paths "/config.js" --query "Invalidation.Id" --output text)
-
-echo "Invalidation created with ID: $INVALIDATION_ID"
-echo "Waiting for invalidation to complete (this may take a few minutes)..."
-
-# Wait for invalidation to complete
-aws cloudfront wait invalidation-completed --distribution-id $DISTRIBUTION_ID --id $INVALIDATION_ID
+# Upload changed files to S3 and invalidate changed pages in CloudFront
+echo "Uploading changed files to S3..."
+python "$PROJECT_ROOT/spa/scripts/upload_assets.py" --dist-dir "$PROJECT_ROOT/frontend/dist" --bucket "$BUCKET_NAME" --distribution-id "$DISTRIBUTION_ID"
 
 echo "Update complete! Your changes should now be visible at:"
 echo "$CLOUDFRONT_URL"
\ No newline at end of file
@@ -27,7 +27,7 @@ Copy-Item -Path "$projectRoot\backend\src\*" -Destination $tempDir -Recurse
 
 # Install dependencies
 Push-Location $tempDir
-pip install -r requirements.txt -t .
+pip install -r requirements.txt -t . --platform manylinux2014_x86_64 --python-version 3.11 --only-binary=:all:
 Pop-Location
 
 # Create zip package
@@ -58,7 +58,7 @@ aws s3 cp $zipPath "s3://$bucketName/lambda/feedback-lambda.zip"
 
 # Update Lambda functions
 Write-Host "Updating Lambda functions with latest code..."
-$functions = @("feedback-lambda", "feedback-writer-lambda", "feedback-reader-lambda", "feedback-reviewer-lambda")
+$functions = @("feedback-lambda", "feedback-writer-lambda", "feedback-reader-lambda", "feedback-reviewer-lambda", "feedback-analytics-lambda")
 
 foreach ($function in $functions) {
     Write-Host "Updating function: $function"
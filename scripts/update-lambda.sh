@@ -25,7 +25,7 @@ cp -r "$PROJECT_ROOT/backend/src/"* "$TEMP_DIR/"
 
 # Install dependencies
 cd "$TEMP_DIR"
-pip install -r requirements.txt -t .
+pip install -r requirements.txt -t . --platform manylinux2014_x86_64 --python-version 3.11 --only-binary=:all:
 cd -
 
 # Create zip package
@@ -56,7 +56,7 @@ aws s3 cp "$ZIP_PATH" "s3://$BUCKET_NAME/lambda/feedback-lambda.zip"
 
 # Update Lambda functions
 echo "Updating Lambda functions with latest code..."
-FUNCTIONS=("feedback-lambda" "feedback-writer-lambda" "feedback-reader-lambda" "feedback-reviewer-lambda")
+FUNCTIONS=("feedback-lambda" "feedback-writer-lambda" "feedback-reader-lambda" "feedback-reviewer-lambda" "feedback-analytics-lambda")
 
 for FUNCTION in "${FUNCTIONS[@]}"; do
     echo "Updating function: $FUNCTION"
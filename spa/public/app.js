@@ -9,6 +9,7 @@ const logoutButton = document.getElementById('logout-button');
 let conversationId = null;
 let lastQuery = '';
 let lastResponse = '';
+let lastModelId = '';
 
 // Event Listeners
 sendButton.addEventListener('click', sendMessage);
@@ -61,6 +62,11 @@ async function sendMessage() {
             body: JSON.stringify({ message })
         });
 
+        if (response.status === 429) {
+            const retryAfter = response.headers.get('Retry-After');
+            throw new Error(`Rate limited: ${retryAfter}`);
+        }
+
         if (!response.ok) {
             throw new Error(`API responded with status: ${response.status}`);
         }
@@ -70,12 +76,18 @@ async function sendMessage() {
         // Save conversation ID and response
         conversationId = data.conversation_id;
         lastResponse = data.response;
+        lastModelId = data.model_id;
         
         // Remove loading indicator
         loadingElement.remove();
         
         // Add assistant response to chat with feedback buttons
         addMessageWithFeedback(data.response, data.conversation_id);
+        
+        // The answer was cut off to respond before the request timed out
+        if (data.truncated) {
+            addMessage('This answer was cut short. Try asking for a shorter or more specific answer.', 'system');
+        }
     } catch (error) {
         console.error('Error sending message:', error);
         
@@ -85,6 +97,9 @@ async function sendMessage() {
         if (error.message === 'Not authenticated') {
             // Redirect to login page
             window.location.href = 'login.html';
+        } else if (error.message.startsWith('Rate limited')) {
+            const seconds = parseInt(error.message.split(': ')[1], 10);
+            addMessage(`You're sending messages too quickly. Please try again in ${seconds || 'a few'} seconds.`, 'system');
         } else {
             // Add error message
             addMessage('Sorry, there was an error processing your request. Please try again.', 'system');
@@ -216,7 +231,8 @@ async function submitFeedback(feedbackType, feedbackText, msgConversationId) {
                 feedback_type: feedbackType,
                 feedback_text: feedbackText,
                 original_query: lastQuery,
-                llm_response: lastResponse
+                llm_response: lastResponse,
+                model_id: lastModelId
             })
         });
         
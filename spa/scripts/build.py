@@ -0,0 +1,238 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+# Minifiers and brotli are optional, without them a conservative built-in minifier is used and only .gz files are written
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Name of the manifest written to the root of the build output
+MANIFEST_NAME = 'asset-manifest.json'
+
+# Fingerprinted files never change under the same name, so browsers and CloudFront can keep them for a year.
+# HTML pages and anything else keep their names and are revalidated on every load
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# Length of the content hash added to asset file names, matched by the CloudFront function in spa-template.yaml
+HASH_LENGTH = 10
+
+FINGERPRINTED_EXTENSIONS = ('.js', '.css')
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon'
+}
+
+COMPRESSIBLE_EXTENSIONS = ('.html', '.js', '.css', '.json', '.svg')
+
+# Characters after which a / starts a regular expression rather than a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+
+def minify_js(source):
+    """Minify JavaScript, dropping comments and indentation but keeping line breaks so semicolon insertion still works"""
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    
+    out = []
+    i = 0
+    length = len(source)
+    last_significant = ''
+    while i < length:
+        char = source[i]
+        pair = source[i:i + 2]
+        if pair == '//':
+            # Line comment
+            end = source.find('\n', i)
+            i = length if end == -1 else end
+        elif pair == '/*':
+            # Block comment
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+        elif char in '\'"`' or (char == '/' and (last_significant == '' or last_significant in REGEX_PRECEDERS)):
+            # String, template or regex literal, copied verbatim
+            start = i
+            i += 1
+            in_class = False
+            while i < length:
+                if source[i] == '\\':
+                    i += 2
+                    continue
+                if char == '/' and source[i] == '[':
+                    in_class = True
+                elif char == '/' and source[i] == ']':
+                    in_class = False
+                elif source[i] == char and not in_class:
+                    break
+                i += 1
+            i += 1
+            out.append(source[start:i])
+            last_significant = char
+        else:
+            out.append(char)
+            if not char.isspace():
+                last_significant = char
+            i += 1
+    
+    lines = (line.strip() for line in ''.join(out).split('\n'))
+    return '\n'.join(line for line in lines if line) + '\n'
+
+def minify_css(source):
+    """Minify CSS by dropping comments and collapsing whitespace"""
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    # Spaces before : are kept, they are significant in selectors like "div :hover"
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    source = source.replace(';}', '}')
+    return source.strip() + '\n'
+
+def fingerprint(name, content):
+    """Add a content hash to a file name, e.g. app.js -> app.3f9c0a1b2d.js"""
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    base, extension = os.path.splitext(name)
+    return f"{base}.{digest}{extension}"
+
+def rewrite_references(html, renamed):
+    """Point src and href attributes of an HTML page at the fingerprinted file names"""
+    def replace(match):
+        attribute, quote, value = match.groups()
+        return f"{attribute}={quote}{renamed.get(value, value)}{quote}"
+    return re.sub(r'\b(src|href)=(["\'])([^"\']+)\2', replace, html)
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def precompress(dist_dir, name, content):
+    """Write .gz and .br siblings of a file, returning the encodings written"""
+    encodings = {}
+    
+    # mtime=0 keeps the output identical between builds of the same content
+    write_file(os.path.join(dist_dir, name + '.gz'), gzip.compress(content, compresslevel=9, mtime=0))
+    encodings['gzip'] = name + '.gz'
+    
+    if brotli is not None:
+        write_file(os.path.join(dist_dir, name + '.br'), brotli.compress(content, quality=11))
+        encodings['br'] = name + '.br'
+    
+    return encodings
+
+def build(public_dir, dist_dir, stack_name=None):
+    """Build the SPA from public_dir into dist_dir, returning the manifest"""
+    if os.path.exists(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+    
+    sources = {}
+    for root, _, files in os.walk(public_dir):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            name = os.path.relpath(path, public_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                sources[name] = f.read()
+    
+    # Fill in config.js from the backend stack outputs without touching the source copy
+    if stack_name and 'config.js' in sources:
+        from update_config import update_config_file
+        config_path = os.path.join(dist_dir, 'config.js')
+        write_file(config_path, sources['config.js'])
+        if not update_config_file(config_path, stack_name):
+            raise RuntimeError(f"Could not update config.js from stack {stack_name}")
+        with open(config_path, 'rb') as f:
+            sources['config.js'] = f.read()
+        os.remove(config_path)
+    
+    outputs = {}
+    renamed = {}
+    
+    # Minify and fingerprint scripts and stylesheets first, the pages refer to their new names
+    for name, content in sources.items():
+        extension = os.path.splitext(name)[1].lower()
+        if extension not in FINGERPRINTED_EXTENSIONS:
+            continue
+        text = content.decode('utf-8')
+        minified = (minify_js(text) if extension == '.js' else minify_css(text)).encode('utf-8')
+        output_name = fingerprint(name, minified)
+        renamed[name] = output_name
+        outputs[output_name] = (name, minified, IMMUTABLE_CACHE_CONTROL)
+    
+    for name, content in sources.items():
+        extension = os.path.splitext(name)[1].lower()
+        if extension in FINGERPRINTED_EXTENSIONS:
+            continue
+        if extension == '.html':
+            content = rewrite_references(content.decode('utf-8'), renamed).encode('utf-8')
+        outputs[name] = (name, content, REVALIDATE_CACHE_CONTROL)
+    
+    manifest = {'files': {}}
+    for output_name, (source_name, content, cache_control) in sorted(outputs.items()):
+        write_file(os.path.join(dist_dir, output_name), content)
+        extension = os.path.splitext(output_name)[1].lower()
+        entry = {
+            'source': source_name,
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'size': len(content),
+            'content_type': CONTENT_TYPES.get(extension, 'application/octet-stream'),
+            'cache_control': cache_control,
+            'encodings': {}
+        }
+        # Only fingerprinted files are served precompressed, CloudFront compresses the rest on the fly
+        if cache_control == IMMUTABLE_CACHE_CONTROL and extension in COMPRESSIBLE_EXTENSIONS:
+            entry['encodings'] = precompress(dist_dir, output_name, content)
+        manifest['files'][output_name] = entry
+    
+    write_file(os.path.join(dist_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+def main():
+    # Get the SPA directory
+    spa_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    
+    parser = argparse.ArgumentParser(description='Build the SPA with minified, fingerprinted and precompressed assets')
+    parser.add_argument('--public-dir', default=os.path.join(spa_dir, 'public'), help='Source directory')
+    parser.add_argument('--dist-dir', default=os.path.join(spa_dir, 'dist'), help='Build output directory')
+    parser.add_argument('--stack-name', help='Backend stack whose outputs are filled into config.js')
+    
+    args = parser.parse_args()
+    
+    try:
+        manifest = build(args.public_dir, args.dist_dir, args.stack_name)
+    except Exception as e:
+        print(f"Error building SPA: {str(e)}")
+        sys.exit(1)
+    
+    total = sum(entry['size'] for entry in manifest['files'].values())
+    print(f"Built {len(manifest['files'])} files ({total} bytes) into {args.dist_dir}")
+    if brotli is None:
+        print("brotli is not installed, only .gz files were written")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
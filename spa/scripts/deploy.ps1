@@ -10,14 +10,13 @@ $env:AWS_REGION = $Region
 # Get the project root directory (one level up from scripts)
 $projectRoot = Split-Path -Parent $PSScriptRoot
 
-# Create dist directory if it doesn't exist
-if (-not (Test-Path -Path "$projectRoot\dist")) {
-    New-Item -ItemType Directory -Path "$projectRoot\dist" | Out-Null
-}
-
-# Copy public files to dist
+# Build minified, fingerprinted and precompressed assets into dist
 Write-Host "Building SPA..."
-Copy-Item -Path "$projectRoot\public\*" -Destination "$projectRoot\dist\" -Recurse -Force
+python "$PSScriptRoot\build.py" --public-dir "$projectRoot\public" --dist-dir "$projectRoot\dist"
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "SPA build failed"
+    exit 1
+}
 
 # Check if stack exists and is in a failed state
 Write-Host "Checking if stack exists and needs to be deleted first..."
@@ -57,9 +56,10 @@ $outputs = aws cloudformation describe-stacks --stack-name $StackName --query "S
 # Get S3 bucket name from outputs
 $s3BucketName = ($outputs | Where-Object { $_.OutputKey -eq "S3BucketName" }).OutputValue
 
-# Upload files to S3
-Write-Host "Uploading files to S3..."
-aws s3 sync "$projectRoot\dist" "s3://$s3BucketName" --delete
+# Upload changed files to S3 and invalidate changed pages in CloudFront
+Write-Host "Uploading changed files to S3..."
+$distributionId = ($outputs | Where-Object { $_.OutputKey -eq "CloudFrontDistributionId" }).OutputValue
+python "$PSScriptRoot\upload_assets.py" --dist-dir "$projectRoot\dist" --bucket $s3BucketName --distribution-id $distributionId
 
 # Display outputs
 Write-Host "Deployment complete. Stack outputs:"
@@ -28,19 +28,13 @@ Write-Host "Found S3 bucket: $bucketName"
 Write-Host "Found CloudFront distribution ID: $distributionId"
 Write-Host "Found CloudFront URL: $cloudFrontUrl"
 
-# Upload files to S3
-Write-Host "Uploading files to S3..."
-aws s3 sync "$projectRoot\public" "s3://$bucketName" --delete
+# Build minified, fingerprinted and precompressed assets into dist
+Write-Host "Building SPA..."
+python "$PSScriptRoot\build.py" --public-dir "$projectRoot\public" --dist-dir "$projectRoot\dist"
 
-# Create invalidation
-Write-Host "Creating CloudFront invalidation..."
-$invalidationId = aws cloudfront create-invalidation --distribution-id $distributionId --paths "/*" --query "Invalidation.Id" --output text
-
-Write-Host "Invalidation created with ID: $invalidationId"
-Write-Host "Waiting for invalidation to complete (this may take a few minutes)..."
-
-# Wait for invalidation to complete
-aws cloudfront wait invalidation-completed --distribution-id $distributionId --id $invalidationId
+# Upload changed files to S3 and invalidate changed pages in CloudFront
+Write-Host "Uploading changed files to S3..."
+python "$PSScriptRoot\upload_assets.py" --dist-dir "$projectRoot\dist" --bucket $bucketName --distribution-id $distributionId
 
 Write-Host "Update complete! Your changes should now be visible at:"
 Write-Host $cloudFrontUrl
\ No newline at end of file
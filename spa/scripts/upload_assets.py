@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sys
+import time
+import boto3
+from botocore.exceptions import ClientError
+
+from build import MANIFEST_NAME, IMMUTABLE_CACHE_CONTROL
+
+def get_bucket_name(stack_name):
+    """Get the SPA bucket name from the frontend stack outputs"""
+    cfn = boto3.client('cloudformation')
+    outputs = cfn.describe_stacks(StackName=stack_name)['Stacks'][0]['Outputs']
+    for output in outputs:
+        if output['OutputKey'] == 'S3BucketName':
+            return output['OutputValue']
+    raise RuntimeError(f"Stack {stack_name} has no S3BucketName output")
+
+def load_remote_manifest(s3, bucket):
+    """Get the manifest of the last upload, or an empty one"""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=MANIFEST_NAME)
+        return json.loads(response['Body'].read())
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'AccessDenied'):
+            return {'files': {}}
+        raise
+
+def changed_files(manifest, remote_manifest):
+    """Get the files whose content differs from the last upload, pages last so their assets are in place first"""
+    remote_files = remote_manifest.get('files', {})
+    changed = [
+        name for name, entry in manifest['files'].items()
+        if remote_files.get(name, {}).get('sha256') != entry['sha256']
+    ]
+    return sorted(changed, key=lambda name: (name.endswith('.html'), name))
+
+def upload_file(s3, bucket, dist_dir, name, entry):
+    """Upload a file and its precompressed siblings with their cache and encoding metadata"""
+    with open(os.path.join(dist_dir, name), 'rb') as f:
+        s3.put_object(
+            Bucket=bucket,
+            Key=name,
+            Body=f.read(),
+            ContentType=entry['content_type'],
+            CacheControl=entry['cache_control']
+        )
+    
+    encodings = entry.get('encodings', {})
+    if not encodings:
+        return
+    
+    # The CloudFront function rewrites requests to the .br or .gz sibling, so both must exist.
+    # Without a brotli build the .br key gets the gzip body, browsers decode by Content-Encoding
+    siblings = {
+        '.gz': ('gzip', encodings['gzip']),
+        '.br': ('br', encodings['br']) if 'br' in encodings else ('gzip', encodings['gzip'])
+    }
+    for suffix, (encoding, file_name) in siblings.items():
+        with open(os.path.join(dist_dir, file_name), 'rb') as f:
+            s3.put_object(
+                Bucket=bucket,
+                Key=name + suffix,
+                Body=f.read(),
+                ContentType=entry['content_type'],
+                ContentEncoding=encoding,
+                CacheControl=entry['cache_control']
+            )
+
+def upload(dist_dir, bucket, dry_run=False):
+    """Upload the files of a build that changed since the last upload, returning their names"""
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'r') as f:
+        manifest = json.load(f)
+    
+    s3 = boto3.client('s3')
+    changed = changed_files(manifest, load_remote_manifest(s3, bucket))
+    
+    for name in changed:
+        print(f"{'Would upload' if dry_run else 'Uploading'} {name}")
+        if not dry_run:
+            upload_file(s3, bucket, dist_dir, name, manifest['files'][name])
+    
+    # Old fingerprinted files are left in place for pages that are still open in browsers
+    if not dry_run:
+        s3.put_object(
+            Bucket=bucket,
+            Key=MANIFEST_NAME,
+            Body=json.dumps(manifest, indent=2).encode('utf-8'),
+            ContentType='application/json',
+            CacheControl='no-cache'
+        )
+    
+    return changed
+
+def invalidate(distribution_id, manifest, changed):
+    """Invalidate the changed files that keep their names, fingerprinted files never need it"""
+    paths = ['/' + name for name in changed if manifest['files'][name]['cache_control'] != IMMUTABLE_CACHE_CONTROL]
+    if 'index.html' in changed:
+        paths.append('/')
+    if not paths:
+        return None
+    
+    cloudfront = boto3.client('cloudfront')
+    response = cloudfront.create_invalidation(
+        DistributionId=distribution_id,
+        InvalidationBatch={
+            'Paths': {'Quantity': len(paths), 'Items': paths},
+            'CallerReference': str(time.time())
+        }
+    )
+    print(f"Invalidated {', '.join(paths)}")
+    return response['Invalidation']['Id']
+
+def main():
+    # Get the SPA directory
+    spa_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    
+    parser = argparse.ArgumentParser(description='Upload the files of an SPA build that changed since the last upload')
+    parser.add_argument('--dist-dir', default=os.path.join(spa_dir, 'dist'), help='Build output directory')
+    parser.add_argument('--bucket', help='S3 bucket to upload to')
+    parser.add_argument('--stack-name', default='ai-chat-interface-stack', help='Frontend stack to read the bucket name from')
+    parser.add_argument('--distribution-id', help='CloudFront distribution to invalidate changed pages in')
+    parser.add_argument('--dry-run', action='store_true', help='List the files that would be uploaded')
+    
+    args = parser.parse_args()
+    
+    try:
+        bucket = args.bucket or get_bucket_name(args.stack_name)
+        changed = upload(args.dist_dir, bucket, args.dry_run)
+        if args.distribution_id and changed and not args.dry_run:
+            with open(os.path.join(args.dist_dir, MANIFEST_NAME), 'r') as f:
+                invalidate(args.distribution_id, json.load(f), changed)
+    except Exception as e:
+        print(f"Error uploading SPA: {str(e)}")
+        sys.exit(1)
+    
+    print(f"{len(changed)} changed files {'to upload' if args.dry_run else 'uploaded'} to {bucket}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file